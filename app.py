@@ -1,19 +1,24 @@
 import streamlit as st
-import json
+import functools
+import hashlib
 import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
-import numpy as np
-from datetime import datetime, timedelta
-from wordcloud import WordCloud
+from datetime import datetime
 import japanize_matplotlib
 import calendar
-import base64
-from io import BytesIO
-from janome.tokenizer import Tokenizer
 import plotly.graph_objects as go
-import requests
+from diary_core import analytics, anomaly, bulk, charts, cooccurrence, features, forecast, importer, lags, periods, storage, terms, text, trace
+from diary_core.backups import BackupStore
+from diary_core.drafts import DraftStore
+from diary_core.export import EXPORT_FORMATS, export_buffer, frame_to_csv, select_entries
+from diary_core.frame import to_frame, build_date_index, MIN_RATING
+from diary_core.tenants import DEFAULT_MEMORY_BUDGET_MB, DEFAULT_TENANT, TenantRegistry, load_tenants, tenant_storage
+from diary_core.rolling import daily_frame, DEFAULT_WINDOWS
+from diary_core.sync import MirroredStorage
+from diary_core.vocab import WEATHER_OPTIONS, HEALTH_OPTIONS, MOOD_OPTIONS, ACTIVITY_OPTIONS, WEATHER_ICONS
+from diary_core.vocab import DEFAULT_WEATHER, DEFAULT_HEALTH, DEFAULT_RATING, DEFAULT_SLEEP_HOURS
 
 # 日本語フォントの設定
 japanize_matplotlib.japanize()
@@ -29,68 +34,172 @@ st.set_page_config(
 # GitHub リポジトリ情報  
 GITHUB_REPO = "isamikann/diary"  
 GITHUB_FILE_PATH = "diary.json"  # JSON ファイルのパス  
-GITHUB_TOKEN = st.secrets["GITHUB_TOKEN"]  # Streamlit secrets に保存したトークン  
-  
-def get_file_sha(repo, path, token):  
-    url = f"https://api.github.com/repos/{repo}/contents/{path}?ref=main"  
-    headers = {"Authorization": f"token {token}"}  
-    response = requests.get(url, headers=headers)  
-    response.raise_for_status()  
-    return response.json()["sha"]  
-
-def update_github_file(repo, path, content, token, message="Update file"):  
-    url = f"https://api.github.com/repos/{repo}/contents/{path}?ref=main"  
-    sha = get_file_sha(repo, path, token)  
-    headers = {"Authorization": f"token {token}"}  
-    data = {  
-        "message": message,  
-        "content": content,  
-        "sha": sha  
-    }  
-    response = requests.put(url, headers=headers, data=json.dumps(data))  
-    response.raise_for_status()  
-    return response.json()
 
+# ストレージの切り替え（DIARY_STORAGE=local でローカルの JSON ファイルを使用。ベンチマークや開発用）
+STORAGE_BACKEND = os.environ.get("DIARY_STORAGE", "github")
+LOCAL_DIARY_PATH = os.environ.get("DIARY_LOCAL_PATH", "diary.json")
+
+# 複数の日記の切り替え（DIARY_TENANTS に日記の設定ファイルのパス。なければ上の設定の1つの日記だけ）
+TENANTS = load_tenants(os.environ.get("DIARY_TENANTS")) or {
+    DEFAULT_TENANT: {
+        "backend": STORAGE_BACKEND,
+        "repo": GITHUB_REPO,
+        "path": LOCAL_DIARY_PATH if STORAGE_BACKEND == "local" else GITHUB_FILE_PATH,
+    }
+}
+# 日記ごとのキャッシュのメモリ上限（すべての日記の合計）
+TENANT_MEMORY_MB = int(os.environ.get("DIARY_TENANT_MEMORY_MB", DEFAULT_MEMORY_BUDGET_MB))
+# オフライン対応のローカルミラー（DIARY_MIRROR_DIR=.diary_mirror などを指定すると、日記ごとにその下にミラーを作る）
+MIRROR_DIR = os.environ.get("DIARY_MIRROR_DIR")
+# 分析用の列指向スナップショットを置くディレクトリ（日記ごとにその下に作る。空にすると作らない）
+SNAPSHOT_DIR = os.environ.get("DIARY_SNAPSHOT_DIR", ".diary_snapshot")
+# 増分バックアップを置くディレクトリ（日記ごとにその下に作る。空にすると取らない）
+BACKUP_DIR = os.environ.get("DIARY_BACKUP_DIR", ".diary_backups")
+# 書きかけの日記の下書きを置くディレクトリ（日記ごとにその下に作る）
+DRAFT_DIR = os.environ.get("DIARY_DRAFT_DIR", ".diary_drafts")
+
+# 表示中の日記の名前
+def current_tenant():
+    name = st.session_state.get("tenant")
+    return name if name in TENANTS else next(iter(TENANTS))
+
+# 日記の保存先のストレージ（GitHub のトークンは Streamlit secrets から読む。日記ごとに token_secret で名前を変えられる）
+def remote_storage(tenant):
+    config = TENANTS[tenant]
+    token = None
+    if config.get("backend", "github") == "github":
+        token = st.secrets[config.get("token_secret", "GITHUB_TOKEN")]
+    return tenant_storage(config, token)
+
+# ローカルミラー（日記ごとに1つ。同期スレッドもセッション間で共有する）
+@st.cache_resource
+def mirrored_storage(tenant):
+    return MirroredStorage(remote_storage(tenant), os.path.join(MIRROR_DIR, tenant)).start()
+
+# ストレージを取得（ミラーを使う場合は保存はローカルに書くだけで、送信は同期スレッドが行う）
+def get_storage():
+    if MIRROR_DIR:
+        return mirrored_storage(current_tenant())
+    return remote_storage(current_tenant())
+
+# 日記ごとのキャッシュ（セッション間で共有する）
+@st.cache_resource
+def tenant_registry():
+    return TenantRegistry(TENANT_MEMORY_MB, snapshot_root=SNAPSHOT_DIR or None)
+
+def tenant_state():
+    return tenant_registry().get(current_tenant())
+
+# 分析結果の事前計算（表示中の日記の分）
+def precompute_pipeline():
+    return tenant_state().precompute
+
+# データのバージョンが変わったら事前計算を始める（バージョンは各画面で結果を引くときに使う）
+def on_data_loaded(data, version):
+    st.session_state["data_version"] = version
+    precompute_pipeline().submit(data, version)
+
+# 事前計算済みの結果があれば使い、なければその場で計算する
+def precomputed(name, compute):
+    result = precompute_pipeline().get(name, st.session_state.get("data_version"))
+    return compute() if result is None else result
+
+# 分析用の DataFrame（事前計算済みのもの → 列指向スナップショット → 日記から変換 の順に使う）
+#   columns を指定すると、スナップショットからはその列だけを読む
+def analysis_frame(diary, columns=None):
+    df = precompute_pipeline().frame(st.session_state.get("data_version"), columns)
+    return to_frame(diary) if df is None else df
+
+# 日記ごとの特徴量（書き込み後の事前計算で変わった日記の分だけ計算したもの。まだなければその場で更新する）
+def feature_frame(diary):
+    return precomputed("features", lambda: precompute_pipeline().features.frame(diary))
+
+# 分析用の DataFrame の行と同じ並びの単語リスト（特徴量から取り出す）
+def feature_tokens(diary, df):
+    return precomputed("tokens", lambda: precompute_pipeline().features.token_lists(diary, df["date"]))
+
+# 日付×単語の出現回数の行列（事前計算がまだなら、変わった日付の行だけその場で数え直す）
+def term_matrix(diary):
+    def update():
+        matrix = precompute_pipeline().terms
+        matrix.update(feature_frame(diary))
+        return matrix
+    return precomputed("terms", update)
+
+# 日ごと・期間ごとの集計（週・月・四半期・年・任意の期間のレポートに使う）
+def period_aggregates(diary, df):
+    def update():
+        aggregates = precompute_pipeline().periods
+        aggregates.update(df, feature_frame(diary))
+        return aggregates
+    return precomputed("periods", update)
+
+# 評価の予測と検証の誤差（予測モデルは日記ごとに持ち続け、増えた日記の分だけ学習する）
+def rating_forecast(df):
+    return precomputed("forecast", lambda: forecast.summary(precompute_pipeline().forecaster, df))
+
+# 増分バックアップ（日記ごとに1つ。セッション間で共有する）
+@st.cache_resource
+def backup_store(tenant):
+    return BackupStore(os.path.join(BACKUP_DIR, tenant))
+
+# 保存した内容のスナップショットを取る（前回から変わった日記だけを書く）
+def backup_snapshot(data, message):
+    if BACKUP_DIR:
+        backup_store(current_tenant()).snapshot(data, message)
+
+# 書きかけの日記の下書き（日記ごとに1つ。セッション間で共有する）
+@st.cache_resource
+def draft_store(tenant):
+    return DraftStore(os.path.join(DRAFT_DIR, tenant))
+
+# 日記を読み込む（項目の補完・検証はデータのバージョンごとに1度だけ行う）
 def load_diary():  
-    url = f"https://raw.githubusercontent.com/isamikann/diary/main/diary.json?ref=main" 
-    response = requests.get(url)  
-    response.raise_for_status()  
-    return response.json()  
-  
-def save_diary(data):  
-    encoded_content = base64.b64encode(json.dumps(data, ensure_ascii=False).encode()).decode()  
-    update_github_file(GITHUB_REPO, GITHUB_FILE_PATH, encoded_content, GITHUB_TOKEN)  
+    diary_storage = get_storage()
+    raw = diary_storage.load()
+    diary = tenant_state().normalized_diary(raw, diary_storage.version)
+    on_data_loaded(diary, diary_storage.version)
+    # まだバックアップがなければ、変更する前の内容（読み込めなかった日記も含めて元のまま）を最初のスナップショットにする
+    if BACKUP_DIR and backup_store(current_tenant()).head() is None:
+        backup_snapshot(raw, "最初のバックアップ")
+    return diary
+
+# 日記リスト全体を保存する（load_diary の日記を元にしたリストを渡す）
+#   keep_rejected: 変わっていない日記・項目と読み込めなかった日記を元のまま書き戻す（すべて削除するときなど、書いた内容だけにするときは False）
+def save_diary(data, message="保存", keep_rejected=True):  
+    diary_storage = get_storage()
+    written = tenant_state().to_stored(data) if keep_rejected else data
+    diary_storage.save(written)
+    on_data_loaded(tenant_state().normalized_diary(written, diary_storage.version), diary_storage.version)
+    backup_snapshot(written, message)
 
 # 日記を追加・更新する関数（同じ日付のデータがあれば上書き）
 def add_entry(date, content, weather, health, rating, activities=None, mood=None, memo=None, sleep_hours=None):
-      diary = load_diary()  
-      existing_entry = next((d for d in diary if d["date"] == date), None)  
-        
-      entry_data = {  
-          "date": date,  
-          "content": content,  
-          "weather": weather,  
-          "health": health,  
-          "rating": rating,  
-          "activities": activities or [],  
-          "mood": mood or "",  
-          "memo": memo or "",  
-          "sleep_hours": sleep_hours or 7.0  
-      }  
-        
-      if existing_entry:  
-          for key, value in entry_data.items():  
-              existing_entry[key] = value  
-      else:  
-          diary.append(entry_data)  
-        
-      save_diary(diary)  
+    diary_storage = get_storage()
+    diary = storage.add_entry(diary_storage, date, content, weather, health, rating, activities, mood, memo, sleep_hours)
+    on_data_loaded(tenant_state().normalized_diary(diary, diary_storage.version), diary_storage.version)
+    backup_snapshot(diary, f"{date} の日記を保存")
 
 
 # 📌 過去の日記を取得する関数（特定の日付）
 def get_entry_by_date(date):
-    diary = load_diary()
-    return next((d for d in diary if d["date"] == date), None)
+    return storage.find_entry(load_diary(), date)
+
+# Plotly のグラフを表示（シリアライズ・描画の時間を計測）
+def plotly_chart(fig, **kwargs):
+    with trace.span("plotly:render"):
+        st.plotly_chart(fig, **kwargs)
+
+# 画面の一部だけを再実行する fragment（中のウィジェットを変えても、ページ全体は再実行しない）
+#   引数は最初に呼んだときのものが再実行でも使われるので、読み込み済みの日記や DataFrame を渡す
+def fragment(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace.fragment_run(name):
+                return func(*args, **kwargs)
+        return st.fragment(wrapper)
+    return decorator
 
 # テーマ設定関数  
 def setup_page():  
@@ -159,39 +268,76 @@ def setup_page():
 # スタイル適用
 theme = setup_page()
 
+# 日記の内容を入力欄の値にする（未記入・選択肢にない値は既定値）
+#   気分・活動は一括操作で名前を変えた値など選択肢にないものもそのまま残す（入力欄の選択肢に付け足す）
+def form_values(entry):
+    entry = entry or {}
+    return {
+        "weather": entry.get("weather") if entry.get("weather") in WEATHER_OPTIONS else DEFAULT_WEATHER,
+        "health": entry.get("health") if entry.get("health") in HEALTH_OPTIONS else DEFAULT_HEALTH,
+        "mood": entry.get("mood") if isinstance(entry.get("mood"), str) and entry.get("mood") else MOOD_OPTIONS[0],
+        "sleep_hours": float(entry["sleep_hours"]) if entry.get("sleep_hours") is not None else DEFAULT_SLEEP_HOURS,
+        "rating": entry.get("rating") or DEFAULT_RATING,
+        "activities": [a for a in entry.get("activities") or [] if isinstance(a, str) and a],
+        "content": entry.get("content") or "",
+        "memo": entry.get("memo") or "",
+    }
+
+# 日付を選び直したときだけ、入力欄の初期値を読み込む（下書き → 保存済みの日記 → 既定値の順）
+#   入力中の再実行では読み込まない
+def load_form(selected_date):
+    draft = draft_store(current_tenant()).get(selected_date)
+    saved = form_values(get_entry_by_date(selected_date))
+    values = form_values(draft["entry"]) if draft else saved
+    # 選択肢にない気分・活動（一括操作で名前を変えたものなど）は選択肢の後ろに付け足して、保存し直しても消えないようにする
+    st.session_state["form_mood_options"] = MOOD_OPTIONS + [m for m in dict.fromkeys([saved["mood"], values["mood"]]) if m not in MOOD_OPTIONS]
+    st.session_state["form_activity_options"] = ACTIVITY_OPTIONS + [
+        a for a in dict.fromkeys(saved["activities"] + values["activities"]) if a not in ACTIVITY_OPTIONS
+    ]
+    # 入力欄から作る活動は選択肢の順なので、比べるときに並びだけで違わないようにそろえる
+    order = {a: i for i, a in enumerate(st.session_state["form_activity_options"])}
+    for form in (saved, values):
+        form["activities"] = sorted(dict.fromkeys(form["activities"]), key=order.get)
+    for field, value in values.items():
+        if field != "activities":
+            st.session_state[f"form_{field}"] = value
+    for activity in st.session_state["form_activity_options"]:
+        st.session_state[f"form_activity_{activity}"] = activity in values["activities"]
+    st.session_state["form_key"] = (current_tenant(), selected_date)
+    st.session_state["form_saved"] = saved
+    st.session_state["form_last"] = values
+    st.session_state["form_draft_restored"] = draft
+
 # 📝 日記入力フォーム
 def diary_form():
     st.header("✍️ 日記を書く")
     
     # 日付を選択
     selected_date = st.date_input("📆 日付を選択", datetime.today()).strftime("%Y-%m-%d")
+    drafts = draft_store(current_tenant())
     
-    # 過去の日記があるかチェック
-    existing_entry = get_entry_by_date(selected_date)
-    content = existing_entry.get("content", "") if existing_entry else ""
-    weather = existing_entry.get("weather", "晴れ") if existing_entry else "晴れ"
-    health = existing_entry.get("health", "元気") if existing_entry else "元気"
-    rating = existing_entry.get("rating", 3) if existing_entry else 3
-    activities = existing_entry.get("activities", []) if existing_entry else []
-    mood = existing_entry.get("mood", "") if existing_entry else ""
-    memo = existing_entry.get("memo", "") if existing_entry else ""
-    sleep_hours = existing_entry.get("sleep_hours", 7.0) if existing_entry else 7.0
+    # 過去の日記・下書きは日付ごとに1度だけ読み込む（別の画面から戻ったときも読み直す）
+    if st.session_state.get("form_key") != (current_tenant(), selected_date) or "form_content" not in st.session_state:
+        load_form(selected_date)
+    restored = st.session_state["form_draft_restored"]
+    if restored:
+        st.info(f"📝 保存していない下書きを復元しました（{datetime.fromtimestamp(restored['updated_at']):%m/%d %H:%M}）")
     
     # 基本情報の入力
     col1, col2 = st.columns(2)
     
     with col1:
-        weather = st.selectbox("🌤 天気", ["晴れ", "曇り", "雨", "雪", "霧", "台風"], index=["晴れ", "曇り", "雨", "雪", "霧", "台風"].index(weather))
-        health = st.selectbox("😷 体調", ["元気", "普通", "少し疲れた", "体調不良", "絶好調", "眠い"], index=["元気", "普通", "少し疲れた", "体調不良", "絶好調", "眠い"].index(health) if health in ["元気", "普通", "少し疲れた", "体調不良", "絶好調", "眠い"] else 0)
+        weather = st.selectbox("🌤 天気", WEATHER_OPTIONS, key="form_weather")
+        health = st.selectbox("😷 体調", HEALTH_OPTIONS, key="form_health")
 
     with col2:
-        mood = st.selectbox("🧠 気分", ["選択しない", "幸せ", "充実", "退屈", "不安", "悲しい", "イライラ", "やる気満々", "リラックス", "達成感"], index=["選択しない", "幸せ", "充実", "退屈", "不安", "悲しい", "イライラ", "やる気満々", "リラックス", "達成感"].index(mood) if mood in ["選択しない", "幸せ", "充実", "退屈", "不安", "悲しい", "イライラ", "やる気満々", "リラックス", "達成感"] else 0)
-        sleep_hours = st.number_input("😴 睡眠時間（時間）", min_value=0.0, max_value=24.0, value=sleep_hours, step=0.5)
-        rating = st.slider("⭐ 今日の評価", 1, 5, rating)
+        mood = st.selectbox("🧠 気分", st.session_state["form_mood_options"], key="form_mood")
+        sleep_hours = st.number_input("😴 睡眠時間（時間）", min_value=0.0, max_value=24.0, step=0.5, key="form_sleep_hours")
+        rating = st.slider("⭐ 今日の評価", 1, 5, key="form_rating")
         st.write(f"評価: {'⭐' * rating}")
     
     # 活動タグ
-    activity_options = ["運動した", "読書した", "料理した", "友達と会った", "家族と過ごした", "勉強した", "映画/TVを見た", "創作活動をした", "ゲームをした", "休息した", "仕事をした", "新しいことを学んだ"]
+    activity_options = st.session_state["form_activity_options"]
     
     st.write("🏃‍♂️ 今日行った活動（複数選択可）")
     # 活動をグリッドレイアウトで表示
@@ -199,7 +345,7 @@ def diary_form():
     selected_activities = []
     
     for i, activity in enumerate(activity_options):
-        if cols[i % 3].checkbox(activity, activity in activities):
+        if cols[i % 3].checkbox(activity, key=f"form_activity_{activity}"):
             selected_activities.append(activity)
     
     # 日記の内容
@@ -216,20 +362,43 @@ def diary_form():
         - 今日の自分を褒めたいポイントは？
         """)
     
-    content = st.text_area("今日の出来事や感想を書きましょう", value=content, height=150)
+    content = st.text_area("今日の出来事や感想を書きましょう", height=150, key="form_content")
     
     # メモ欄（自由記述）
-    memo = st.text_input("📌 メモ・アイデア・気づき（短く書き留めたいこと）", value=memo)
+    memo = st.text_input("📌 メモ・アイデア・気づき（短く書き留めたいこと）", key="form_memo")
+    
+    # 入力が変わったら下書きを更新する（ファイルへの書き込みは入力が止まってから）
+    values = {
+        "weather": weather, "health": health, "mood": mood, "sleep_hours": sleep_hours, "rating": rating,
+        "activities": selected_activities, "content": content, "memo": memo,
+    }
+    if values != st.session_state["form_last"]:
+        st.session_state["form_last"] = values
+        if values == st.session_state["form_saved"]:
+            drafts.discard(selected_date)
+        else:
+            drafts.save(selected_date, storage.make_entry(selected_date, content, weather, health, rating, selected_activities, mood, memo, sleep_hours))
+    has_draft = values != st.session_state["form_saved"]
+    if has_draft:
+        st.caption("📝 下書きを自動保存しています（保存するまで日記には反映されません）")
     
-    # 保存ボタン
-    if st.button("💾 保存する", key="save_diary"):
+    col1, col2 = st.columns(2)
+    # 保存ボタン（下書きの内容を1回の書き込みで日記に保存する）
+    if col1.button("💾 保存する", key="save_diary"):
         if content.strip():
             add_entry(selected_date, content, weather, health, rating, selected_activities, mood, memo, sleep_hours) 
+            drafts.discard(selected_date)
+            st.session_state["form_saved"] = values
+            st.session_state["form_draft_restored"] = None
             st.success(f"✅ {selected_date} の日記を保存しました！")
             # アニメーション効果
             st.balloons()
         else:
             st.warning("⚠️ 日記の内容を入力してください。")
+    if has_draft and col2.button("↩️ 下書きを破棄", key="discard_draft"):
+        drafts.discard(selected_date)
+        st.session_state.pop("form_key", None)
+        st.rerun()
 
 # 📚 過去の日記表示
 def display_entries():
@@ -247,51 +416,34 @@ def display_entries():
         display_calendar(diary)
         return
     
+    entries_list(diary)
+
+# 日記の一覧（検索・並び替えを変えても、この部分だけを再実行する）
+@fragment("fragment:entries_list")
+def entries_list(diary):
+    weathers, healths, all_activities = analytics.filter_options(diary)
+    
     # 検索・フィルター用コントロール
     with st.expander("🔍 検索・フィルター", expanded=False):
         col1, col2 = st.columns(2)
         
         with col1:
             search_query = st.text_input("🔍 キーワード検索", "")
-            filter_weather = st.selectbox("🌤 天気で絞り込む", ["すべて"] + list(set(d.get("weather", "") for d in diary if "weather" in d)))
+            filter_weather = st.selectbox("🌤 天気で絞り込む", [analytics.ALL] + weathers)
         
         with col2:
-            filter_health = st.selectbox("😷 体調で絞り込む", ["すべて"] + list(set(d.get("health", "") for d in diary if "health" in d)))
-            filter_rating = st.selectbox("⭐ 評価で絞り込む", ["すべて", "1", "2", "3", "4", "5"])
+            filter_health = st.selectbox("😷 体調で絞り込む", [analytics.ALL] + healths)
+            filter_rating = st.selectbox("⭐ 評価で絞り込む", [analytics.ALL, "1", "2", "3", "4", "5"])
         
         # 活動タグでのフィルタリング
-        all_activities = set()
-        for entry in diary:
-            if "activities" in entry and entry["activities"]:
-                all_activities.update(entry["activities"])
-        
-        filter_activity = st.multiselect("🏃‍♂️ 活動で絞り込む", list(all_activities))
-    
-    # フィルタリング
-    filtered_diary = diary.copy()
+        filter_activity = st.multiselect("🏃‍♂️ 活動で絞り込む", all_activities)
     
     # 検索とフィルター適用
-    if search_query or filter_weather != "すべて" or filter_health != "すべて" or filter_rating != "すべて" or filter_activity:
-        filtered_diary = [d for d in diary if 
-            (not search_query or search_query.lower() in d.get("content", "").lower() or 
-             search_query.lower() in d.get("memo", "").lower()) and
-            (filter_weather == "すべて" or d.get("weather", "") == filter_weather) and
-            (filter_health == "すべて" or d.get("health", "") == filter_health) and
-            (filter_rating == "すべて" or str(d.get("rating", "")) == filter_rating) and
-            (not filter_activity or any(activity in d.get("activities", []) for activity in filter_activity))
-        ]
+    filtered_diary = analytics.filter_entries(diary, search_query, filter_weather, filter_health, filter_rating, filter_activity)
     
     # 並び順のオプション
-    sort_option = st.selectbox("並び替え", ["日付順（新しい順）", "日付順（古い順）", "評価（高い順）", "評価（低い順）"])
-    
-    if sort_option == "日付順（新しい順）":
-        filtered_diary = sorted(filtered_diary, key=lambda x: x["date"], reverse=True)
-    elif sort_option == "日付順（古い順）":
-        filtered_diary = sorted(filtered_diary, key=lambda x: x["date"])
-    elif sort_option == "評価（高い順）":
-        filtered_diary = sorted(filtered_diary, key=lambda x: x.get("rating", 0), reverse=True)
-    elif sort_option == "評価（低い順）":
-        filtered_diary = sorted(filtered_diary, key=lambda x: x.get("rating", 0))
+    sort_option = st.selectbox("並び替え", analytics.SORT_OPTIONS)
+    filtered_diary = analytics.sort_entries(filtered_diary, sort_option)
     
     # データ表示
     if len(filtered_diary) == 0:
@@ -302,52 +454,69 @@ def display_entries():
         for entry in filtered_diary:
             # カード風のデザイン
             with st.container():
+                content_html = entry['content'].replace('\n', '<br>')
                 st.markdown(f"""
                 <div class="diary-entry">
                     <h3>📆 {entry['date']}</h3>
-                    <p>🌤 天気: {entry.get('weather', '未記入')} | 😷 体調: {entry.get('health', '未記入')} | 
-                    <span class="rating-stars">{'⭐' * entry.get('rating', 0)}</span></p>
-                    <p>📝 {entry.get('content', '').replace('\n', '<br>')}</p>
+                    <p>🌤 天気: {entry['weather'] or '未記入'} | 😷 体調: {entry['health'] or '未記入'} | 
+                    <span class="rating-stars">{'⭐' * entry['rating']}</span></p>
+                    <p>📝 {content_html}</p>
                 """, unsafe_allow_html=True)
                 
                 # 活動タグがあれば表示
-                if "activities" in entry and entry["activities"]:
+                if entry["activities"]:
                     activities_html = ' '.join([f'<span style="background-color: #E1F5FE; padding: 3px 8px; border-radius: 10px; margin-right: 5px;">{a}</span>' for a in entry["activities"]])
                     st.markdown(f"<p>🏃‍♂️ {activities_html}</p>", unsafe_allow_html=True)
                 
                 # 気分があれば表示
-                if "mood" in entry and entry["mood"] and entry["mood"] != "選択しない":
+                if analytics.has_mood(entry["mood"]):
                     st.markdown(f"<p>🧠 気分: {entry['mood']}</p>", unsafe_allow_html=True)
                 
                 # メモがあれば表示
-                if "memo" in entry and entry["memo"]:
+                if entry["memo"]:
                     st.markdown(f"<p>📌 メモ: {entry['memo']}</p>", unsafe_allow_html=True)
                 
                 st.markdown("</div>", unsafe_allow_html=True)
                 st.markdown("---")
         
-        # エクスポート機能
-        if st.button("📋 表示中の日記をCSVエクスポート"):
-            csv = export_to_csv(filtered_diary)
-            st.download_button(
-                label="📥 CSVをダウンロード",
-                data=csv,
-                file_name="my_diary_export.csv",
-                mime="text/csv",
-            )
+        # エクスポート機能（表示中の日記。ファイルはダウンロードしたときに作る）
+        export_download_button("📥 表示中の日記をエクスポート", filtered_diary, "my_diary_export", key="export_filtered")
+
+# 形式を選んでダウンロードするボタン（data に関数を渡して、クリックされたときだけ書き出す）
+def export_download_button(label, entries, file_stem, key):
+    col1, col2 = st.columns([1, 2])
+    fmt = col1.selectbox(
+        "形式",
+        list(EXPORT_FORMATS),
+        format_func=lambda f: EXPORT_FORMATS[f][0],
+        key=f"{key}_format",
+    )
+    _, mime, ext = EXPORT_FORMATS[fmt]
+    with col2:
+        st.download_button(
+            label,
+            data=lambda: export_buffer(entries, fmt),
+            file_name=f"{file_stem}.{ext}",
+            mime=mime,
+            key=key,
+        )
 
 # 📅 カレンダー表示
 def display_calendar(diary):
-    # データフレームに変換
-    df = pd.DataFrame(diary)
-    df["date"] = pd.to_datetime(df["date"])
+    # 日付で引けるようにする
+    date_index = build_date_index(diary)
     
     # 月を選択
-    all_months = sorted(df["date"].dt.strftime("%Y-%m").unique())
+    all_months = sorted(set(date[:7] for date in date_index))
     if not all_months:
         st.info("日記のデータがありません。")
         return
     
+    calendar_month(date_index, all_months)
+
+# 月ごとのカレンダー（月を選び直しても、この部分だけを再実行する）
+@fragment("fragment:calendar_month")
+def calendar_month(date_index, all_months):
     default_month_index = 0  # 最新の月をデフォルトに
     selected_month = st.selectbox(
         "月を選択", 
@@ -361,9 +530,6 @@ def display_calendar(diary):
     # 選択した月のカレンダーを作成
     cal = calendar.monthcalendar(year, int(month))
     
-    # 月のデータを抽出
-    month_data = df[df["date"].dt.strftime("%Y-%m") == selected_month]
-    
     # カレンダーヘッダー
     cols = st.columns(7)
     days = ["月", "火", "水", "木", "金", "土", "日"]
@@ -382,18 +548,15 @@ def display_calendar(diary):
                 date_str = f"{year}-{month:02d}-{day:02d}"
                 
                 # その日のデータを取得
-                day_data = month_data[month_data["date"].dt.strftime("%Y-%m-%d") == date_str]
+                day_entry = date_index.get(date_str)
                 
-                if not day_data.empty:
+                if day_entry:
                     # データがある場合
-                    rating = day_data.iloc[0].get("rating", 0)
-                    weather = day_data.iloc[0].get("weather", "")
+                    rating = day_entry["rating"]
+                    weather = day_entry["weather"]
                     
                     # 天気アイコン
-                    weather_icon = {
-                        "晴れ": "☀️", "曇り": "☁️", "雨": "🌧️", 
-                        "雪": "❄️", "霧": "🌫️", "台風": "🌀"
-                    }.get(weather, "")
+                    weather_icon = WEATHER_ICONS.get(weather, "")
                     
                     cols[i].markdown(f"""
                     <div style='text-align: center; padding: 5px; background-color: rgba(144, 238, 144, 0.2); border-radius: 5px;'>
@@ -410,6 +573,26 @@ def display_calendar(diary):
                     </div>
                     """, unsafe_allow_html=True)
 
+# 移動統計（日記ごとにセッション間で共有し、日付が増えたときは差分だけ計算する）
+def get_rolling_stats(df):
+    return tenant_state().rolling.update(daily_frame(df))
+
+# 外れ値と変化点の検出（移動統計と同じく、日付が増えたときは増えた日の分だけ検出する）
+def get_anomalies(df):
+    detector = tenant_state().anomalies
+    detector.update(daily_frame(df))
+    return detector
+
+# 項目別の平均評価の棒グラフ（日数つき）
+def rating_bar(result, title, label):
+    return px.bar(
+        x=result.index, 
+        y=result["average"].values,
+        title=title,
+        labels={"x": label, "y": "平均評価"},
+        text=[f"({count}日)" for count in result["count"]]
+    )
+
 # 📊 基本統計データ可視化
 def show_statistics():
     st.header("📊 データ分析")
@@ -423,24 +606,11 @@ def show_statistics():
         st.warning("統計分析には最低3件のデータが必要です。もう少し日記を書いてみましょう。")
         return
     
-    # DataFrame に変換
-    df = pd.DataFrame(diary)
-    
-    # 日付を日時型に変換
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date")
-    
-    # 曜日情報を追加
-    df["weekday"] = df["date"].dt.day_name()
-    # 日本語曜日に変換
-    weekday_map = {
-        "Monday": "月曜日", "Tuesday": "火曜日", "Wednesday": "水曜日", 
-        "Thursday": "木曜日", "Friday": "金曜日", "Saturday": "土曜日", "Sunday": "日曜日"
-    }
-    df["weekday_jp"] = df["weekday"].map(weekday_map)
+    # DataFrame に変換（日付順・曜日付き）
+    df = analysis_frame(diary)
     
     # タブで分析項目を分ける
-    tabs = st.tabs(["評価の推移", "天気と体調", "曜日と活動", "キーワード分析", "睡眠時間"])
+    tabs = st.tabs(["評価の推移", "天気と体調", "曜日と活動", "キーワード分析", "睡眠時間", "いつもと違う日"])
     
     # タブ1: 評価の推移
     with tabs[0]:
@@ -452,20 +622,35 @@ def show_statistics():
                     labels={"rating": "評価", "date": "日付"},
                     markers=True)
         
-        # 7日間の移動平均を追加
-        if len(df) >= 7:
-            df["rolling_avg"] = df["rating"].rolling(window=7).mean()
-            fig.add_scatter(x=df["date"], y=df["rolling_avg"], mode="lines", name="7日間移動平均")
-        
-        st.plotly_chart(fig, use_container_width=True)
+        # カレンダー日付ベースの移動平均・EWMAを追加
+        stats = get_rolling_stats(df)
+        window = st.selectbox("移動平均の期間", DEFAULT_WINDOWS, format_func=lambda w: f"{w}日間")
+        fig.add_scatter(x=stats.index, y=stats[f"rating_mean_{window}d"], mode="lines", name=f"{window}日間移動平均")
+        fig.add_scatter(x=stats.index, y=stats[f"rating_ewm_{window}d"], mode="lines", name=f"{window}日間EWMA", line=dict(dash="dot"))
+        
+        plotly_chart(fig, use_container_width=True)
+        
+        # 睡眠時間の移動平均と記録密度
+        with st.expander(f"😴 睡眠時間と記録密度（{window}日間）"):
+            sleep_fig = go.Figure()
+            sleep_mean = stats[f"sleep_hours_mean_{window}d"]
+            sleep_std = stats[f"sleep_hours_std_{window}d"].fillna(0)
+            sleep_fig.add_scatter(x=stats.index, y=sleep_mean + sleep_std, mode="lines", line=dict(width=0), showlegend=False)
+            sleep_fig.add_scatter(x=stats.index, y=sleep_mean - sleep_std, mode="lines", line=dict(width=0), fill="tonexty", name="±標準偏差")
+            sleep_fig.add_scatter(x=stats.index, y=sleep_mean, mode="lines", name="睡眠時間の移動平均")
+            sleep_fig.update_layout(title="睡眠時間の移動平均", xaxis_title="日付", yaxis_title="睡眠時間（時間）")
+            plotly_chart(sleep_fig, use_container_width=True)
+            
+            density_fig = px.area(
+                x=stats.index,
+                y=stats[f"density_{window}d"] * 100,
+                title="記録密度（期間内に日記を書いた日の割合）",
+                labels={"x": "日付", "y": "記録密度（%）"}
+            )
+            plotly_chart(density_fig, use_container_width=True)
         
-        #評価を数える。
-        rating_counts = df['rating'].value_counts().sort_index()
-        #1~5でデータがない場合、０を追加する
-        for i in range(1,6):
-            if i not in rating_counts:
-                rating_counts[i] = 0
-        rating_counts = rating_counts.sort_index()
+        #評価を数える（1~5でデータがない場合は0）
+        rating_counts = analytics.rating_distribution(df)
         
         fig = go.Figure(data=[go.Bar(x=rating_counts.index, y=rating_counts.values)])
 
@@ -482,27 +667,22 @@ def show_statistics():
                 tickmode='linear',
             )
         )
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig, use_container_width=True)
         
         # 評価の特徴
         st.subheader("評価の特徴")
+        summary = analytics.rating_summary(df)
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("平均評価", f"{df['rating'].mean():.1f}")
+            st.metric("平均評価", f"{summary['mean']:.1f}")
         with col2:
-            st.metric("最高評価の日数", len(df[df["rating"] == 5]))
+            st.metric("最高評価の日数", summary["best_days"])
         with col3:
             # 先週と今週の比較
-            today = pd.Timestamp.today()
-            last_week = df[(df["date"] >= today - timedelta(days=14)) & (df["date"] < today - timedelta(days=7))]
-            this_week = df[(df["date"] >= today - timedelta(days=7)) & (df["date"] <= today)]
-            
-            if not last_week.empty and not this_week.empty:
-                last_week_avg = last_week["rating"].mean()
-                this_week_avg = this_week["rating"].mean()
-                delta = this_week_avg - last_week_avg
-                st.metric("先週比", f"{this_week_avg:.1f}", f"{delta:+.1f}")
+            if summary["this_week"] is not None and summary["last_week"] is not None:
+                delta = summary["this_week"] - summary["last_week"]
+                st.metric("先週比", f"{summary['this_week']:.1f}", f"{delta:+.1f}")
             else:
                 st.metric("先週比", "データ不足")
     
@@ -514,60 +694,27 @@ def show_statistics():
         
         with col1:
             # 天気ごとの評価
-            weather_avg = df.groupby("weather")["rating"].mean().sort_values(ascending=False)
-            weather_count = df.groupby("weather").size()
-            
-            weather_fig = px.bar(
-                x=weather_avg.index, 
-                y=weather_avg.values,
-                title="天気別の平均評価",
-                labels={"x": "天気", "y": "平均評価"},
-                text=[f"({count}日)" for count in weather_count[weather_avg.index]]
-            )
-            st.plotly_chart(weather_fig, use_container_width=True)
+            weather_avg = analytics.rating_by(df, "weather")
+            plotly_chart(rating_bar(weather_avg, "天気別の平均評価", "天気"), use_container_width=True)
             
             # 最も評価が高い天気
-            best_weather = weather_avg.idxmax()
-            st.info(f"☀️ 評価が最も高い天気は「{best_weather}」です（平均{weather_avg.max():.1f}点）")
+            st.info(f"☀️ 評価が最も高い天気は「{weather_avg.index[0]}」です（平均{weather_avg['average'].iloc[0]:.1f}点）")
         
         with col2:
             # 体調ごとの評価
-            health_avg = df.groupby("health")["rating"].mean().sort_values(ascending=False)
-            health_count = df.groupby("health").size()
-            
-            health_fig = px.bar(
-                x=health_avg.index, 
-                y=health_avg.values,
-                title="体調別の平均評価",
-                labels={"x": "体調", "y": "平均評価"},
-                text=[f"({count}日)" for count in health_count[health_avg.index]]
-            )
-            st.plotly_chart(health_fig, use_container_width=True)
+            health_avg = analytics.rating_by(df, "health")
+            plotly_chart(rating_bar(health_avg, "体調別の平均評価", "体調"), use_container_width=True)
             
             # 最も評価が高い体調
-            best_health = health_avg.idxmax()
-            st.info(f"💪 評価が最も高い体調は「{best_health}」です（平均{health_avg.max():.1f}点）")
+            st.info(f"💪 評価が最も高い体調は「{health_avg.index[0]}」です（平均{health_avg['average'].iloc[0]:.1f}点）")
         
         # 気分の分析（データがあれば）
-        if "mood" in df.columns and df["mood"].notna().any() and (df["mood"] != "選択しない").any():
+        mood_avg = analytics.rating_by(df, "mood")
+        if not mood_avg.empty:
             st.subheader("気分の分析")
-            mood_data = df[df["mood"] != "選択しない"]
+            plotly_chart(rating_bar(mood_avg, "気分別の平均評価", "気分"), use_container_width=True)
             
-            if not mood_data.empty:
-                mood_avg = mood_data.groupby("mood")["rating"].mean().sort_values(ascending=False)
-                mood_count = mood_data.groupby("mood").size()
-                
-                mood_fig = px.bar(
-                    x=mood_avg.index, 
-                    y=mood_avg.values,
-                    title="気分別の平均評価",
-                    labels={"x": "気分", "y": "平均評価"},
-                    text=[f"({count}日)" for count in mood_count[mood_avg.index]]
-                )
-                st.plotly_chart(mood_fig, use_container_width=True)
-                
-                best_mood = mood_avg.idxmax()
-                st.info(f"🧠 評価が最も高い気分は「{best_mood}」です（平均{mood_avg.max():.1f}点）")
+            st.info(f"🧠 評価が最も高い気分は「{mood_avg.index[0]}」です（平均{mood_avg['average'].iloc[0]:.1f}点）")
     
     # タブ3: 曜日と活動
     with tabs[2]:
@@ -576,10 +723,8 @@ def show_statistics():
         with col1:
             st.subheader("曜日別の評価")
             
-            # 曜日順に並べ替え
-            weekday_order = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
-            weekday_avg = df.groupby("weekday_jp")["rating"].mean()
-            weekday_avg = weekday_avg.reindex(weekday_order)
+            # 曜日順に並べた平均評価
+            weekday_avg = analytics.rating_by_weekday(df)
             
             weekday_fig = px.bar(
                 x=weekday_avg.index, 
@@ -587,7 +732,7 @@ def show_statistics():
                 title="曜日別の平均評価",
                 labels={"x": "曜日", "y": "平均評価"}
             )
-            st.plotly_chart(weekday_fig, use_container_width=True)
+            plotly_chart(weekday_fig, use_container_width=True)
             
             # 最も評価が高い曜日
             best_weekday = weekday_avg.idxmax()
@@ -597,156 +742,76 @@ def show_statistics():
             # 活動の分析
             st.subheader("活動と評価の関係")
             
-            # 活動データが存在する場合
-            if "activities" in df.columns:
-                # 全活動リストを作成
-                all_activities = []
-                for acts in df["activities"]:
-                    if isinstance(acts, list):
-                        all_activities.extend(acts)
-                
-                # 活動ごとの集計
-                activity_data = {}
-                for activity in set(all_activities):
-                    # その活動がある日のみ抽出
-                    days_with_activity = df[df["activities"].apply(lambda x: activity in x if isinstance(x, list) else False)]
-                    if not days_with_activity.empty:
-                        avg_rating = days_with_activity["rating"].mean()
-                        activity_data[activity] = {
-                            "average": avg_rating,
-                            "count": len(days_with_activity)
-                        }
+            activities_df = analytics.rating_by_activity(df)
+            
+            # データを表示用に整形
+            if not activities_df.empty:
+                activity_fig = px.bar(
+                    activities_df,
+                    x="activity", 
+                    y="average",
+                    title="活動別の平均評価",
+                    labels={"activity": "活動", "average": "平均評価"},
+                    text=activities_df["count"].apply(lambda x: f"({x}日)")
+                )
+                plotly_chart(activity_fig, use_container_width=True)
                 
-                # データを表示用に整形
-                if activity_data:
-                    activities_df = pd.DataFrame([
-                        {"活動": activity, "平均評価": data["average"], "日数": data["count"]}
-                        for activity, data in activity_data.items()
-                    ]).sort_values("平均評価", ascending=False)
-                    
-                    activity_fig = px.bar(
-                        activities_df,
-                        x="活動", 
-                        y="平均評価",
-                        title="活動別の平均評価",
-                        text=activities_df["日数"].apply(lambda x: f"({x}日)")
-                    )
-                    st.plotly_chart(activity_fig, use_container_width=True)
-                    
-                    # トップ3の活動
-                    if len(activities_df) >= 3:
-                        st.success("⭐ 評価が高い活動トップ3:")
-                        for i, (_, row) in enumerate(activities_df.head(3).iterrows()):
-                            st.write(f"{i+1}. **{row['活動']}** (平均{row['平均評価']:.1f}点, {row['日数']}日)")
-                    elif len(activities_df) > 0:
-                        st.success(f"⭐ 評価が最も高い活動は「{activities_df.iloc[0]['活動']}」です")
+                # トップ3の活動
+                if len(activities_df) >= 3:
+                    st.success("⭐ 評価が高い活動トップ3:")
+                    for i, row in enumerate(activities_df.head(3).itertuples()):
+                        st.write(f"{i+1}. **{row.activity}** (平均{row.average:.1f}点, {row.count}日)")
                 else:
-                    st.info("活動データがまだ十分にありません。")
+                    st.success(f"⭐ 評価が最も高い活動は「{activities_df.iloc[0]['activity']}」です")
             else:
-                st.info("活動データが記録されていません。")
+                st.info("活動データがまだ十分にありません。")
     
     # タブ4: キーワード分析
     with tabs[3]:
         st.subheader("日記のキーワード分析")
         
-        # テキストデータを結合
-        all_text = " ".join(df["content"].astype(str).tolist())
-        
-        if all_text.strip():
-            # Janome の Tokenizer を作成
-            t = Tokenizer()
-            
-            # 分かち書きされたテキストを格納するリスト
-            wakati_text = []
-            
-            # ストップワード（除外したい単語）を定義
-            japanese_stopwords = ["てる", "いる", "なる", "れる", "する", "ある", "こと", "これ", "さん", "して",   
-                                  "くれる", "やる", "くる", "しまう", "いく", "ない", "のだ", "よう", "あり", "ため",  
-                                  "ところ", "ます", "です", "から", "まで", "たり", "けど", "ので", "たい", "なる",   
-                                  "もの", "それ", "その", "今日", "日", "は", "が", "の", "に", "を", "へ", "と", "も",  
-                                  "で", "や", "し", "ながら", "なら", "けれど", "けど", "から", "まで", "たり", "だって",   
-                                  "なのに", "だけど", "たり", "だ", "だが", "そして", "しかし", "だから", "また", "につい",  
-                                  "すると", "なるほど", "ほんの", "たい", "です", "ます", "する", "くる", "れる", "いい",
-                                  "られる"]  
-            
-            # 形態素解析で分かち書き
-            for token in t.tokenize(all_text):
-                # 品詞の取得
-                part_of_speech = token.part_of_speech.split(',')[0]
-                # 基本形の取得
-                base_form = token.base_form
-                
-                # 名詞、動詞、形容詞のみを抽出
-                if part_of_speech in ['名詞', '動詞', '形容詞'] and base_form not in japanese_stopwords:
-                    # 除外したい単語以外を追加
-                    wakati_text.append(base_form)
+        if df["content"].astype(str).str.strip().any():
+            # 1日ごとに形態素解析（名詞、動詞、形容詞のみ）
+            token_lists = feature_tokens(diary, df)
             
-            # 分かち書きされたテキストを一つの文字列にする
-            wakati_all_text = " ".join(wakati_text)
+            # ストップワードを除いたキーワード
+            wakati_text = [word for tokens in token_lists for word in text.keywords(tokens)]
             
-            if wakati_all_text.strip():  # 分かち書き後のテキストが空でないか確認
+            if wakati_text:  # 分かち書き後のテキストが空でないか確認
               
                 # ワードクラウドの作成
                 st.write("📝 よく使われる単語のワードクラウド")
-                
-                # 変更後
-                wordcloud = WordCloud(
-                    width=800, 
-                    height=400, 
-                    background_color='white',
-                    font_path='./ipaexg.ttf',  # 日本語フォントのファイル名を指定
-                    stopwords=set(japanese_stopwords), # ここではストップワードは不要のため空リストにしない
-                    collocations=False,
-                    max_words=100
-                ).generate(wakati_all_text)
+                wordcloud = text.build_wordcloud(wakati_text)
 
                 # ワードクラウドの表示
                 fig, ax = plt.subplots(figsize=(10, 5))
                 ax.imshow(wordcloud, interpolation='bilinear')
                 ax.axis("off")
-                st.pyplot(fig)
+                with trace.span("matplotlib:render"):
+                    st.pyplot(fig)
                 
                 # 頻出キーワードの分析
                 st.write("📊 感情ごとの評価平均")
                 
-                # 感情キーワードのマッピング
-                emotion_keywords = {
-                    "ポジティブ": ["嬉しい", "楽しい", "幸せ", "わくわく", "最高", "喜び", "素晴らしい", "良い", "成功", "達成"],
-                    "ネガティブ": ["悲しい", "辛い", "苦しい", "不安", "心配", "失敗", "残念", "怖い", "疲れる", "しんどい"],
-                    "中立/その他": ["考える", "思う", "感じる", "予定", "明日", "今日", "昨日", "たぶん", "かもしれない"]
-                }
-                
-                # 感情ごとのデータ収集
-                emotion_ratings = {emotion: [] for emotion in emotion_keywords}
-                
-                for _, row in df.iterrows():
-                    # 感情キーワードチェックのテキスト変更
-                    wakati_content = [token.base_form for token in t.tokenize(row["content"]) if token.part_of_speech.split(',')[0] in ['名詞', '動詞', '形容詞']]
-                    rating = row["rating"]
-                    
-                    for emotion, keywords in emotion_keywords.items():
-                         if any(keyword in wakati_content for keyword in keywords):
-                             emotion_ratings[emotion].append(rating)
-                
                 # 感情ごとの平均評価を計算
-                emotion_avg = {emotion: np.mean(ratings) if ratings else 0 for emotion, ratings in emotion_ratings.items()}
-                emotion_count = {emotion: len(ratings) for emotion, ratings in emotion_ratings.items()}
+                emotion_df = features.emotion_summary(feature_frame(diary), df)
                 
                 # 感情ごとの平均評価をグラフ化
                 fig = px.bar(
-                    x=list(emotion_avg.keys()),
-                    y=list(emotion_avg.values()),
+                    x=emotion_df.index,
+                    y=emotion_df["average"].values,
                     title="感情表現ごとの平均評価",
                     labels={"x": "感情カテゴリ", "y": "平均評価"},
-                    text=[f"({count}日)" for count in emotion_count.values()]
+                    text=[f"({count}日)" for count in emotion_df["count"]]
                 )
-                st.plotly_chart(fig, use_container_width=True)
+                plotly_chart(fig, use_container_width=True)
                 
                 # 最も評価が高い感情カテゴリ
-                if any(emotion_avg.values()):
-                    best_emotion = max(emotion_avg.items(), key=lambda x: x[1])
-                    if best_emotion[1] > 0:
-                        st.info(f"💭 「{best_emotion[0]}」な表現をした日の平均評価が最も高いです（平均{best_emotion[1]:.1f}点）")
+                best_emotion = emotion_df["average"].idxmax()
+                if emotion_df["average"].max() > 0:
+                    st.info(f"💭 「{best_emotion}」な表現をした日の平均評価が最も高いです（平均{emotion_df['average'].max():.1f}点）")
+
+                keyword_trends(diary, df)
             else:
                 st.info("単語抽出できませんでした")
         else:
@@ -764,23 +829,23 @@ def show_statistics():
             title="睡眠時間と評価の関係",
             labels={"sleep_hours": "睡眠時間（時間）", "rating": "評価"}
         )
-        st.plotly_chart(sleep_rating_scatter, use_container_width=True)
+        plotly_chart(sleep_rating_scatter, use_container_width=True)
         
-        # 睡眠時間と評価の相関係数
-        correlation = df["sleep_hours"].corr(df["rating"])
+        # 睡眠時間と評価の相関係数・睡眠時間の区切りごとの平均評価
+        sleep = analytics.sleep_summary(df)
+        correlation = sleep["correlation"]
+        sleep_avg = sleep["average"]
         st.write(f"睡眠時間と評価の相関係数：{correlation:.2f}")
 
-        # 睡眠時間ごとの平均評価
-        sleep_avg = df.groupby("sleep_hours")["rating"].mean().sort_index()
-
         sleep_avg_fig = px.bar(
-            x=sleep_avg.index, 
+            x=sleep_avg.index.astype(str), 
             y=sleep_avg.values,
             title="睡眠時間別の平均評価",
-            labels={"x": "睡眠時間（時間）", "y": "平均評価"}
+            labels={"x": "睡眠時間", "y": "平均評価"},
+            text=[f"({count}日)" for count in sleep["count"]]
         )
 
-        st.plotly_chart(sleep_avg_fig, use_container_width=True)
+        plotly_chart(sleep_avg_fig, use_container_width=True)
 
         # 睡眠時間と評価の分析情報
         if correlation > 0.5:
@@ -792,64 +857,156 @@ def show_statistics():
 
         # 最も評価が高い睡眠時間
         best_sleep_hours = sleep_avg.idxmax()
-        st.info(f"🛌 評価が最も高い睡眠時間は「{best_sleep_hours}時間」です（平均{sleep_avg.max():.1f}点）")
+        st.info(f"🛌 評価が最も高い睡眠時間は「{best_sleep_hours}」です（平均{sleep_avg.max():.1f}点）")
+
+        lag_section(df)
+
+    # タブ6: いつもと違う日（外れ値と変化点）
+    with tabs[5]:
+        anomaly_section(df)
+
+# k 日前の睡眠時間・活動・天気・体調とその日の評価の関係（項目・日数を選び直しても、この部分だけを再実行する）
+@fragment("fragment:lags")
+def lag_section(df):
+    st.subheader("⏪ 前の日の影響")
+    st.caption("k 日前にその項目があった日となかった日で、その日の評価の平均がどれだけ違うか（睡眠時間は1時間あたり）。縦線は 95% 信頼区間です。")
+    effects = precomputed("lags", lambda: lags.lag_effects(df))
+
+    group = st.selectbox("項目の種類", list(lags.GROUPS), key="lag_group")
+    in_group = effects[(effects["group"] == group) & effects["effect"].notna()]
+    if in_group.empty:
+        st.info("比べられるだけの日数がまだありません。")
+        return
+    # 初期値は前日の効果が大きい項目
+    ranked = in_group[in_group["lag"] == min(1, in_group["lag"].max())]
+    ranked = ranked.reindex(ranked["effect"].abs().sort_values(ascending=False).index)
+    names = list(dict.fromkeys(in_group["feature"]))
+    selected = st.multiselect("項目", names, default=list(ranked["feature"].head(3)), key=f"lag_features_{group}")
+
+    fig = go.Figure()
+    for name in selected:
+        rows = in_group[in_group["feature"] == name]
+        fig.add_scatter(
+            x=rows["lag"], y=rows["effect"], mode="lines+markers", name=name,
+            error_y=dict(type="data", symmetric=False, array=rows["ci_high"] - rows["effect"], arrayminus=rows["effect"] - rows["ci_low"])
+        )
+    fig.add_hline(y=0, line_dash="dot", line_color="gray")
+    fig.update_layout(
+        title="k 日前の項目とその日の評価",
+        xaxis=dict(title="何日前か（k）", tickmode="linear", dtick=1),
+        yaxis_title="評価の差" if group != lags.SLEEP else "1時間あたりの評価の差"
+    )
+    plotly_chart(fig, use_container_width=True)
+
+    # 選んだ日数で効果の大きい項目（すべての種類）
+    lag = st.slider("何日前の影響を一覧にするか", 0, lags.MAX_LAG, 1, key="lag_days")
+    top = lags.strongest(effects, lag, significant_only=st.checkbox("信頼区間が 0 をまたがないものだけ", key="lag_significant"))
+    if top.empty:
+        st.info("条件に合う項目がありません。")
+        return
+    st.dataframe(
+        pd.DataFrame({
+            "項目": top["feature"],
+            "種類": top["group"],
+            "あった日": top["n_with"],
+            "なかった日": top["n_without"],
+            "評価の差": top["effect"].round(2),
+            "95% 信頼区間": [f"{low:+.2f} 〜 {high:+.2f}" for low, high in zip(top["ci_low"], top["ci_high"])],
+            "効果量 (d)": top["d"].round(2),
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+
+# 外れ値と変化点（項目・期間を選び直しても、この部分だけを再実行する）
+@fragment("fragment:anomaly")
+def anomaly_section(df):
+    st.subheader("いつもと違う日と調子の変化")
+    st.caption(
+        f"直近{anomaly.WINDOW}個の値の中央値からの離れ具合（ロバスト z スコア）が {anomaly.THRESHOLD} を超えた日を外れ値、"
+        "ずれが続いて溜まった時点を変化点としています。"
+    )
+    detector = get_anomalies(df)
+    frame = detector.frame
+
+    col1, col2 = st.columns(2)
+    with col1:
+        column = st.selectbox("項目", list(anomaly.COLUMN_LABELS), format_func=anomaly.COLUMN_LABELS.get, key="anomaly_column")
+    with col2:
+        days = st.selectbox("表示する期間", [90, 365, None], format_func=lambda d: "全期間" if d is None else f"直近{d}日", key="anomaly_days")
+
+    label = anomaly.COLUMN_LABELS[column]
+    start = None if days is None or frame.empty else frame.index.max() - pd.Timedelta(days=days - 1)
+    shown = frame if start is None else frame[frame.index >= start]
+    values = shown[f"{column}_value"].dropna()
+    outliers = shown[shown[f"{column}_outlier"]]
+    changes = detector.event_frame(column, anomaly.CHANGEPOINT)
+    if start is not None:
+        changes = changes[changes["date"] >= start]
+
+    fig = go.Figure()
+    fig.add_scatter(x=values.index, y=values.values, mode="lines+markers", name=label, marker=dict(size=4))
+    fig.add_scatter(
+        x=outliers.index, y=outliers[f"{column}_value"], mode="markers", name="外れ値",
+        marker=dict(size=12, color="red", symbol="x")
+    )
+    # 変化点は、ずれが溜まり始めた日から検出した日までを塗る
+    for change in changes.itertuples():
+        fig.add_vrect(
+            x0=change.start, x1=change.date, line_width=0, opacity=0.2,
+            fillcolor="green" if change.direction == anomaly.UP else "orange"
+        )
+    fig.update_layout(title=f"{label}の外れ値と変化点（緑: 上昇、橙: 低下）", xaxis_title="日付", yaxis_title=label)
+    plotly_chart(fig, use_container_width=True)
+
+    latest = detector.event_frame(column)
+    if not latest.empty:
+        event = latest.iloc[0]
+        st.info(f"🔔 最近の{event['kind']}: {event['date']:%Y/%m/%d} に{label}が{event['direction']}しました（{event['value']:g}）")
+
+    # 最近の外れ値・変化点（すべての項目）
+    events = detector.event_frame().head(20)
+    if events.empty:
+        st.info("外れ値・変化点はまだ見つかっていません。")
+        return
+    st.write("📋 最近の外れ値・変化点")
+    st.dataframe(
+        pd.DataFrame({
+            "日付": events["date"].dt.strftime("%Y/%m/%d"),
+            "項目": events["column"].map(anomaly.COLUMN_LABELS),
+            "種類": events["kind"],
+            "向き": events["direction"],
+            "始まり": events["start"].dt.strftime("%Y/%m/%d"),
+            "値": events["value"],
+            "z スコア": events["z"].round(2),
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
 
 def advanced_visualizations():
     st.subheader("🔍 高度な可視化分析")
 
     diary = load_diary()
     
-    # DataFrame に変換
-    df = pd.DataFrame(diary)
-    
-    # データの前処理
-    df['date'] = pd.to_datetime(df['date'])
-    df['weekday'] = df['date'].dt.day_name()
-    df['month'] = df['date'].dt.month_name()
+    # DataFrame に変換（日付順・曜日付き。本文とメモは使わないので読まない）
+    df = analysis_frame(diary, ["date", "weather", "health", "rating", "activities", "mood", "sleep_hours", "weekday"])
     
     # タブで分析項目を分ける
-    viz_tabs = st.tabs(["時系列ヒートマップ", "相関マトリックス"])
+    viz_tabs = st.tabs(["時系列ヒートマップ", "相関マトリックス", "共起ネットワーク"])
     
     # タブ1: 時系列ヒートマップ
     with viz_tabs[0]:
         st.write("📅 週別・月別の評価ヒートマップ")
         
-        # 日付から年と週番号を抽出
-        df['year'] = df['date'].dt.isocalendar().year
-        df['week'] = df['date'].dt.isocalendar().week
-        
-        # ピボットテーブルで週と曜日でデータを集計
-        pivot_df = df.pivot_table(
-            index=['year', 'week'], 
-            columns='weekday', 
-            values='rating', 
-            aggfunc='mean'
-        ).reset_index()
-        
-        # 年と週から日付文字列を作成
-        def get_week_label(year, week):
-            try:
-                # その週の月曜日を取得
-                monday = datetime.strptime(f'{year}-{week}-1', '%Y-%W-%w')
-                return monday.strftime('%m/%d週')
-            except:
-                return f"{year}-W{week}"
-        
-        # ラベルを作成
-        week_labels = [get_week_label(r['year'], r['week']) for i, r in pivot_df.iterrows()]
-        
-        # 曜日の順序を設定
-        weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        pivot_df = pivot_df[['year', 'week'] + [day for day in weekday_order if day in pivot_df.columns]]
-        
-        # ヒートマップ用のデータを準備
-        heatmap_data = pivot_df.iloc[:, 2:].values  # 年・週を除く
+        # 週と曜日でデータを集計
+        heatmap = analytics.weekly_heatmap(df)
         
         # ヒートマップの作成
         fig = go.Figure(data=go.Heatmap(
-            z=heatmap_data,
-            x=[day for day in weekday_order if day in pivot_df.columns],
-            y=week_labels,
+            z=heatmap["z"],
+            x=heatmap["weekdays"],
+            y=heatmap["weeks"],
             colorscale='RdYlGn',  # 赤（低評価）から緑（高評価）のカラースケール
             zmin=1, zmax=5
         ))
@@ -861,59 +1018,18 @@ def advanced_visualizations():
             height=600
         )
         
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig, use_container_width=True)
         
         # インサイトの表示
-        best_week_idx = np.argmax(pivot_df.iloc[:, 2:].mean(axis=1))
-        best_week = week_labels[best_week_idx]
-        st.info(f"📊 評価が最も高かった週は {best_week} でした。")
+        if heatmap["best_week"]:
+            st.info(f"📊 評価が最も高かった週は {heatmap['best_week']} でした。")
     
     # タブ2: 相関マトリックス
     with viz_tabs[1]:
         st.write("🔄 各要素間の相関関係")
         
-        # 相関分析用のデータを準備
-        corr_data = pd.DataFrame()
-        corr_data['rating'] = df['rating']
-        corr_data['sleep_hours'] = df['sleep_hours']
-        
-        # 天気をダミー変数に変換
-        if 'weather' in df.columns:
-            weather_dummies = pd.get_dummies(df['weather'], prefix='weather')
-            corr_data = pd.concat([corr_data, weather_dummies], axis=1)
-        
-        # 体調をダミー変数に変換
-        if 'health' in df.columns:
-            health_dummies = pd.get_dummies(df['health'], prefix='health')
-            corr_data = pd.concat([corr_data, health_dummies], axis=1)
-        
-        # 気分をダミー変数に変換
-        if 'mood' in df.columns:
-            mood_data = df[df['mood'] != '選択しない']
-            if not mood_data.empty:
-                mood_dummies = pd.get_dummies(mood_data['mood'], prefix='mood')
-                # インデックスをリセットして結合
-                mood_dummies.index = mood_data.index
-                corr_data = pd.concat([corr_data, mood_dummies.reindex(corr_data.index, fill_value=0)], axis=1)
-        
-        # 活動をダミー変数に変換
-        if 'activities' in df.columns:
-            all_activities = set()
-            for acts in df['activities']:
-                if isinstance(acts, list):
-                    all_activities.update(acts)
-            
-            for activity in all_activities:
-                corr_data[f'activity_{activity}'] = df['activities'].apply(
-                    lambda x: 1 if isinstance(x, list) and activity in x else 0
-                )
-        
-        # 曜日をダミー変数に変換
-        weekday_dummies = pd.get_dummies(df['weekday'], prefix='weekday')
-        corr_data = pd.concat([corr_data, weekday_dummies], axis=1)
-        
         # 相関行列を計算
-        corr_matrix = corr_data.corr()
+        corr_matrix = precomputed("correlation", lambda: analytics.correlation_matrix(df))
         
         # 相関マトリックスのヒートマップを作成
         fig = go.Figure(data=go.Heatmap(
@@ -930,27 +1046,56 @@ def advanced_visualizations():
             width=700
         )
         
-        st.plotly_chart(fig)
+        plotly_chart(fig)
         
         # 評価との相関が高い要素を表示
-        rating_corr = corr_matrix['rating'].drop('rating').sort_values(ascending=False)
+        rating_corr = analytics.rating_correlations(corr_matrix)
         
         st.write("⭐ 評価と最も関連性が高い要素:")
-        for idx, (item, corr) in enumerate(rating_corr.head(5).items()):
+        for idx, (item, corr) in enumerate(rating_corr.items()):
             direction = "正の" if corr > 0 else "負の"
             strength = "強い" if abs(corr) > 0.5 else "やや"
             st.write(f"{idx+1}. **{item}**: {strength}{direction}相関 ({corr:.2f})")
 
-# CSV形式でエクスポートする関数
-def export_to_csv(diary_data):
-    df = pd.DataFrame(diary_data)
-    # sleep_hoursをcsvに追加
-    if "sleep_hours" not in df.columns:
-      df["sleep_hours"] = ""
+    # タブ3: 共起ネットワーク
+    with viz_tabs[2]:
+        cooccurrence_section(diary, df)
+
+# 活動とキーワードの共起ネットワーク（重み・絞り込みを変えても、この部分だけを再実行する）
+#   ネットワーク自体はデータのバージョンごとに事前計算したものを使い、ここでは絞り込みと配置だけを行う
+@fragment("fragment:cooccurrence")
+def cooccurrence_section(diary, df):
+    st.write("🕸️ 同じ日に出てきやすい活動とキーワード")
+    network = precomputed("cooccurrence", lambda: cooccurrence.build_network(df, term_matrix(diary)))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        weight = st.selectbox("重み", list(cooccurrence.WEIGHTS), format_func=cooccurrence.WEIGHTS.get, key="cooccurrence_weight")
+        pair = st.selectbox("組み合わせ", list(cooccurrence.PAIR_KINDS), key="cooccurrence_pair")
+    with col2:
+        min_count = st.slider("同じ日に出てきた日数（以上）", cooccurrence.MIN_COUNT, 20, 3, key="cooccurrence_min_count")
+        limit = st.slider("表示する組み合わせの数", 10, 100, 40, step=10, key="cooccurrence_limit")
+
+    edges = cooccurrence.top_edges(network, weight, min_count, limit, cooccurrence.PAIR_KINDS[pair])
+    if edges.empty:
+        st.info("条件に合う組み合わせがありません。日数の下限を下げてみてください。")
+        return
+
+    items = list(dict.fromkeys(list(edges["source"]) + list(edges["target"])))
+    positions = cooccurrence.layout(items, edges, weight)
+    plotly_chart(charts.network_graph(network["nodes"], edges, positions, weight), use_container_width=True)
+    st.caption("■ は活動、● はキーワード。色はその項目が出てきた日の平均評価です。")
 
-    # エクスポートするカラムの順番を固定
-    df = df[["date", "content", "weather", "health", "rating", "activities", "mood", "memo", "sleep_hours"]]
-    return df.to_csv(index=False).encode('utf-8-sig')  # 日本語のためにUTF-8 with BOMを使用
+    # 組み合わせごとの評価（全体の平均との差が大きい順）
+    table = edges.sort_values("delta", ascending=False, kind="stable")
+    st.dataframe(
+        table[["source", "target", "count", "lift", "pmi", "average", "delta"]].rename(columns={
+            "source": "項目1", "target": "項目2", "count": "日数", "lift": "リフト", "pmi": "PMI",
+            "average": "平均評価", "delta": "全体の平均との差",
+        }).round(2),
+        hide_index=True,
+        use_container_width=True
+    )
 
 
 # 習慣化支援（連続記録表示）機能
@@ -962,69 +1107,30 @@ def habit_tracking():
         st.info("まだ日記データがありません。")
         return
     
-    # DataFrameに変換
-    df = pd.DataFrame(diary)
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date")
-    
-    # 日付範囲を取得
-    min_date = df["date"].min()
-    max_date = df["date"].max()
-    date_range = pd.date_range(start=min_date, end=max_date)
-    
     # 連続記録の計算
     st.subheader("🔄 連続記録状況")
     
-    # 現在の連続記録を計算
-    current_streak = 0
-    last_date = datetime.now().date()
-    
-    # 日付順にソート
-    sorted_dates = sorted([pd.to_datetime(d["date"]).date() for d in diary], reverse=True)
-    
-    for i, date in enumerate(sorted_dates):
-        if i == 0:
-            current_streak = 1
-        else:
-            prev_date = sorted_dates[i-1]
-            if (prev_date - date).days == 1:  # 連続している
-                current_streak += 1
-            else:
-                break
-    
-    # 最長連続記録を計算
-    all_dates = sorted([pd.to_datetime(d["date"]).date() for d in diary])
-    longest_streak = 1
-    current = 1
-    
-    for i in range(1, len(all_dates)):
-        if (all_dates[i] - all_dates[i-1]).days == 1:
-            current += 1
-        else:
-            longest_streak = max(longest_streak, current)
-            current = 1
-    
-    longest_streak = max(longest_streak, current)
+    # 現在の連続記録・最長連続記録・記録率
+    streak = precomputed("streaks", lambda: features.streaks(feature_frame(diary)))
     
     # メトリクス表示
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("現在の連続記録", f"{current_streak}日")
+        st.metric("現在の連続記録", f"{streak['current']}日")
     
     with col2:
-        st.metric("最長連続記録", f"{longest_streak}日")
+        st.metric("最長連続記録", f"{streak['longest']}日")
     
     with col3:
-        completion_rate = int(len(df) / len(date_range) * 100)
-        st.metric("記録率", f"{completion_rate}%")
+        st.metric("記録率", f"{streak['completion_rate']}%")
     
     # カレンダーヒートマップ表示
     st.subheader("📅 記録カレンダー")
     
     # 月を選択
     current_month = datetime.now().strftime("%Y-%m")
-    all_months = sorted(df["date"].dt.strftime("%Y-%m").unique())
+    all_months = sorted(set(d["date"][:7] for d in diary))
     
     if current_month in all_months:
         default_index = all_months.index(current_month)
@@ -1044,8 +1150,7 @@ def habit_tracking():
         cal = calendar.monthcalendar(year, int(month))
         
         # 月のデータを抽出
-        month_data = df[df["date"].dt.strftime("%Y-%m") == selected_month]
-        month_dates = set(month_data["date"].dt.strftime("%Y-%m-%d"))
+        month_dates = set(d["date"] for d in diary if d["date"].startswith(selected_month))
         
         # カレンダーヘッダー
         cols = st.columns(7)
@@ -1109,42 +1214,102 @@ def habit_tracking():
 
 # 📊 週間サマリーレポート機能
 def weekly_summary_report():
-    st.header("📈 週間サマリーレポート")
+    st.header("📈 サマリーレポート")
     
     diary = load_diary()
     if len(diary) == 0:
         st.info("まだ日記データがありません。")
         return
     
-    # DataFrameに変換
-    df = pd.DataFrame(diary)
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.sort_values("date")
+    # DataFrameに変換（日付順・曜日付き）
+    df = analysis_frame(diary)
     
-    # 週の選択
-    # 利用可能な週を計算
-    df['week_start'] = df['date'].dt.to_period('W').dt.start_time
-    df['week_end'] = df['date'].dt.to_period('W').dt.end_time
-    df['week_label'] = df['week_start'].dt.strftime('%Y/%m/%d') + ' - ' + df['week_end'].dt.strftime('%Y/%m/%d')
-    
-    available_weeks = sorted(df['week_label'].unique(), reverse=True)
-    
-    if not available_weeks:
-        st.warning("週ごとのデータがありません。")
+    period_report_section(diary, df)
+    forecast_section(df)
+
+# キーワードの推移（単語・集計の単位・比べる期間を選び直しても、この部分だけを再実行する）
+@fragment("fragment:keyword_trends")
+def keyword_trends(diary, df):
+    st.write("📈 キーワードの推移")
+    matrix = term_matrix(diary)
+    counts = matrix.term_counts()
+    if counts.empty:
         return
-    
-    selected_week = st.selectbox("週を選択", available_weeks)
-    
-    # 選択された週の開始日と終了日
-    week_range = selected_week.split(' - ')
-    start_date = pd.to_datetime(week_range[0])
-    end_date = pd.to_datetime(week_range[1])
-    
-    # その週のデータを取得
-    week_data = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
-    
-    if week_data.empty:
-        st.warning("選択された週のデータがありません。")
+
+    selected = st.multiselect("推移を見る単語", list(counts.index[:500]), default=list(counts.index[:3]), key="trend_terms")
+    freq = st.radio("集計の単位", list(terms.FREQUENCIES), format_func=terms.FREQUENCIES.get, horizontal=True, key="trend_freq")
+    if selected:
+        trend = matrix.term_frequency(selected, freq)
+        fig = px.line(
+            trend,
+            markers=True,
+            title="単語の出現回数の推移",
+            labels={"index": "期間", "value": "出現回数", "variable": "単語"}
+        )
+        plotly_chart(fig, use_container_width=True)
+
+        # 単語が出てきた日の平均評価
+        ratings = matrix.term_ratings(selected, df.set_index("date")["rating"])
+        st.dataframe(
+            ratings.rename(columns={"term": "単語", "days": "日数", "average": "平均評価", "delta": "全体の平均との差"}).round(2),
+            hide_index=True,
+            use_container_width=True
+        )
+
+    # 直近の期間とその前の同じ長さの期間で、1日あたりの出現回数が増えた・減った単語
+    window = st.selectbox("比べる期間", [30, 90, 180, 365], format_func=lambda days: f"直近{days}日とその前の{days}日", key="trend_window")
+    end = df["date"].max()
+    after = (end - pd.Timedelta(days=window - 1), end)
+    before = (end - pd.Timedelta(days=2 * window - 1), end - pd.Timedelta(days=window))
+    changes = matrix.rising_terms(before, after)
+    columns = {"term": "単語", "before": "前の期間", "after": "直近"}
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("⬆️ 増えた単語")
+        st.dataframe(changes[changes["change"] > 0].head(10)[list(columns)].rename(columns=columns), hide_index=True, use_container_width=True)
+    with col2:
+        st.write("⬇️ 減った単語")
+        falling = changes[changes["change"] < 0].sort_values("change", kind="stable").head(10)
+        st.dataframe(falling[list(columns)].rename(columns=columns), hide_index=True, use_container_width=True)
+
+# レポートの期間の単位（週・月・四半期・年と、日付で指定する期間）
+CUSTOM_PERIOD = "custom"
+PERIOD_CHOICES = {**{kind: name for kind, (_, name, _) in periods.PERIOD_KINDS.items()}, CUSTOM_PERIOD: "期間を指定"}
+
+# 選んだ期間のレポート（期間を選び直しても、この部分だけを再実行する）
+#   事前に作った日ごと・期間ごとの集計を足すだけなので、1年分や数年分の期間も1週間分と同じように表示できる
+@fragment("fragment:period_report")
+def period_report_section(diary, df):
+    aggregates = period_aggregates(diary, df)
+    kind = st.radio("期間の単位", list(PERIOD_CHOICES), format_func=PERIOD_CHOICES.get, horizontal=True, key="report_kind")
+    
+    if kind == CUSTOM_PERIOD:
+        first, last = df["date"].min().date(), df["date"].max().date()
+        selected = st.date_input(
+            "期間",
+            value=(max(first, last - pd.Timedelta(days=29)), last),
+            min_value=first,
+            max_value=last,
+            key="report_range"
+        )
+        if len(selected) != 2:
+            st.info("開始日と終了日を選んでください。")
+            return
+        start_date, end_date = pd.Timestamp(selected[0]), pd.Timestamp(selected[1])
+        period_name, prev_label = "期間", "前の期間"
+        report = aggregates.range_report(start_date, end_date)
+    else:
+        _, period_name, prev_label = periods.PERIOD_KINDS[kind]
+        options = {periods.period_label(kind, period): period for period in aggregates.options(kind)}
+        if not options:
+            st.warning(f"{period_name}ごとのデータがありません。")
+            return
+        selected = options[st.selectbox(f"{period_name}を選択", list(options), key=f"report_{kind}")]
+        start_date, end_date = periods.bounds(selected)
+        report = aggregates.report(kind, selected)
+    
+    if report is None:
+        st.warning(f"選択された{period_name}のデータがありません。")
         return
     
     # 1. 基本統計情報
@@ -1153,32 +1318,23 @@ def weekly_summary_report():
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        entry_count = len(week_data)
-        max_count = 7  # 1週間の最大日数
-        completion_rate = int((entry_count / max_count) * 100)
-        st.metric("記録日数", f"{entry_count}/{max_count}日")
+        max_count = (end_date - start_date).days + 1  # 期間の日数
+        st.metric("記録日数", f"{report['entry_count']}/{max_count}日")
     
     with col2:
-        avg_rating = week_data['rating'].mean()
-        st.metric("平均評価", f"{avg_rating:.1f}点")
+        st.metric("平均評価", f"{report['avg_rating']:.1f}点")
     
     with col3:
-        # 前週との比較
-        prev_week_start = start_date - timedelta(days=7)
-        prev_week_end = end_date - timedelta(days=7)
-        prev_week_data = df[(df['date'] >= prev_week_start) & (df['date'] <= prev_week_end)]
-        
-        if not prev_week_data.empty:
-            prev_avg_rating = prev_week_data['rating'].mean()
-            delta = avg_rating - prev_avg_rating
-            st.metric("前週比", f"{avg_rating:.1f}", f"{delta:+.1f}")
+        # 前の期間との比較
+        if report["prev_avg_rating"] is not None:
+            delta = report["avg_rating"] - report["prev_avg_rating"]
+            st.metric(f"{prev_label}比", f"{report['avg_rating']:.1f}", f"{delta:+.1f}")
         else:
-            st.metric("前週比", "データなし")
+            st.metric(f"{prev_label}比", "データなし")
     
     with col4:
-        if 'sleep_hours' in week_data.columns:
-            avg_sleep = week_data['sleep_hours'].mean()
-            st.metric("平均睡眠時間", f"{avg_sleep:.1f}時間")
+        if pd.notna(report["avg_sleep"]):
+            st.metric("平均睡眠時間", f"{report['avg_sleep']:.1f}時間")
         else:
             st.metric("平均睡眠時間", "データなし")
     
@@ -1188,142 +1344,88 @@ def weekly_summary_report():
     col1, col2 = st.columns(2)
     
     with col1:
-        if 'health' in week_data.columns:
-            health_counts = week_data['health'].value_counts()
-            fig = px.pie(names=health_counts.index, values=health_counts.values, title="体調の分布")
-            st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(charts.distribution_pie(report["health_counts"], "体調の分布"), use_container_width=True)
     
     with col2:
-        if 'mood' in week_data.columns and (week_data['mood'] != '選択しない').any():
-            mood_data = week_data[week_data['mood'] != '選択しない']
-            if not mood_data.empty:
-                mood_counts = mood_data['mood'].value_counts()
-                fig = px.pie(names=mood_counts.index, values=mood_counts.values, title="気分の分布")
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("気分のデータがありません。")
+        mood_counts = report["mood_counts"]
+        if not mood_counts.empty:
+            plotly_chart(charts.distribution_pie(mood_counts, "気分の分布"), use_container_width=True)
         else:
             st.info("気分のデータがありません。")
     
     # 3. 活動の集計
     st.subheader("🏃‍♂️ 活動の集計")
     
-    if 'activities' in week_data.columns:
-        # すべての活動リスト
-        all_activities = []
-        for acts in week_data['activities']:
-            if isinstance(acts, list):
-                all_activities.extend(acts)
+    activity_counts = report["activity_counts"]
+    if not activity_counts.empty:
+        plotly_chart(charts.count_bar(activity_counts, "実施した活動", "活動内容", "回数"), use_container_width=True)
         
-        if all_activities:
-            activity_counts = pd.Series(all_activities).value_counts()
-            fig = px.bar(
-                x=activity_counts.index, 
-                y=activity_counts.values, 
-                title="実施した活動",
-                labels={"x": "活動内容", "y": "回数"}
-            )
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # 最も多く行った活動
-            most_common = activity_counts.idxmax()
-            st.success(f"💪 今週最も多く行った活動は「{most_common}」です（{activity_counts.max()}回）")
-        else:
-            st.info("活動データがありません。")
+        # 最も多く行った活動
+        most_common = activity_counts.idxmax()
+        st.success(f"💪 この{period_name}に最も多く行った活動は「{most_common}」です（{activity_counts.max()}回）")
     else:
         st.info("活動データがありません。")
     
     # 4. 日々の評価の推移
     st.subheader("📈 評価の推移")
     
-    # 日付でソート
-    week_data_sorted = week_data.sort_values('date')
-    fig = px.line(
-        week_data_sorted, 
-        x='date', 
-        y='rating',
-        title="日々の評価の推移",
-        labels={"rating": "評価", "date": "日付"},
-        markers=True
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(charts.rating_line(report["data"]), use_container_width=True)
     
     # 5. 重要な出来事のハイライト
-    st.subheader("✨ 週のハイライト")
+    st.subheader(f"✨ {period_name}のハイライト")
     
-    # 最高評価の日
-    if not week_data.empty:
-        best_day = week_data.loc[week_data['rating'].idxmax()]
-        
+    # 最高評価の日と最低評価の日
+    best_day = report["best_day"]
+    worst_day = report["worst_day"]
+    
+    if best_day is not None:
         st.markdown(f"""
-        ### 今週のベストデー: {best_day['date'].strftime('%Y/%m/%d')} ({best_day.get('rating', 'N/A')}点)
+        ### ベストデー: {best_day['date'].strftime('%Y/%m/%d')} ({best_day['rating']}点)
         
-        **天気**: {best_day.get('weather', 'N/A')}  
-        **体調**: {best_day.get('health', 'N/A')}
+        **天気**: {best_day['weather'] or 'N/A'}  
+        **体調**: {best_day['health'] or 'N/A'}
         
-        **活動**: {', '.join(best_day.get('activities', [])) if isinstance(best_day.get('activities', []), list) else 'なし'}
+        **活動**: {', '.join(best_day['activities']) if best_day['activities'] else 'なし'}
         
         **記録内容**:  
-        {best_day.get('content', '')}
+        {best_day['content']}
         """)
     
+    if worst_day is not None and worst_day["date"] != best_day["date"]:
+        with st.expander(f"ワーストデー: {worst_day['date'].strftime('%Y/%m/%d')} ({worst_day['rating']}点)"):
+            st.markdown(f"""
+            **天気**: {worst_day['weather'] or 'N/A'}  
+            **体調**: {worst_day['health'] or 'N/A'}
+            
+            **活動**: {', '.join(worst_day['activities']) if worst_day['activities'] else 'なし'}
+            
+            **記録内容**:  
+            {worst_day['content']}
+            """)
+    
     # 6. キーワード分析
     st.subheader("🔍 頻出キーワード")
     
-    # テキストデータを結合
-    all_text = " ".join(week_data["content"].astype(str).tolist())
+    word_counts = report["keywords"]
     
-    if all_text.strip():
-        # Janome の Tokenizer を作成
-        t = Tokenizer()
-        
-        # 分かち書きされたテキストを格納するリスト
-        wakati_text = []
-        
-        # ストップワード（除外したい単語）を定義
-        japanese_stopwords = ["てる", "いる", "なる", "れる", "する", "ある", "こと", "これ", "さん", "して", 
-                            "くれる", "やる", "くる", "しまう", "いく", "ない", "のだ", "よう", "あり", "ため", 
-                            "ところ", "ます", "です", "から", "まで", "たり", "けど", "ので", "たい", "なる", 
-                            "もの", "それ", "その", "今日", "の", "られる", "日"]
-        
-        # 形態素解析で分かち書き
-        for token in t.tokenize(all_text):
-            # 品詞の取得
-            part_of_speech = token.part_of_speech.split(',')[0]
-            # 基本形の取得
-            base_form = token.base_form
-            
-            # 名詞、動詞、形容詞のみを抽出
-            if part_of_speech in ['名詞', '動詞', '形容詞'] and base_form not in japanese_stopwords:
-                # 除外したい単語以外を追加
-                wakati_text.append(base_form)
-        
-        # 出現回数をカウント
-        word_counts = pd.Series(wakati_text).value_counts().head(10)
-        
+    if not word_counts.empty:
         # 棒グラフで表示
-        fig = px.bar(
-            x=word_counts.index, 
-            y=word_counts.values,
-            title="頻出キーワードTop10",
-            labels={"x": "キーワード", "y": "出現回数"}
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(charts.count_bar(word_counts, "頻出キーワードTop10", "キーワード", "出現回数"), use_container_width=True)
     else:
         st.info("テキストデータがありません。")
     
-    # 7. 次週に向けた目標設定（任意入力）
-    st.subheader("🎯 次週の目標設定")
+    # 7. 次の期間に向けた目標設定（任意入力）
+    st.subheader(f"🎯 次の{period_name}の目標設定")
     
-    # 目標データの保存キー（週ごと）
-    goal_key = f"goal_{start_date.strftime('%Y%m%d')}"
+    # 目標データの保存キー（期間ごと）
+    goal_key = f"goal_{kind}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}"
     
     # 既存の目標データを取得
     # 本来はJSONファイルなどに保存するべきですが、簡易的にsession_stateを使用
     existing_goal = st.session_state.get(goal_key, "")
     
     # 目標の入力フィールド
-    new_goal = st.text_area("次週に向けた目標・アクションプラン", value=existing_goal, height=100)
+    new_goal = st.text_area(f"次の{period_name}に向けた目標・アクションプラン", value=existing_goal, height=100)
     
     if st.button("目標を保存", key="save_goal"):
         st.session_state[goal_key] = new_goal
@@ -1332,25 +1434,341 @@ def weekly_summary_report():
     # 8. レポートのエクスポート
     st.subheader("📋 レポートのエクスポート")
     
-    if st.button("週間レポートをCSVでエクスポート"):
-        # エクスポート用にデータを整形
-        export_data = week_data.copy()
-        
-        # 日付を文字列に変換
-        export_data['date'] = export_data['date'].dt.strftime('%Y-%m-%d')
-        
-        # CSVとしてエクスポート
-        csv = export_data.to_csv(index=False).encode('utf-8-sig')
+    if st.button("レポートをCSVでエクスポート"):
+        # CSVとしてエクスポート（日付は文字列に変換）
+        csv = frame_to_csv(report["data"])
         
         st.download_button(
             label="📥 CSVをダウンロード",
             data=csv,
-            file_name=f"weekly_summary_{start_date.strftime('%Y%m%d')}.csv",
+            file_name=f"{kind}_summary_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.csv",
             mime="text/csv",
         )
 
+# 翌週の評価の予測（直近の実際の評価・予測・予測の幅と、これまでの予測の誤差）
+@fragment("fragment:forecast")
+def forecast_section(df):
+    st.subheader("🔮 来週の評価の予測")
+    result = rating_forecast(df)
+    prediction = result["forecast"]
+    metrics = result["metrics"]
+    if prediction.empty:
+        st.info(f"予測には評価のある日記が{forecast.WARMUP}日分以上必要です。")
+        return
+
+    recent = df[df["rating"] >= MIN_RATING].tail(28)
+    fig = go.Figure()
+    fig.add_scatter(x=recent["date"], y=recent["rating"], mode="lines+markers", name="実際の評価")
+    fig.add_scatter(x=prediction["date"], y=prediction["high"], mode="lines", line=dict(width=0), showlegend=False, hoverinfo="skip")
+    fig.add_scatter(
+        x=prediction["date"], y=prediction["low"], mode="lines", line=dict(width=0), fill="tonexty",
+        fillcolor="rgba(99, 110, 250, 0.2)", name=f"予測の幅（{int(forecast.BAND_QUANTILES[0] * 100)}〜{int(forecast.BAND_QUANTILES[1] * 100)}%）"
+    )
+    fig.add_scatter(x=prediction["date"], y=prediction["prediction"], mode="lines+markers", line=dict(dash="dash"), name="予測")
+    fig.update_layout(title="直近の評価と来週の予測", xaxis_title="日付", yaxis=dict(title="評価", range=[0.5, 5.5]))
+    plotly_chart(fig, use_container_width=True)
+
+    # 検証の誤差（学習する前に出した予測と実際の評価の差）
+    st.caption(f"予測は学習する前の日記で出し、実際の評価と比べています（直近{metrics['n']}日分。学習した日記は{metrics['trained']}日分）。")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("平均絶対誤差 (MAE)", f"{metrics['mae']:.2f}" if metrics["n"] else "-")
+    with col2:
+        st.metric("二乗平均平方根誤差 (RMSE)", f"{metrics['rmse']:.2f}" if metrics["n"] else "-")
+    with col3:
+        if metrics["n"]:
+            # 直近30日の平均を予測にした場合より誤差が小さければ緑
+            st.metric("直近30日の平均で予測した場合の MAE", f"{metrics['baseline_mae']:.2f}", f"{metrics['mae'] - metrics['baseline_mae']:+.2f}", delta_color="inverse")
+        else:
+            st.metric("直近30日の平均で予測した場合の MAE", "-")
+
+    by_horizon = metrics["by_horizon"]
+    if by_horizon["n"].sum() > 0:
+        st.dataframe(
+            pd.DataFrame({
+                "何日先か": by_horizon["horizon"],
+                "予測した回数": by_horizon["n"],
+                "平均絶対誤差": by_horizon["mae"].round(2),
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+
+IMPORT_MODE_LABELS = {
+    importer.MERGE: "日付ごとに追加・上書き（ファイルにない日記は残す）",
+    importer.REPLACE: "ファイルの内容で置き換える",
+}
+
+# 取り込みの変更内容（追加・更新・削除の件数と読めなかった行）
+def show_import_summary(summary):
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("追加", f"{summary['added']}件")
+    col2.metric("更新", f"{summary['updated']}件")
+    col3.metric("変更なし", f"{summary['unchanged']}件")
+    col4.metric("削除", f"{summary['removed']}件")
+    col5.metric("読めない行", f"{summary['invalid']}件")
+    if summary["errors"]:
+        with st.expander(f"⚠️ 取り込めなかった日記（{summary['invalid']}件）"):
+            for error in summary["errors"]:
+                st.caption(error)
+
+# 一括操作の対象の一覧と件数
+def show_bulk_preview(summary):
+    st.caption(f"{summary['operation']}: {summary['changed']}件")
+    rows = pd.DataFrame(bulk.preview_rows(summary, limit=200))
+    if not rows.empty:
+        st.dataframe(
+            rows.rename(columns={"date": "日付", "action": "操作", "content": "内容", "mood": "気分", "activities": "活動"}),
+            hide_index=True,
+            use_container_width=True,
+        )
+        if summary["changed"] > len(rows):
+            st.caption(f"ほか{summary['changed'] - len(rows)}件")
+
+# 一括操作の確認と実行（確認では保存せず、実行すると1回の保存で反映する）
+#   confirm を指定すると、そのチェックボックス（件数を入れた文言）にチェックするまで実行できない
+#   （対象が変わったらチェックし直すように、対象の日付ごとに別のチェックボックスにする）
+def run_bulk_operation(result, summary, key, confirm=None):
+    confirmed = True
+    if confirm and summary["changed"]:
+        targets = hashlib.sha1("\n".join(date for date, _, _ in summary["changes"]).encode("utf-8")).hexdigest()
+        confirmed = st.checkbox(confirm, key=f"{key}_confirm_{targets}")
+    col1, col2 = st.columns(2)
+    preview = col1.button("🔍 対象を確認", key=f"{key}_preview")
+    execute = col2.button("実行", key=f"{key}_run", type="primary", disabled=not confirmed)
+    if preview or execute:
+        show_bulk_preview(summary)
+        if execute:
+            if summary["changed"]:
+                save_diary(result, f"{summary['operation']}（{summary['changed']}件）")
+                st.success(f"{summary['changed']}件の日記を変更しました。")
+            else:
+                st.info("対象の日記はありません。")
+
+# 🧰 日記の一括操作（期間・条件での削除、活動・気分の名前の変更と統合）
+def show_bulk_operations():
+    diary = load_diary()
+    if not diary:
+        st.info("まだ日記がありません。")
+        return
+    
+    delete_tab, rename_tab = st.tabs(["期間・条件で削除", "活動・気分の名前を変更・統合"])
+    _, _, all_activities = analytics.filter_options(diary)
+    
+    with delete_tab:
+        # 何も指定しないとすべての日記が対象になるので、期間は空から始め、期間か条件を指定するまで実行できないようにする
+        dates = [d["date"] for d in diary]
+        delete_range = st.date_input(
+            "期間（開始日と終了日）",
+            (),
+            min_value=datetime.strptime(min(dates), "%Y-%m-%d"),
+            max_value=datetime.strptime(max(dates), "%Y-%m-%d"),
+            key="bulk_delete_range",
+        )
+        query = st.text_input("本文・メモに含まれる文字", "", key="bulk_delete_query")
+        activities = st.multiselect("いずれかの活動を含む日記", all_activities, key="bulk_delete_activities")
+        if len(delete_range) == 1:
+            # 開始日だけを選んだところ（そのままだと開始日以降がすべて対象になる）
+            st.info("期間の終了日を選んでください。")
+        elif not (delete_range or query.strip() or activities):
+            st.info("削除する日記の期間か条件を指定してください。")
+        else:
+            start, end = delete_range or (None, None)
+            result, summary = bulk.delete_entries(
+                diary,
+                start.strftime("%Y-%m-%d") if start else None,
+                end.strftime("%Y-%m-%d") if end else None,
+                query,
+                activities=activities,
+            )
+            run_bulk_operation(result, summary, "bulk_delete", confirm=f"{summary['changed']}件の日記を削除することを確認しました")
+    
+    with rename_tab:
+        field = st.radio(
+            "項目",
+            list(bulk.RENAMABLE_FIELDS),
+            format_func=lambda f: bulk.RENAMABLE_FIELDS[f],
+            horizontal=True,
+            key="bulk_rename_field",
+        )
+        values = all_activities if field == "activities" else sorted(set(d.get("mood") for d in diary if d.get("mood")))
+        old_values = st.multiselect("変更前の名前（複数選ぶと1つにまとめる）", values, key="bulk_rename_old")
+        new_value = st.text_input("変更後の名前（既にある名前を入れるとそこにまとめる）", "", key="bulk_rename_new")
+        if old_values and new_value.strip():
+            result, summary = bulk.rename_values(diary, field, old_values, new_value.strip())
+            run_bulk_operation(result, summary, "bulk_rename")
+
+# 🕰️ 増分バックアップから過去の時点に戻す（日記全体、または特定の日付だけ）
+def show_backup_restore():
+    if not BACKUP_DIR:
+        st.info("バックアップは無効になっています（DIARY_BACKUP_DIR）。")
+        return
+    
+    store = backup_store(current_tenant())
+    usage = store.disk_usage()
+    history = store.history()
+    st.caption(f"スナップショット {usage['manifests']}個・日記 {usage['blobs']}件分（{usage['bytes'] / 1024 / 1024:.1f} MB）")
+    if not history:
+        st.info("まだスナップショットがありません。")
+        return
+    
+    snapshots = {m["id"]: m for m in history}
+    manifest_id = st.selectbox(
+        "戻す時点",
+        list(snapshots),
+        format_func=lambda i: f"{datetime.fromtimestamp(snapshots[i]['created_at']):%Y-%m-%d %H:%M:%S}（{snapshots[i]['count']}件・{snapshots[i]['message']}）",
+        key="backup_point",
+    )
+    scope = st.radio("戻す範囲", ["日記全体", "特定の日付"], horizontal=True, key="backup_scope")
+    
+    current = load_diary()
+    date = None
+    if scope == "特定の日付":
+        dates = sorted(set(store.state(manifest_id)) | {d["date"] for d in current}, reverse=True)
+        date = st.selectbox("日付", dates, key="backup_date")
+        entry = store.restore_entry(manifest_id, date)
+        if entry is None:
+            st.caption("この時点ではこの日の日記はありません（戻すと削除されます）。")
+        else:
+            st.text_area("この時点の内容", entry.get("content", "") if isinstance(entry, dict) else str(entry), disabled=True, key=f"backup_content_{manifest_id}_{date}")
+    
+    # 比較はボタンを押したときだけ行い、結果は同じ時点・範囲・データのバージョンの間だけ使う
+    #   （日記全体の内容を読むので、設定ページを開くたびには行わない）
+    preview_key = (current_tenant(), manifest_id, date, st.session_state.get("data_version"))
+    col1, col2, col3 = st.columns(3)
+    if col1.button("🔍 現在の内容と比較", key="backup_compare"):
+        # 読み込めなかった日記も含めた、保存されている元の内容と比べる
+        st.session_state["backup_preview"] = (preview_key, store.compare(manifest_id, tenant_state().to_stored(current), date))
+    preview = st.session_state.get("backup_preview")
+    changes = preview[1] if preview and preview[0] == preview_key else None
+    if changes is not None:
+        metric1, metric2, metric3 = st.columns(3)
+        metric1.metric("追加", f"{changes['added']}件")
+        metric2.metric("更新", f"{changes['updated']}件")
+        metric3.metric("削除", f"{changes['removed']}件")
+    
+    if col2.button("この時点に戻す", disabled=not (changes and any(changes.values())), key="backup_restore"):
+        # 保存されている元の内容（読み込めなかった日記も含む）を戻すので、ここでは付け足さない
+        # 戻した内容もスナップショットになるので、戻す前の時点にもまた戻せる
+        restored = store.restore_into(manifest_id, tenant_state().to_stored(current), date)
+        save_diary(restored, f"{datetime.fromtimestamp(snapshots[manifest_id]['created_at']):%Y-%m-%d %H:%M} の時点に戻す", keep_rejected=False)
+        st.session_state.pop("backup_preview", None)
+        st.success("過去の時点に戻しました。")
+    if col3.button("🧹 古いスナップショットを整理", key="backup_prune"):
+        result = store.prune()
+        st.success(f"スナップショット {result['removed']}個・日記 {result['removed_blobs']}件分を削除しました。")
+
+# 🔄 ローカルミラーの同期状況
+def show_sync_status():
+    if not MIRROR_DIR:
+        return
+    
+    mirror = get_storage()
+    status = mirror.status()
+    if status["error"]:
+        st.sidebar.warning(f"🔄 同期できません（未送信 {status['pending']}件）: {status['error']}")
+    elif status["pending"]:
+        st.sidebar.info(f"🔄 未送信: {status['pending']}件（{status['lag_seconds']:.0f}秒前から）")
+    elif status["last_sync"]:
+        st.sidebar.caption(f"✅ 同期済み（最終同期: {datetime.fromtimestamp(status['last_sync']):%H:%M:%S}）")
+    if st.sidebar.button("今すぐ同期", key="sync_now"):
+        mirror.request_sync()
+
+# ⚠️ 読み込めなかった日記（日付や評価の形式が正しくないもの）
+def show_load_errors():
+    errors = tenant_state().load_errors
+    if errors:
+        with st.sidebar.expander(f"⚠️ 読み込めなかった日記: {len(errors)}件"):
+            for error in errors[:20]:
+                st.caption(error)
+
+# 🐞 処理時間のデバッグパネル（今回の再実行でかかった時間の内訳）
+def show_trace_panel():
+    spans = trace.finish_run()
+    if not trace.ENABLED:
+        return
+    
+    if st.sidebar.checkbox("🐞 処理時間を表示", False, key="show_trace"):
+        total = next((s["ms"] for s in spans if s["name"] == "run:total"), 0)
+        summary = pd.DataFrame([s for s in trace.summarize(spans) if s["name"] != "run:total"])
+        st.sidebar.caption(f"今回の再実行: {total:.0f} ms（{trace.TRACE_FILE} に記録）")
+        if summary.empty:
+            st.sidebar.info("計測された処理はありません。")
+        else:
+            summary["name"] = ["　" * depth + name for depth, name in zip(summary["depth"], summary["name"])]
+            st.sidebar.dataframe(
+                summary[["name", "calls", "ms"]].rename(columns={"name": "処理", "calls": "回数", "ms": "時間(ms)"}),
+                hide_index=True,
+                use_container_width=True,
+            )
+
+# ⚙️ 事前計算の進み具合（計算中は1秒ごとに表示を更新する）
+def show_precompute_status():
+    pipeline = precompute_pipeline()
+    if not pipeline.status():
+        return
+    
+    polling = pipeline.running()
+    
+    def render():
+        # 計算が終わったら画面全体を更新して、事前計算の結果を使うようにする
+        if polling and not pipeline.running():
+            st.rerun()
+        rows = pipeline.status()
+        done = sum(row["state"] == "完了" for row in rows)
+        st.caption(f"⚙️ 分析の事前計算: {done}/{len(rows)}")
+        st.progress(done / len(rows))
+        with st.expander("内訳"):
+            st.dataframe(
+                pd.DataFrame(rows).rename(columns={"stage": "処理", "state": "状態", "ms": "時間(ms)", "error": "エラー"}),
+                hide_index=True,
+                use_container_width=True,
+            )
+    
+    with st.sidebar:
+        st.fragment(render, run_every=1 if polling else None)()
+
+# 📔 日記の選択（複数の日記があるときだけ表示。?diary=名前 で最初に開く日記を指定できる）
+def select_tenant():
+    if len(TENANTS) > 1:
+        if "tenant" not in st.session_state and st.query_params.get("diary") in TENANTS:
+            st.session_state["tenant"] = st.query_params["diary"]
+        st.sidebar.selectbox(
+            "📔 日記",
+            list(TENANTS),
+            format_func=lambda name: TENANTS[name].get("label", name),
+            key="tenant",
+        )
+    tenant_registry().enforce_budget(keep=current_tenant())
+
+# 👥 日記ごとのキャッシュのメモリ使用量
+def show_tenant_memory():
+    registry = tenant_registry()
+    summary = registry.memory_summary()
+    mb = 1024 * 1024
+    col1, col2, col3 = st.columns(3)
+    col1.metric("合計", f"{summary['total'] / mb:.1f} / {summary['budget'] / mb:.0f} MB")
+    col2.metric(f"利用中の日記（{summary['active_count']}件）の平均", f"{summary['active_avg'] / mb:.1f} MB")
+    col3.metric(f"待機中の日記（{summary['idle_count']}件）の平均", f"{summary['idle_avg'] / mb:.1f} MB")
+    st.caption(f"上限を超えて破棄したキャッシュ: {summary['evictions']}件")
+    
+    report = pd.DataFrame(registry.memory_report())
+    if not report.empty:
+        report["MB"] = (report["bytes"] / mb).round(2)
+        report["tenant"] = [TENANTS.get(name, {}).get("label", name) for name in report["tenant"]]
+        report["active"] = report["active"].map({True: "利用中", False: "待機中"})
+        st.dataframe(
+            report[["tenant", "active", "MB", "idle_seconds"]].rename(
+                columns={"tenant": "日記", "active": "状態", "idle_seconds": "最終利用からの秒数"}
+            ),
+            hide_index=True,
+            use_container_width=True,
+        )
+
 # メイン関数
 def main():
+    select_tenant()
+    
     # サイドバーメニュー  
     st.sidebar.markdown("### 📅 メニュー")  
     menu = st.sidebar.selectbox(  
@@ -1414,43 +1832,88 @@ def main():
         with st.expander("🔄 データのバックアップ"):
             st.write("日記データのバックアップ・復元")
             
-            # データのエクスポート
+            # データのエクスポート（期間を指定できる。ファイルはダウンロードしたときに作る）
             diary = load_diary()
             if diary:
-                st.download_button(
-                    "📥 データをJSONファイルとしてバックアップ",
-                    data=json.dumps(diary, indent=4, ensure_ascii=False),
-                    file_name="diary_backup.json",
-                    mime="application/json",
+                dates = [d["date"] for d in diary]
+                export_range = st.date_input(
+                    "期間",
+                    (datetime.strptime(min(dates), "%Y-%m-%d"), datetime.strptime(max(dates), "%Y-%m-%d")),
+                    key="export_range",
                 )
+                start, end = (list(export_range) + [None, None])[:2]
+                entries = list(select_entries(
+                    diary,
+                    start.strftime("%Y-%m-%d") if start else None,
+                    end.strftime("%Y-%m-%d") if end else None,
+                ))
+                st.caption(f"{len(entries)}件の日記")
+                export_download_button("📥 データをバックアップ", entries, "diary_backup", key="export_backup")
             
-            # データのインポート
+            # データのインポート（JSON 配列・JSONL・CSV を1件ずつ検証しながら取り込む）
             st.write("バックアップデータの復元:")
-            uploaded_file = st.file_uploader("JSONファイルをアップロード", type=["json"])
+            uploaded_file = st.file_uploader("JSON / JSONL / CSVファイルをアップロード", type=["json", "jsonl", "csv"])
             
             if uploaded_file is not None:
-                if st.button("ファイルから復元"):
+                import_mode = st.radio(
+                    "取り込み方法",
+                    [importer.MERGE, importer.REPLACE],
+                    format_func=lambda mode: IMPORT_MODE_LABELS[mode],
+                    key="import_mode",
+                )
+                col1, col2 = st.columns(2)
+                preview = col1.button("🔍 変更内容を確認")
+                restore = col2.button("ファイルから復元")
+                if preview or restore:
                     try:
-                        imported_data = json.loads(uploaded_file.getvalue().decode("utf-8"))
-                        save_diary(imported_data)
-                        st.success("データを正常に復元しました！")
+                        fmt = importer.detect_format(uploaded_file.name, uploaded_file.read(64))
+                        uploaded_file.seek(0)
+                        new_diary, summary = importer.apply_import(load_diary(), uploaded_file, fmt, import_mode)
+                        show_import_summary(summary)
+                        if restore:
+                            if importer.has_changes(summary):
+                                # 置き換えるときはファイルの内容だけにする（読み込めなかった日記も残さない）
+                                save_diary(new_diary, keep_rejected=import_mode == importer.MERGE)
+                                st.success("データを正常に復元しました！")
+                            else:
+                                st.info("変更はありませんでした。")
                     except Exception as e:
                         st.error(f"エラーが発生しました: {e}")
         
+        with st.expander("🧰 一括操作"):
+            show_bulk_operations()
+        
+        with st.expander("🕰️ 過去の時点に戻す"):
+            show_backup_restore()
+        
+        with st.expander("👥 日記ごとのメモリ使用量"):
+            show_tenant_memory()
+        
         with st.expander("💾 全データの削除"):
-            st.warning("⚠️ 注意: すべての日記データを削除します。この操作は元に戻せません。")
+            st.warning("⚠️ 注意: すべての日記データを削除します。")
+            if BACKUP_DIR:
+                st.caption("削除する前の内容は「🕰️ 過去の時点に戻す」から復元できます。")
             
-            if st.button("すべてのデータを削除", key="delete_all"):
-                if os.path.exists(JSON_FILE):
-                    os.remove(JSON_FILE)
+            confirmed = st.checkbox("すべての日記を削除することを確認しました", key="delete_all_confirm")
+            if st.button("すべてのデータを削除", key="delete_all", disabled=not confirmed):
+                diary = load_diary()
+                if diary:
+                    # 保存先（GitHub・ローカル・ミラー）に空の日記を1回書き込む
+                    save_diary([], f"すべての日記を削除（{len(diary)}件）", keep_rejected=False)
                     st.success("全データを削除しました。")
-                    st.balloons()
                 else:
-                    st.info("データファイルが存在しません。")
+                    st.info("削除する日記がありません。")
         
         # フッター
         st.markdown("---")
         st.markdown("© 2025 分析日記アプリ ver.1.0")
 
 if __name__ == "__main__":
-    main()
+    trace.start_run()
+    try:
+        main()
+    finally:
+        show_sync_status()
+        show_load_errors()
+        show_precompute_status()
+        show_trace_panel()
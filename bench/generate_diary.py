@@ -0,0 +1,152 @@
+import argparse
+import json
+import random
+from datetime import date, timedelta
+
+from diary_core.vocab import WEATHER_OPTIONS, HEALTH_OPTIONS, MOOD_OPTIONS, ACTIVITY_OPTIONS, NO_MOOD
+
+# ベンチマーク用の合成日記データを生成するスクリプト
+#   python -m bench.generate_diary --entries 10000 --out bench/data/diary_10000.json
+
+# 天気・体調・気分の出現しやすさ（WEATHER_OPTIONS などと同じ順番）
+WEATHER_WEIGHTS = [45, 30, 18, 3, 2, 2]
+HEALTH_WEIGHTS = [30, 35, 20, 5, 5, 5]
+MOOD_WEIGHTS = [30, 12, 12, 6, 6, 4, 5, 8, 10, 7]
+
+# 体調・天気が評価に与える影響
+HEALTH_EFFECT = {"元気": 0.5, "普通": 0.0, "少し疲れた": -0.4, "体調不良": -1.2, "絶好調": 1.0, "眠い": -0.3}
+WEATHER_EFFECT = {"晴れ": 0.2, "曇り": 0.0, "雨": -0.2, "雪": 0.1, "霧": -0.1, "台風": -0.5}
+
+# 本文を組み立てるための文の部品
+OPENINGS = ["今日は", "朝から", "午前中は", "昼過ぎに", "夕方は", "夜は", "久しぶりに", "仕事終わりに"]
+PLACES = ["カフェ", "図書館", "公園", "駅前", "スーパー", "実家", "会社", "近所の本屋", "映画館", "ジム"]
+PEOPLE = ["友達", "家族", "同僚", "先輩", "妹", "両親", "昔の友人"]
+ACTIONS = [
+    "{place}で少し作業をした。",
+    "{place}まで歩いて行った。",
+    "{people}と一緒にご飯を食べた。",
+    "{people}と電話で話した。",
+    "{place}に寄ってから帰った。",
+    "新しいレシピに挑戦した。",
+    "部屋の掃除をした。",
+    "溜まっていたメールを片付けた。",
+    "ポッドキャストを聞きながら散歩した。",
+    "明日の予定を考えながら早めに寝た。",
+]
+ACTIVITY_SENTENCES = {
+    "運動した": ["ジムで汗を流した。", "30分ほどランニングをした。", "ストレッチを念入りにした。"],
+    "読書した": ["積んでいた本を読み進めた。", "小説を一冊読み終えた。"],
+    "料理した": ["夕飯にカレーを作った。", "作り置きのおかずを何品か用意した。"],
+    "友達と会った": ["友達と久しぶりに会って話し込んだ。", "友達とランチに行った。"],
+    "家族と過ごした": ["家族とゆっくり過ごした。", "家族で買い物に出かけた。"],
+    "勉強した": ["資格の勉強を進めた。", "英語の勉強を1時間した。"],
+    "映画/TVを見た": ["映画を一本見た。", "ドラマの続きを見た。"],
+    "創作活動をした": ["アプリの開発を進めた。", "ブログの記事を書いた。", "絵を描いた。"],
+    "ゲームをした": ["ゲームで少し遊んだ。", "友達とオンラインでゲームをした。"],
+    "休息した": ["昼寝をしてのんびり過ごした。", "何もせずに休んだ。"],
+    "仕事をした": ["仕事で会議が続いた。", "仕事の資料作りに集中した。", "仕事が思ったより進んだ。"],
+    "新しいことを学んだ": ["新しいツールの使い方を学んだ。", "知らなかった歴史を調べた。"],
+}
+POSITIVE_SENTENCES = ["とても楽しい一日だった。", "嬉しい知らせがあった。", "最高の気分で過ごせた。", "目標を達成できて良い日だった。"]
+NEGATIVE_SENTENCES = ["少し疲れる一日だった。", "うまくいかなくて残念だった。", "明日のことが不安で心配になった。", "しんどい場面が多かった。"]
+NEUTRAL_SENTENCES = ["いろいろ考えることがあった。", "明日はもう少し早く起きたいと思う。", "特に変わったことはなかった。"]
+MEMOS = ["", "", "", "", "明日は早起きする", "買い物リストを更新", "読みたい本をメモした", "週末の予定を立てる"]
+
+
+# 1日分の本文を作る（評価が高いほど前向きな文が入りやすい）
+def _make_content(rng, activities, rating):
+    sentences = [rng.choice(OPENINGS) + rng.choice(ACTIONS).format(place=rng.choice(PLACES), people=rng.choice(PEOPLE))]
+    for activity in activities:
+        sentences.append(rng.choice(ACTIVITY_SENTENCES[activity]))
+
+    # 文の数は日によって大きく変わる（短い日が多く、ときどき長文）
+    extra = min(int(rng.expovariate(1 / 3)), 25)
+    for _ in range(extra):
+        sentences.append(rng.choice(ACTIONS).format(place=rng.choice(PLACES), people=rng.choice(PEOPLE)))
+
+    if rating >= 4:
+        sentences.append(rng.choice(POSITIVE_SENTENCES))
+    elif rating <= 2:
+        sentences.append(rng.choice(NEGATIVE_SENTENCES))
+    else:
+        sentences.append(rng.choice(NEUTRAL_SENTENCES))
+
+    # ときどき改行を入れる
+    if len(sentences) > 4 and rng.random() < 0.3:
+        cut = rng.randrange(1, len(sentences))
+        sentences[cut] = "\n" + sentences[cut]
+    return "".join(sentences)
+
+
+# 書く日が続く期間と書かない期間を交互に作り、記録する日付の一覧を返す
+def _make_dates(rng, n_entries, end_date):
+    offsets = []
+    day = 0
+    while len(offsets) < n_entries:
+        streak = 1 + int(rng.expovariate(1 / 12))
+        for _ in range(min(streak, n_entries - len(offsets))):
+            offsets.append(day)
+            day += 1
+        # 短い空白が多く、ときどき長く空く
+        gap = 1 + int(rng.expovariate(1 / 1.5)) if rng.random() < 0.9 else rng.randint(10, 40)
+        day += gap
+
+    start_date = end_date - timedelta(days=offsets[-1])
+    return [start_date + timedelta(days=offset) for offset in offsets]
+
+
+# 合成日記データを生成する
+def generate_entries(n_entries, seed=0, end_date=date(2025, 12, 31), legacy_ratio=0.02):
+    rng = random.Random(seed)
+    entries = []
+    dates = _make_dates(rng, n_entries, end_date)
+    n_legacy = int(n_entries * legacy_ratio)
+
+    for i, day in enumerate(dates):
+        weather = rng.choices(WEATHER_OPTIONS, WEATHER_WEIGHTS)[0]
+        health = rng.choices(HEALTH_OPTIONS, HEALTH_WEIGHTS)[0]
+        mood = rng.choices(MOOD_OPTIONS, MOOD_WEIGHTS)[0]
+        sleep_hours = min(max(round(rng.gauss(7.0, 1.1) * 2) / 2, 3.0), 11.0)
+        activities = rng.sample(ACTIVITY_OPTIONS, k=min(int(rng.expovariate(1 / 2.2)), 6))
+
+        score = 3.0 + HEALTH_EFFECT[health] + WEATHER_EFFECT[weather] + (sleep_hours - 7.0) * 0.25
+        score += 0.3 * ("友達と会った" in activities) + 0.3 * ("家族と過ごした" in activities) - 0.2 * ("仕事をした" in activities)
+        rating = int(min(max(round(score + rng.gauss(0, 0.8)), 1), 5))
+
+        entry = {
+            "date": day.strftime("%Y-%m-%d"),
+            "content": _make_content(rng, activities, rating),
+            "weather": weather,
+            "health": health,
+            "rating": rating,
+            "activities": activities,
+            "mood": mood,
+            "memo": rng.choice(MEMOS),
+            "sleep_hours": sleep_hours,
+        }
+
+        # 古い記録には後から追加された項目がない
+        if i < n_legacy:
+            for key in ("activities", "mood", "memo", "sleep_hours"):
+                entry.pop(key)
+        elif mood == NO_MOOD and rng.random() < 0.1:
+            entry["mood"] = ""
+        entries.append(entry)
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成日記データを生成します")
+    parser.add_argument("--entries", type=int, default=1000, help="生成する日記の件数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--out", required=True, help="出力する JSON ファイル")
+    args = parser.parse_args()
+
+    entries = generate_entries(args.entries, seed=args.seed)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False)
+    print(f"{len(entries)}件の日記を {args.out} に書き出しました")
+
+
+if __name__ == "__main__":
+    main()
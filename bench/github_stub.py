@@ -0,0 +1,260 @@
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from diary_core import storage
+
+# GitHub の contents API と raw.githubusercontent.com のローカルのスタンドイン（負荷試験・開発用）
+#   python -m bench.github_stub --port 8765 --seed-file diary.json --latency 0.2
+#   DIARY_GITHUB_API_URL=http://127.0.0.1:8765 DIARY_GITHUB_RAW_URL=http://127.0.0.1:8765/raw streamlit run app.py
+#
+# 対応している API（diary_core.storage が使うものだけ）
+#   GET /repos/{owner}/{repo}/contents/{path}?ref={branch}  : ファイルの SHA と中身（Accept: application/vnd.github.raw なら中身だけ）
+#   PUT /repos/{owner}/{repo}/contents/{path}               : 作成・更新（既存のファイルは sha が必要。現在の SHA と違えば 409 Conflict）
+#   GET /repos/{owner}/{repo}/git/blobs/{sha}               : SHA を指定した中身（過去の版も読める）
+#   GET /raw/{owner}/{repo}/{branch}/{path}                 : raw.githubusercontent.com の代わり
+#     raw_max_age を指定すると、CDN のキャッシュのように raw_max_age 秒以上前に保存された版を返す
+# latency・jitter で、すべての応答を latency ± jitter 秒遅らせる
+
+RAW_PREFIX = "/raw"
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+# これより大きいファイルは、GitHub と同じく contents API の JSON に中身を入れない（encoding が "none"）
+CONTENTS_MAX_BYTES = 1024 * 1024
+
+
+# git の blob と同じ SHA
+def blob_sha(content):
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.stub.wait()
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        raw = RAW_MEDIA_TYPE in self.headers.get("Accept", "")
+        stub = self.server.stub
+        if url.path.startswith(f"{RAW_PREFIX}/") and len(parts) >= 5:
+            status, body = stub.get_raw(f"{parts[1]}/{parts[2]}", "/".join(parts[4:]), parts[3])
+        elif len(parts) >= 5 and parts[0] == "repos" and parts[3] == "contents":
+            branch = parse_qs(url.query).get("ref", ["main"])[0]
+            status, body = stub.get_contents(f"{parts[1]}/{parts[2]}", "/".join(parts[4:]), branch, raw)
+        elif len(parts) == 6 and parts[0] == "repos" and parts[3:5] == ["git", "blobs"]:
+            status, body = stub.get_blob(f"{parts[1]}/{parts[2]}", parts[5], raw)
+        else:
+            status, body = 404, {"message": "Not Found"}
+        self._send(status, body, "application/octet-stream" if isinstance(body, bytes) else "application/json; charset=utf-8")
+
+    def do_PUT(self):
+        self.server.stub.wait()
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send(400, {"message": "Problems parsing JSON"})
+            return
+        if len(parts) >= 5 and parts[0] == "repos" and parts[3] == "contents":
+            status, body = self.server.stub.put_contents(f"{parts[1]}/{parts[2]}", "/".join(parts[4:]), payload)
+        else:
+            status, body = 404, {"message": "Not Found"}
+        self._send(status, body)
+
+
+# スタンドインのサーバー（別スレッドで動かす。with 文でも使える）
+class GitHubStub:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, raw_max_age=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.raw_max_age = raw_max_age
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # (リポジトリ, ブランチ, パス) → [(保存した時刻, SHA)]（古い順）
+        self._files = {}
+        # (リポジトリ, SHA) → 中身
+        self._blobs = {}
+        self.stats = {"get": 0, "raw": 0, "blob": 0, "put": 0, "conflict": 0, "rejected": 0}
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def api_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def raw_url(self):
+        return f"{self.api_url}{RAW_PREFIX}"
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="github-stub", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread = None
+
+    # このスレッドで動かす（Ctrl+C で止める）
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # 応答を遅らせる
+    def wait(self):
+        with self._lock:
+            delay = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    # 中身を直接置く（初期データ用。通常の保存と同じく新しい版になる）
+    def put_file(self, repo, path, content, branch="main"):
+        with self._lock:
+            return self._store(repo, path, branch, content)
+
+    # 最新の中身（負荷試験の答え合わせ用。ファイルがなければ None）
+    def read_file(self, repo, path, branch="main"):
+        with self._lock:
+            versions = self._files.get((repo, branch, path))
+            return self._blobs[(repo, versions[-1][1])] if versions else None
+
+    def _store(self, repo, path, branch, content):
+        sha = blob_sha(content)
+        self._blobs[(repo, sha)] = content
+        self._files.setdefault((repo, branch, path), []).append((time.time(), sha))
+        return sha
+
+    def get_contents(self, repo, path, branch, raw=False):
+        with self._lock:
+            self.stats["get"] += 1
+            versions = self._files.get((repo, branch, path))
+            if not versions:
+                return 404, {"message": "Not Found"}
+            sha = versions[-1][1]
+            content = self._blobs[(repo, sha)]
+        if raw:
+            return 200, content
+        inline = len(content) <= CONTENTS_MAX_BYTES
+        return 200, {
+            "type": "file",
+            "encoding": "base64" if inline else "none",
+            "size": len(content),
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": sha,
+            "content": base64.encodebytes(content).decode() if inline else "",
+        }
+
+    def get_blob(self, repo, sha, raw=False):
+        with self._lock:
+            self.stats["blob"] += 1
+            content = self._blobs.get((repo, sha))
+        if content is None:
+            return 404, {"message": "Not Found"}
+        if raw:
+            return 200, content
+        return 200, {"sha": sha, "size": len(content), "encoding": "base64", "content": base64.encodebytes(content).decode()}
+
+    # raw_max_age 秒以上前に保存された最新の版（なければ最初の版）
+    def get_raw(self, repo, path, branch):
+        with self._lock:
+            self.stats["raw"] += 1
+            versions = self._files.get((repo, branch, path))
+            if not versions:
+                return 404, b"404: Not Found"
+            cutoff = time.time() - self.raw_max_age
+            visible = [sha for saved_at, sha in versions if saved_at <= cutoff] or [versions[0][1]]
+            return 200, self._blobs[(repo, visible[-1])]
+
+    def put_contents(self, repo, path, payload):
+        branch = payload.get("branch") or "main"
+        try:
+            content = base64.b64decode(payload.get("content") or "", validate=True)
+        except ValueError:
+            return 422, {"message": "content is not valid Base64"}
+        with self._lock:
+            self.stats["put"] += 1
+            versions = self._files.get((repo, branch, path))
+            if versions:
+                current = versions[-1][1]
+                if not payload.get("sha"):
+                    self.stats["rejected"] += 1
+                    return 422, {"message": "Invalid request.\n\n\"sha\" wasn't supplied."}
+                if payload["sha"] != current:
+                    self.stats["conflict"] += 1
+                    return 409, {"message": f"{path} does not match {payload['sha']}"}
+            sha = self._store(repo, path, branch, content)
+            commit = hashlib.sha1(f"{repo}/{branch}/{path}@{len(self._files[(repo, branch, path)])}".encode()).hexdigest()
+        body = {
+            "content": {"name": path.rsplit("/", 1)[-1], "path": path, "sha": sha, "size": len(content)},
+            "commit": {"sha": commit, "message": payload.get("message", "")},
+        }
+        return (200 if versions else 201), body
+
+
+# 同じプロセスの diary_core.storage の接続先をスタンドインに向ける（別のプロセスなら DIARY_GITHUB_API_URL などで指定する）
+def point_storage_to(stub):
+    storage.GITHUB_API_URL = stub.api_url
+    storage.GITHUB_RAW_URL = stub.raw_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GitHub の contents API のスタンドインを起動します")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--repo", default="isamikann/diary", help="初期データを置くリポジトリ")
+    parser.add_argument("--path", default="diary.json", help="初期データを置くパス")
+    parser.add_argument("--seed-file", default=None, help="初期データのファイル（省略時は空の日記）")
+    parser.add_argument("--latency", type=float, default=0.0, help="応答の遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のばらつき（± 秒）")
+    parser.add_argument("--raw-max-age", type=float, default=0.0, help="raw の応答を何秒前の版にするか（CDN のキャッシュの再現）")
+    args = parser.parse_args()
+
+    stub = GitHubStub(args.host, args.port, args.latency, args.jitter, args.raw_max_age)
+    if args.seed_file:
+        with open(args.seed_file, "rb") as f:
+            stub.put_file(args.repo, args.path, f.read())
+    else:
+        stub.put_file(args.repo, args.path, b"[]")
+    print(f"{stub.api_url} で待機しています（raw: {stub.raw_url}）")
+    print(f"  DIARY_GITHUB_API_URL={stub.api_url} DIARY_GITHUB_RAW_URL={stub.raw_url}")
+    stub.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
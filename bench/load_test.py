@@ -0,0 +1,230 @@
+import argparse
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+from bench.generate_diary import generate_entries
+from bench.github_stub import GitHubStub, point_storage_to
+from diary_core import codec
+from diary_core.storage import ConflictError, GitHubStorage, make_entry, upsert_entry
+from diary_core.sync import MirroredStorage
+
+# 複数のセッションが同時に日記を読み込み・保存したときの負荷試験（bench/github_stub.py のスタンドインに対して行う）
+#   python -m bench.load_test --sessions 8 --ops 10 --latency 0.1
+#   python -m bench.load_test --modes direct --raw-max-age 2 --path diary.jsonl.zst
+# セッションごとに「読み込み → 重ならない日付の日記を1件追加 → 保存」を ops 回繰り返す
+# 最後にスタンドインの最新の内容と照らし合わせ、保存できたはずなのに残っていない日記を「失われた更新」として数える
+# 自分が前に保存した日記が読み込んだ内容にない読み込みは「古い読み込み」として数える
+
+REPO = "bench/diary"
+TOKEN = "bench-token"
+# 保存の方法（名前 → 説明）
+MODES = {
+    "direct": "raw から読み込み、保存の直前に SHA を取り直して上書きする（ミラーを使わない画面と同じ）",
+    "conditional": "SHA を指定して読み込み、その SHA に対して保存する（409 なら読み直してやり直す）",
+    "mirrored": "セッションごとのローカルミラーに保存してすぐ同期する（DIARY_MIRROR_DIR を指定した画面と同じ）",
+}
+# conditional で 409 のときに読み直す回数
+MAX_RETRIES = 5
+# mirrored で最後に WAL を送り切るまでに同期する回数
+FLUSH_ATTEMPTS = 10
+
+
+# 値の q パーセンタイル（最近傍順位法: 小さい順に ceil(q / 100 × 件数) 番目。値がなければ None）
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[min(len(ordered), max(1, rank)) - 1]
+
+
+# 1つのセッションの記録
+class SessionStats:
+    def __init__(self):
+        self.timings = {"load": [], "save": [], "sync": []}
+        self.saved = []
+        self.failed = 0
+        self.retries = 0
+        self.stale_reads = 0
+
+    def timed(self, name, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.timings[name].append(time.perf_counter() - start)
+
+    # 読み込んだ内容に、前に保存した日記がすべてあるか
+    def check_read(self, diary):
+        dates = {d["date"] for d in diary}
+        if any(saved not in dates for saved in self.saved):
+            self.stale_reads += 1
+
+
+def _entry(day, session):
+    return make_entry(day, f"負荷試験 セッション{session}", "晴れ", "普通", 3, ["仕事をした"])
+
+
+# raw から読み込み、storage.add_entry と同じ手順で保存する（保存の直前に SHA を取り直すので、他のセッションの保存を上書きしうる）
+def _run_direct(session, days, path, stats, mirror_dir):
+    remote = GitHubStorage(REPO, path, TOKEN)
+    for day in days:
+        diary = stats.timed("load", remote.load)
+        stats.check_read(diary)
+        upsert_entry(diary, _entry(day, session))
+        try:
+            stats.timed("save", remote.save, diary)
+            stats.saved.append(day)
+        except requests.HTTPError:
+            # SHA を取り直してから PUT するまでの間に他のセッションが保存した（409）
+            stats.failed += 1
+
+
+# 読み込んだ SHA に対して保存し、409 なら読み直してやり直す
+def _run_conditional(session, days, path, stats, mirror_dir):
+    remote = GitHubStorage(REPO, path, TOKEN)
+    cached, revision = [], None
+    for day in days:
+        for _ in range(MAX_RETRIES + 1):
+            data, revision = stats.timed("load", remote.fetch_if_changed, revision)
+            if data is not None:
+                cached = data
+            stats.check_read(cached)
+            diary = upsert_entry(list(cached), _entry(day, session))
+            try:
+                revision = stats.timed("save", remote.save_if_unchanged, diary, revision)
+                cached = diary
+                stats.saved.append(day)
+                break
+            except ConflictError:
+                stats.retries += 1
+        else:
+            stats.failed += 1
+
+
+# セッションごとのローカルミラーに保存し、すぐに同期する（同期できなかった操作は WAL に残り、最後にまとめて送る）
+def _run_mirrored(session, days, path, stats, mirror_dir):
+    mirror = MirroredStorage(GitHubStorage(REPO, path, TOKEN), os.path.join(mirror_dir, f"session{session}"))
+    for day in days:
+        diary = stats.timed("load", mirror.load)
+        stats.check_read(diary)
+        upsert_entry(diary, _entry(day, session))
+        stats.timed("save", mirror.save, diary)
+        stats.saved.append(day)
+        try:
+            stats.timed("sync", mirror.sync_once)
+        except ConflictError:
+            stats.retries += 1
+    for _ in range(FLUSH_ATTEMPTS):
+        try:
+            if mirror.sync_once() == 0:
+                break
+        except ConflictError:
+            stats.retries += 1
+    else:
+        stats.failed += 1
+
+
+RUNNERS = {"direct": _run_direct, "conditional": _run_conditional, "mirrored": _run_mirrored}
+
+
+# 1つの保存の方法で負荷試験をする（スタンドインはこの試験のためだけに起動する）
+def run_load_test(mode, sessions, ops, seed_entries, path="diary.json", latency=0.0, jitter=0.0, raw_max_age=0.0):
+    stub = GitHubStub(latency=latency, jitter=jitter, raw_max_age=raw_max_age).start()
+    point_storage_to(stub)
+    try:
+        stub.put_file(REPO, path, codec.encode(seed_entries, codec.codec_for_path(path)))
+        first_day = max((date.fromisoformat(d["date"]) for d in seed_entries), default=date(2025, 12, 31)) + timedelta(days=1)
+        stats = [SessionStats() for _ in range(sessions)]
+        # すべてのセッションが揃ってから始める
+        barrier = threading.Barrier(sessions)
+
+        def session(index, mirror_dir):
+            days = [(first_day + timedelta(days=index * ops + i)).isoformat() for i in range(ops)]
+            barrier.wait()
+            RUNNERS[mode](index, days, path, stats[index], mirror_dir)
+
+        with tempfile.TemporaryDirectory() as mirror_dir:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=sessions) as executor:
+                for future in [executor.submit(session, i, mirror_dir) for i in range(sessions)]:
+                    future.result()
+            seconds = time.perf_counter() - start
+
+        final = {d["date"] for d in codec.decode(stub.read_file(REPO, path))}
+    finally:
+        stub.stop()
+
+    saved = [day for s in stats for day in s.saved]
+    result = {
+        "mode": mode,
+        "sessions": sessions,
+        "ops": ops,
+        "seed_entries": len(seed_entries),
+        "latency": latency,
+        "raw_max_age": raw_max_age,
+        "seconds": seconds,
+        "saved": len(saved),
+        "failed": sum(s.failed for s in stats),
+        "retries": sum(s.retries for s in stats),
+        "conflicts": stub.stats["conflict"],
+        "lost_updates": sum(day not in final for day in saved),
+        "stale_reads": sum(s.stale_reads for s in stats),
+        "throughput": len(saved) / seconds if seconds else None,
+        "requests": dict(stub.stats),
+    }
+    for name in ("load", "save", "sync"):
+        timings = [t for s in stats for t in s.timings[name]]
+        result[f"{name}_p50"] = percentile(timings, 50)
+        result[f"{name}_p99"] = percentile(timings, 99)
+    return result
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:8.1f}ms" if seconds is not None else "       -  "
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GitHub のスタンドインに対して、同時に読み込み・保存するセッションの負荷試験をします")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES), help="保存の方法")
+    parser.add_argument("--sessions", type=int, default=8, help="同時に動かすセッションの数")
+    parser.add_argument("--ops", type=int, default=10, help="セッションごとの保存の回数")
+    parser.add_argument("--size", type=int, default=1000, help="最初に置いておく日記の件数")
+    parser.add_argument("--path", default="diary.json", help="保存先のパス（拡張子で保存形式が決まる）")
+    parser.add_argument("--latency", type=float, default=0.05, help="スタンドインの応答の遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="遅延のばらつき（± 秒）")
+    parser.add_argument("--raw-max-age", type=float, default=0.0, help="raw の応答を何秒前の版にするか（CDN のキャッシュの再現）")
+    parser.add_argument("--seed", type=int, default=0, help="データ生成の乱数シード")
+    parser.add_argument("--out", default=None, help="結果を書き出す JSON ファイル")
+    args = parser.parse_args()
+
+    seed_entries = generate_entries(args.size, seed=args.seed)
+    results = []
+    print(f"{args.sessions}セッション × {args.ops}回の保存（初期データ {args.size}件、遅延 {args.latency * 1000:.0f}±{args.jitter * 1000:.0f}ms）")
+    for mode in args.modes:
+        result = run_load_test(mode, args.sessions, args.ops, seed_entries, args.path, args.latency, args.jitter, args.raw_max_age)
+        results.append(result)
+        print(f"\n[{mode}] {MODES[mode]}")
+        print(f"  スループット {result['throughput']:.2f} 件/秒（{result['saved']}件を {result['seconds']:.1f}秒で保存）")
+        print(f"  失われた更新 {result['lost_updates']}件  保存の失敗 {result['failed']}件  409 {result['conflicts']}回  やり直し {result['retries']}回  古い読み込み {result['stale_reads']}回")
+        for name in ("load", "save", "sync"):
+            if result[f"{name}_p50"] is not None:
+                print(f"  {name:<5} p50 {_ms(result[f'{name}_p50'])}  p99 {_ms(result[f'{name}_p99'])}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を {args.out} に保存しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bench.generate_diary import generate_entries
+from diary_core import analytics, anomaly, codec, cooccurrence, features, forecast, lags, periods, reports, snapshot, terms, text, trace
+from diary_core.frame import to_frame
+from diary_core.model import EntryCollection
+from diary_core.rolling import daily_frame, rolling_statistics
+from diary_core.storage import LocalStorage
+
+# 各画面と読み込み・保存処理の所要時間を計測するベンチマーク
+#   python -m bench.run_benchmarks --sizes 1000 10000
+# Streamlit を起動せずに AppTest で app.py を実行し、ローカルの JSON ファイルをストレージとして使う。
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT_DIR, "app.py")
+DATA_DIR = os.path.join(ROOT_DIR, "bench", "data")
+RESULTS_DIR = os.path.join(ROOT_DIR, "bench", "results")
+
+# (名前, メニュー, サブメニュー, 表示方法)
+VIEWS = [
+    ("display_entries", "日記", "📅 過去の日記を表示", None),
+    ("display_calendar", "日記", "📅 過去の日記を表示", "カレンダー表示"),
+    ("show_statistics", "データ分析", "📊 統計分析", None),
+    ("advanced_visualizations", "データ分析", "🔍 高度な可視化分析", None),
+    ("weekly_summary_report", "レポート", "📈 週間サマリー", None),
+    ("habit_tracking", "レポート", "📊 習慣化支援・連続記録", None),
+]
+
+# 画面の一部（fragment）だけを再実行する操作
+#   (名前, メニュー, サブメニュー, 表示方法, 操作するセレクトボックス, fragment の計測名, 表示名 → 選択肢の値)
+INTERACTIONS = [
+    ("entries_sort", "日記", "📅 過去の日記を表示", None, "並び替え", "fragment:entries_list", None),
+    ("calendar_month", "日記", "📅 過去の日記を表示", "カレンダー表示", "月を選択", "fragment:calendar_month",
+     lambda label: label.replace("年", "-").rstrip("月")),
+    ("weekly_week", "レポート", "📈 週間サマリー", None, "週を選択", "fragment:period_report", None),
+]
+
+
+# 計測結果を1件分の辞書にまとめる
+def _result(size, name, timings, errors=None):
+    return {
+        "size": size,
+        "name": name,
+        "min": min(timings) if timings else None,
+        "median": statistics.median(timings) if timings else None,
+        "runs": len(timings),
+        "errors": errors or [],
+    }
+
+
+# 指定件数のデータファイルを用意する（同じ件数・シードなら再利用）
+def prepare_data(size, seed):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"diary_{size}_{seed}.json")
+    if not os.path.exists(path):
+        LocalStorage(path).save(generate_entries(size, seed=seed))
+    return path
+
+
+# 読み込み・保存の計測
+def bench_storage(size, path, repeat):
+    storage = LocalStorage(path)
+    load_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        diary = storage.load()
+        load_times.append(time.perf_counter() - start)
+
+    save_times = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out = LocalStorage(os.path.join(tmp_dir, "diary.json"))
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out.save(diary)
+            save_times.append(time.perf_counter() - start)
+
+    return [_result(size, "storage:load", load_times), _result(size, "storage:save", save_times)]
+
+
+# 画面を介さずに diary_core の計算処理だけを計測する
+def bench_core(size, path, repeat):
+    diary = LocalStorage(path).load()
+    df = to_frame(diary)
+    token_lists = text.tokenize_contents(df["content"])
+    latest_week = reports.parse_week_label(reports.week_options(df)[0])
+    snapshot_dir = tempfile.mkdtemp()
+    snapshot.write_snapshot(snapshot_dir, "bench", df)
+    feature_path = os.path.join(snapshot_dir, features.FEATURE_FILE)
+    feature_store = features.FeatureStore(feature_path)
+    feature_df = feature_store.frame(diary)
+    term_matrix = terms.TermMatrix()
+    term_matrix.update(feature_df)
+    top_terms = list(term_matrix.term_counts(top=5).index)
+    last_date = feature_df["date"].iloc[-1]
+    recent = (last_date - timedelta(days=89), last_date)
+    previous = (last_date - timedelta(days=179), last_date - timedelta(days=90))
+    edits = iter(range(10 ** 9))
+    daily = daily_frame(df)
+    detector = anomaly.AnomalyDetector()
+    detector.update(daily.iloc[:-repeat])
+    appended = iter(range(repeat - 1, -1, -1))
+    forecaster = forecast.Forecaster(os.path.join(snapshot_dir, forecast.FORECAST_FILE))
+    forecaster.update(df.iloc[:-repeat])
+    forecast_appended = iter(range(repeat - 1, -1, -1))
+    period_aggregates = periods.PeriodAggregates()
+    period_aggregates.update(df, feature_df)
+    latest_year = period_aggregates.options("year")[0]
+    year_bounds = periods.bounds(latest_year)
+    prev_year_bounds = periods.bounds(latest_year - 1)
+
+    # 1回ごとに末尾に1日増やす（増えた日の分だけ検出する）
+    def anomaly_append_day():
+        remaining = next(appended)
+        detector.update(daily.iloc[:len(daily) - remaining])
+
+    # 1回ごとに末尾に1日増やして学習し、保存する（学習するのは増えた日の分だけ）
+    def forecast_append_day():
+        remaining = next(forecast_appended)
+        forecaster.update(df.iloc[:len(df) - remaining])
+
+    # 日記を1件書き換えてから特徴量を更新する（計算し直すのはその1件だけ）
+    def refresh_one():
+        diary[-1] = dict(diary[-1], content=f"{diary[-1]['content']}{next(edits) % 2}")
+        feature_store.refresh(diary)
+
+    cases = [
+        ("core:to_frame", lambda: to_frame(diary)),
+        ("core:snapshot_read", lambda: snapshot.read_frame(snapshot_dir, "bench")),
+        ("core:snapshot_read_columns", lambda: snapshot.read_frame(snapshot_dir, "bench", ["date", "rating", "sleep_hours"])),
+        ("core:rolling_statistics", lambda: rolling_statistics(df)),
+        ("core:anomaly_detect", lambda: anomaly.detect(daily)),
+        ("core:anomaly_append_day", anomaly_append_day),
+        ("core:tokenize_contents", lambda: text.tokenize_contents(df["content"])),
+        ("core:features_load", lambda: features.FeatureStore(feature_path).refresh(diary)),
+        ("core:features_refresh_one", refresh_one),
+        ("core:features_frame", lambda: feature_store.frame(diary)),
+        ("core:keyword_counts", lambda: text.keyword_counts(token_lists)),
+        ("core:terms_build", lambda: terms.TermMatrix().update(feature_df)),
+        ("core:terms_update", lambda: term_matrix.update(feature_store.frame(diary))),
+        ("core:term_frequency", lambda: term_matrix.term_frequency(top_terms, "M")),
+        ("core:rising_terms", lambda: term_matrix.rising_terms(previous, recent)),
+        ("core:term_ratings", lambda: term_matrix.term_ratings(top_terms, df.set_index("date")["rating"])),
+        ("core:cooccurrence_build", lambda: cooccurrence.build_network(df, term_matrix)),
+        ("core:cooccurrence_build_all_terms", lambda: cooccurrence.build_network(df, term_matrix, min_days=1)),
+        ("core:emotion_summary", lambda: text.emotion_summary(token_lists, df["rating"])),
+        ("core:emotion_summary_features", lambda: features.emotion_summary(feature_df, df)),
+        ("core:rating_by_activity", lambda: analytics.rating_by_activity(df)),
+        ("core:weekly_heatmap", lambda: analytics.weekly_heatmap(df)),
+        ("core:correlation_matrix", lambda: analytics.correlation_matrix(df)),
+        ("core:lag_effects", lambda: lags.lag_effects(df)),
+        ("core:forecast_train", lambda: forecast.Forecaster().update(df)),
+        ("core:forecast_append_day", forecast_append_day),
+        ("core:forecast_predict", lambda: forecaster.forecast()),
+        ("core:streaks", lambda: analytics.streaks(d["date"] for d in diary)),
+        ("core:streaks_features", lambda: features.streaks(feature_df)),
+        ("core:filter_entries", lambda: analytics.filter_entries(diary, query="仕事", activities=["運動した"])),
+        ("core:weekly_report", lambda: reports.weekly_report(df, *latest_week)),
+        ("core:yearly_report", lambda: reports.period_report(df, *year_bounds, *prev_year_bounds)),
+        ("core:periods_build", lambda: periods.PeriodAggregates().update(df, feature_df)),
+        ("core:periods_update", lambda: period_aggregates.update(df, feature_store.frame(diary))),
+        ("core:period_report_year", lambda: period_aggregates.report("year", latest_year)),
+        ("core:period_report_all", lambda: period_aggregates.range_report(df["date"].iloc[0], df["date"].iloc[-1])),
+    ]
+
+    results = []
+    for name, func in cases:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        results.append(_result(size, name, timings))
+    shutil.rmtree(snapshot_dir)
+    return results
+
+
+# 保存形式ごとの大きさ（JSON との比）と、読み込み（展開・解析）の速さ
+def bench_codecs(size, path, repeat):
+    diary = LocalStorage(path).load()
+    plain_bytes = len(codec.encode(diary, codec.JSON))
+
+    results = []
+    for name in codec.CODECS:
+        start = time.perf_counter()
+        raw = codec.encode(diary, name)
+        encode_time = time.perf_counter() - start
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            codec.decode(raw)
+            timings.append(time.perf_counter() - start)
+        result = _result(size, f"codec:{name}", timings)
+        result.update(
+            bytes=len(raw),
+            ratio=len(raw) / plain_bytes,
+            encode_seconds=encode_time,
+            # 読み込みの速さ（保存されたバイト数・展開後の JSON のバイト数あたり）
+            stored_mb_per_s=len(raw) / result["median"] / 1e6,
+            json_mb_per_s=plain_bytes / result["median"] / 1e6,
+        )
+        results.append(result)
+    return results
+
+
+# 日記を保持するのに使うメモリ（辞書のリストと EntryCollection の比較）
+def bench_memory(size, path):
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    results = []
+    for name, build in (
+        ("memory:dict_list", lambda: json.loads(raw)),
+        ("memory:entry_collection", lambda: EntryCollection.from_dicts(json.loads(raw))),
+    ):
+        tracemalloc.start()
+        start = time.perf_counter()
+        data = build()
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del data
+        result = _result(size, name, [elapsed])
+        result.update(bytes=current, peak_bytes=peak)
+        results.append(result)
+    return results
+
+
+# 画面を開いた状態で再実行（rerun）にかかる時間を計測する
+def bench_view(size, path, view, repeat, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    name, menu, option, view_type = view
+    os.environ["DIARY_STORAGE"] = "local"
+    os.environ["DIARY_LOCAL_PATH"] = path
+    os.environ["DIARY_SNAPSHOT_DIR"] = os.path.join(DATA_DIR, "snapshot")
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    timings = []
+    try:
+        at.run()
+        at.sidebar.selectbox[1].set_value(menu).run()
+        at.sidebar.radio[0].set_value(option).run()
+        if view_type:
+            at.main.radio[0].set_value(view_type).run()
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            at.run()
+            timings.append(time.perf_counter() - start)
+    except RuntimeError as e:
+        # AppTest のタイムアウト
+        return _result(size, f"view:{name}", timings, [str(e)])
+
+    errors = [e.value for e in at.exception]
+    return _result(size, f"view:{name}", timings, errors)
+
+
+# トレースファイルの最後の実行のスパン
+def _last_run_spans(trace_file):
+    with open(trace_file, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    last_run = records[-1]["run"]
+    return [r for r in records if r["run"] == last_run]
+
+
+# セレクトボックスを変えたときの応答時間
+#   AppTest は fragment だけの再実行ができないので、ページ全体の再実行（fragment にする前の1操作分）の時間と、
+#   その中の fragment の部分の時間（fragment にした後の1操作分）をトレースから取り出して比べる
+def bench_interaction(size, path, interaction, repeat, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    name, menu, option, view_type, label, fragment_name, value_of = interaction
+    trace_file = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+    os.environ["DIARY_STORAGE"] = "local"
+    os.environ["DIARY_LOCAL_PATH"] = path
+    # AppTest は同じプロセスで app.py を実行するので、読み込み済みの trace モジュールの出力先を差し替える
+    original_trace_file, trace.TRACE_FILE = trace.TRACE_FILE, trace_file
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    full_times = []
+    fragment_times = []
+    try:
+        at.run()
+        at.sidebar.selectbox[1].set_value(menu).run()
+        at.sidebar.radio[0].set_value(option).run()
+        if view_type:
+            at.main.radio[0].set_value(view_type).run()
+
+        for i in range(repeat):
+            widget = next(w for w in at.main.selectbox if w.label == label)
+            choice = widget.options[(i + 1) % len(widget.options)]
+            widget.set_value(value_of(choice) if value_of else choice)
+            start = time.perf_counter()
+            at.run()
+            full_times.append(time.perf_counter() - start)
+            fragment_times.extend(r["ms"] / 1000 for r in _last_run_spans(trace_file) if r["name"] == fragment_name)
+    except RuntimeError as e:
+        return _result(size, f"interaction:{name}", full_times, [str(e)])
+    finally:
+        trace.TRACE_FILE = original_trace_file
+        shutil.rmtree(os.path.dirname(trace_file))
+
+    result = _result(size, f"interaction:{name}", full_times, [e.value for e in at.exception])
+    result.update(fragment_median=statistics.median(fragment_times) if fragment_times else None)
+    return result
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# 2つの結果ファイルを比較して表示する
+def compare(base_path, new_path):
+    with open(base_path, encoding="utf-8") as f:
+        base = {(r["size"], r["name"]): r for r in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["results"]
+
+    print(f"{'size':>8}  {'name':<34} {'base':>10} {'new':>10} {'ratio':>7}")
+    for r in new:
+        old = base.get((r["size"], r["name"]))
+        if not old or old["median"] is None or r["median"] is None:
+            continue
+        ratio = r["median"] / old["median"] if old["median"] else float("nan")
+        print(f"{r['size']:>8}  {r['name']:<34} {old['median']:>10.4f} {r['median']:>10.4f} {ratio:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日記アプリのベンチマークを実行します")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="日記の件数")
+    parser.add_argument("--seed", type=int, default=0, help="データ生成の乱数シード")
+    parser.add_argument("--repeat", type=int, default=3, help="各計測の繰り返し回数")
+    parser.add_argument("--timeout", type=float, default=600, help="1画面あたりのタイムアウト（秒）")
+    parser.add_argument("--views", nargs="*", default=None, help="計測する画面（省略時はすべて）")
+    parser.add_argument("--core-only", action="store_true", help="画面の計測を省略して diary_core の計算処理だけを計測する")
+    parser.add_argument("--out", default=None, help="結果の JSON ファイル（省略時は bench/results/<commit>.json）")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="2つの結果ファイルを比較する")
+    args = parser.parse_args()
+    # fragment の時間はトレースから読むので、DIARY_TRACE=0 の環境でも計測を有効にする
+    trace.ENABLED = True
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    views = [] if args.core_only else [v for v in VIEWS if args.views is None or v[0] in args.views]
+    interactions = [] if args.core_only else [i for i in INTERACTIONS if args.views is None or i[0] in args.views]
+    results = []
+    for size in args.sizes:
+        path = prepare_data(size, args.seed)
+        results.extend(bench_storage(size, path, args.repeat))
+        results.extend(bench_core(size, path, args.repeat))
+        for result in bench_codecs(size, path, args.repeat):
+            results.append(result)
+            print(
+                f"{size:>8}  {result['name']:<34} {result['bytes'] / 1024 / 1024:.2f}MB（JSON の {result['ratio']:.1%}）"
+                f" 読み込み {result['median']:.4f}s（{result['json_mb_per_s']:.1f}MB/s）"
+            )
+        for result in bench_memory(size, path):
+            results.append(result)
+            print(f"{size:>8}  {result['name']:<34} {result['bytes'] / 1024 / 1024:.2f}MB（ピーク {result['peak_bytes'] / 1024 / 1024:.2f}MB）")
+        for view in views:
+            results.append(bench_view(size, path, view, args.repeat, args.timeout))
+            last = results[-1]
+            print(f"{size:>8}  {last['name']:<34} {last['median'] if last['median'] is not None else float('nan'):.4f}s {'⚠️' if last['errors'] else ''}")
+        for interaction in interactions:
+            results.append(bench_interaction(size, path, interaction, args.repeat, args.timeout))
+            last = results[-1]
+            full = last["median"] if last["median"] is not None else float("nan")
+            part = last.get("fragment_median") if last.get("fragment_median") is not None else float("nan")
+            print(f"{size:>8}  {last['name']:<34} ページ全体 {full:.4f}s → fragment {part:.4f}s {'⚠️' if last['errors'] else ''}")
+
+    commit = current_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を {out} に保存しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# 分析日記アプリの計算処理（Streamlit に依存しない部分）をまとめたパッケージ
+#   storage   : 日記の読み込み・保存（GitHub / ローカルファイル）
+#   frame     : 分析用 DataFrame への変換・日付の索引
+#   text      : 形態素解析・キーワード・感情表現
+#   analytics : 評価の集計・相関・連続記録
+#   reports   : 週間サマリーの集計
+#   rolling   : 移動統計
+#   export    : CSV エクスポート
+#   charts    : レポート画面とバッチ出力で共通のグラフ
+#   trace     : 処理時間の計測
+#   batch     : 週間・月間・年間レポートの一括出力（python -m diary_core.batch）
+#   precompute: データ変更後の分析結果のバックグラウンド事前計算
+#   tenants   : 複数の日記の設定と日記ごとのキャッシュ（メモリ上限つき LRU）
+#   model     : 型つきの日記モデルと配列で持つ日記コレクション
+#   sync      : オフライン対応のローカルミラーと操作ログ（WAL）の同期
+#   importer  : JSON 配列・JSONL・CSV からの検証つき一括取り込み
+#   snapshot  : 分析用 DataFrame の列指向スナップショット（Arrow IPC）
+#   codec     : 日記ファイルの保存形式（JSON・圧縮した JSONL）と変換（python -m diary_core.codec）
+#   backups   : 内容のハッシュで重複を除いた増分バックアップと過去の時点への復元
+#   bulk      : 期間・条件での削除、活動・気分の名前変更、一括追加・更新（1回の保存で反映）
+#   drafts    : 書きかけの日記の下書き（入力が止まってからファイルに書く）
+#   features  : 日記ごとの特徴量（書き込み時に変わった日記の分だけ計算して保存）
+#   terms     : キーワードの推移を調べる日付×単語の出現回数の疎行列
+#   cooccurrence: 活動とキーワードの共起ネットワーク（lift・PMI と組み合わせごとの平均評価）
+#   anomaly   : 評価・睡眠時間・記録の頻度の外れ値と変化点のオンライン検出
+#   lags      : k 日前の睡眠時間・活動・天気・体調とその日の評価の関係（効果と信頼区間）
+#   forecast  : 翌週の評価の予測（オンライン学習と検証の誤差）
+#   periods   : 週・月・四半期・年・任意の期間のレポート（日ごと・期間ごとの集計を足し合わせる）
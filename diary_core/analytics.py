@@ -0,0 +1,201 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from diary_core import trace
+from diary_core.frame import WEEKDAY_ORDER, WEEKDAY_ORDER_JP
+from diary_core.vocab import NO_MOOD
+
+# 並び替えの選択肢
+SORT_OPTIONS = ["日付順（新しい順）", "日付順（古い順）", "評価（高い順）", "評価（低い順）"]
+
+# フィルターで「すべて」を表す値
+ALL = "すべて"
+
+
+# 気分が記録されているか（未選択・空欄を除く）
+def has_mood(mood):
+    return isinstance(mood, str) and mood not in ("", NO_MOOD)
+
+
+# フィルターの選択肢（日記に出てくる天気・体調・活動）
+def filter_options(diary):
+    weathers = sorted(set(d.get("weather", "") for d in diary if "weather" in d))
+    healths = sorted(set(d.get("health", "") for d in diary if "health" in d))
+    activities = sorted(set(a for d in diary for a in (d.get("activities") or [])))
+    return weathers, healths, activities
+
+
+# キーワード・天気・体調・評価・活動で日記を絞り込む
+def filter_entries(diary, query="", weather=ALL, health=ALL, rating=ALL, activities=None):
+    if not (query or weather != ALL or health != ALL or rating != ALL or activities):
+        return list(diary)
+
+    query = query.lower()
+    return [
+        d for d in diary
+        if (not query or query in d.get("content", "").lower() or query in d.get("memo", "").lower())
+        and (weather == ALL or d.get("weather", "") == weather)
+        and (health == ALL or d.get("health", "") == health)
+        and (rating == ALL or str(d.get("rating", "")) == rating)
+        and (not activities or any(a in (d.get("activities") or []) for a in activities))
+    ]
+
+
+# 並び替え
+def sort_entries(entries, option):
+    if option == "日付順（古い順）":
+        return sorted(entries, key=lambda x: x["date"])
+    if option == "評価（高い順）":
+        return sorted(entries, key=lambda x: x.get("rating", 0), reverse=True)
+    if option == "評価（低い順）":
+        return sorted(entries, key=lambda x: x.get("rating", 0))
+    return sorted(entries, key=lambda x: x["date"], reverse=True)
+
+
+# 評価1〜5の日数（データがない評価は0）
+def rating_distribution(df):
+    return df["rating"].value_counts().reindex(range(1, 6), fill_value=0)
+
+
+# 平均評価・最高評価の日数・今週と先週の平均
+def rating_summary(df, today=None):
+    today = pd.Timestamp.today() if today is None else pd.Timestamp(today)
+    last_week = df[(df["date"] >= today - timedelta(days=14)) & (df["date"] < today - timedelta(days=7))]
+    this_week = df[(df["date"] >= today - timedelta(days=7)) & (df["date"] <= today)]
+    return {
+        "mean": df["rating"].mean(),
+        "best_days": int((df["rating"] == 5).sum()),
+        "this_week": this_week["rating"].mean() if not this_week.empty else None,
+        "last_week": last_week["rating"].mean() if not last_week.empty else None,
+    }
+
+
+# 項目ごとの平均評価と日数（平均評価の高い順）
+def rating_by(df, column):
+    data = df[df[column].map(has_mood)] if column == "mood" else df
+    grouped = data.groupby(column)["rating"]
+    result = pd.DataFrame({"average": grouped.mean(), "count": grouped.size()})
+    return result.sort_values("average", ascending=False)
+
+
+# 曜日別の平均評価（月曜日から順に）
+def rating_by_weekday(df):
+    return df.groupby("weekday_jp")["rating"].mean().reindex(WEEKDAY_ORDER_JP)
+
+
+# 活動の有無を 0/1 で表した行列（行は df と同じ並び）
+def activity_matrix(df):
+    exploded = df["activities"].explode().dropna()
+    if exploded.empty:
+        return pd.DataFrame(index=df.index)
+    dummies = pd.crosstab(exploded.index, exploded).clip(upper=1)
+    return dummies.reindex(df.index, fill_value=0)
+
+
+# 活動ごとの平均評価と日数（平均評価の高い順）
+def rating_by_activity(df):
+    matrix = activity_matrix(df)
+    if matrix.empty:
+        return pd.DataFrame(columns=["activity", "average", "count"])
+    counts = matrix.sum()
+    averages = matrix.mul(df["rating"], axis=0).sum() / counts
+    result = pd.DataFrame({"activity": matrix.columns, "average": averages.values, "count": counts.values})
+    return result.sort_values("average", ascending=False).reset_index(drop=True)
+
+
+# 睡眠時間の区切り（時間。左端を含む）と表示名（最後の区切りは上限なしにして、24時間ちょうども「9時間以上」に入れる）
+SLEEP_BINS = [0, 5, 6, 7, 8, 9, np.inf]
+SLEEP_LABELS = ["5時間未満", "5〜6時間", "6〜7時間", "7〜8時間", "8〜9時間", "9時間以上"]
+
+
+# 睡眠時間を区切りごとの表示名にする（記録のない日は NaN）
+def sleep_bucket(sleep_hours):
+    return pd.cut(pd.to_numeric(sleep_hours, errors="coerce"), SLEEP_BINS, labels=SLEEP_LABELS, right=False)
+
+
+# 睡眠時間と評価の相関係数・睡眠時間の区切りごとの平均評価と日数
+def sleep_summary(df):
+    grouped = df["rating"].groupby(sleep_bucket(df["sleep_hours"]), observed=True)
+    return {
+        "correlation": df["sleep_hours"].corr(df["rating"]),
+        "average": grouped.mean(),
+        "count": grouped.size(),
+    }
+
+
+# 年と週から日付文字列を作成
+def _week_label(year, week):
+    try:
+        # その週の月曜日を取得
+        monday = datetime.strptime(f"{year}-{week}-1", "%Y-%W-%w")
+        return monday.strftime("%m/%d週")
+    except ValueError:
+        return f"{year}-W{week}"
+
+
+# 週別・曜日別の平均評価ヒートマップ用データ
+def weekly_heatmap(df):
+    iso = df["date"].dt.isocalendar()
+    pivot_df = df.assign(year=iso.year, week=iso.week).pivot_table(
+        index=["year", "week"],
+        columns="weekday",
+        values="rating",
+        aggfunc="mean"
+    ).reset_index()
+
+    weekdays = [day for day in WEEKDAY_ORDER if day in pivot_df.columns]
+    week_labels = [_week_label(year, week) for year, week in zip(pivot_df["year"], pivot_df["week"])]
+    values = pivot_df[weekdays]
+
+    week_means = values.mean(axis=1).to_numpy()
+    best_week = week_labels[int(np.nanargmax(week_means))] if len(week_means) and not np.isnan(week_means).all() else None
+    return {"z": values.to_numpy(), "weekdays": weekdays, "weeks": week_labels, "best_week": best_week}
+
+
+# 評価・睡眠時間・天気・体調・気分・活動・曜日の相関行列
+@trace.traced("analytics:correlation")
+def correlation_matrix(df):
+    parts = [df[["rating", "sleep_hours"]].astype(float)]
+    parts.append(pd.get_dummies(df["weather"], prefix="weather"))
+    parts.append(pd.get_dummies(df["health"], prefix="health"))
+
+    mood_data = df[df["mood"].map(has_mood)]
+    if not mood_data.empty:
+        parts.append(pd.get_dummies(mood_data["mood"], prefix="mood").reindex(df.index, fill_value=0))
+
+    activities = activity_matrix(df)
+    parts.append(activities.add_prefix("activity_"))
+    parts.append(pd.get_dummies(df["weekday"], prefix="weekday"))
+
+    return pd.concat(parts, axis=1).astype(float).corr()
+
+
+# 評価との相関が高い要素（相関の高い順）
+def rating_correlations(corr_matrix, top=5):
+    return corr_matrix["rating"].drop("rating").sort_values(ascending=False).head(top)
+
+
+# 現在の連続記録・最長連続記録・記録率
+def streaks(dates):
+    dates = list(dates)
+    days = sorted(set(pd.to_datetime(pd.Series(dates)).dt.date))
+    if not days:
+        return {"current": 0, "longest": 0, "completion_rate": 0}
+
+    # 最新の記録からさかのぼって連続している日数
+    current = 1
+    for later, earlier in zip(reversed(days), reversed(days[:-1])):
+        if (later - earlier).days != 1:
+            break
+        current += 1
+
+    # 最長連続記録
+    longest = run = 1
+    for prev, day in zip(days, days[1:]):
+        run = run + 1 if (day - prev).days == 1 else 1
+        longest = max(longest, run)
+
+    total_days = (days[-1] - days[0]).days + 1
+    return {"current": current, "longest": longest, "completion_rate": int(len(dates) / total_days * 100)}
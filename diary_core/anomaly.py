@@ -0,0 +1,164 @@
+import bisect
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from diary_core import trace
+
+# 評価・睡眠時間・記録の頻度の外れ値（いつもと違う日）と変化点（調子が変わった時期）をオンラインで検出する
+#   外れ値: 直近 WINDOW 日分の値の中央値と MAD（中央値からの絶対偏差の中央値）で求めたロバスト z スコアが THRESHOLD を超えた日
+#   変化点: ロバスト z スコアの累積和（両側 CUSUM）が CUSUM_H を超えた時点。低い評価が続いたときなど、1日ごとには外れ値でなくても検出する
+# 記録の頻度（7日間の記録数）は、1日休むだけで7日続けて下がらないように、最初の日から7日ごとの区切りでだけ読む
+# 1日分の更新は直近 WINDOW 個の値だけを使うので、日記が増えても1日あたりの計算量は変わらない
+# 日付が末尾に増えただけなら続きから計算し、過去の日記が変わったときだけ最初から計算し直す（rolling.RollingStats と同じ）
+
+DEFAULT_COLUMNS = ("rating", "sleep_hours", "entries_7d")
+COLUMN_LABELS = {"rating": "評価", "sleep_hours": "睡眠時間", "entries_7d": "7日間の記録数"}
+WINDOW = 30
+# 検出を始めるのに必要な値の数
+MIN_PERIODS = 7
+THRESHOLD = 3.5
+# CUSUM の許容幅（z スコアでこれ以下のずれは溜めない）と検出のしきい値
+CUSUM_K = 0.5
+CUSUM_H = 5.0
+# MAD が 0 になる（同じ値が続く）ときに使う、ばらつきの下限
+MIN_SCALE = {"rating": 0.5, "sleep_hours": 0.5, "entries_7d": 1.0}
+
+OUTLIER = "外れ値"
+CHANGEPOINT = "変化点"
+UP = "上昇"
+DOWN = "低下"
+
+
+# 1つの項目の検出の状態（直近の値・その並べ替え・CUSUM の累積）
+class _SeriesState:
+    def __init__(self, window, min_scale):
+        self.window = window
+        self.min_scale = min_scale
+        self.values = deque()
+        self.sorted = []
+        self.up = 0.0
+        self.down = 0.0
+        self.up_start = None
+        self.down_start = None
+
+    def _median(self, values):
+        n = len(values)
+        return (values[(n - 1) // 2] + values[n // 2]) / 2
+
+    # 値を1つ読み、(z スコア, 変化点の情報 or None) を返す（z は判定できないとき NaN）
+    def step(self, date, value):
+        z = np.nan
+        change = None
+        if len(self.values) >= MIN_PERIODS:
+            median = self._median(self.sorted)
+            mad = self._median(sorted(abs(v - median) for v in self.sorted))
+            z = (value - median) / max(1.4826 * mad, self.min_scale)
+
+            # 両側 CUSUM（溜まり始めた日を変化の開始日とする）
+            if self.up == 0:
+                self.up_start = date
+            if self.down == 0:
+                self.down_start = date
+            self.up = max(0.0, self.up + z - CUSUM_K)
+            self.down = max(0.0, self.down - z - CUSUM_K)
+            if self.up > CUSUM_H:
+                change = (UP, self.up_start)
+            elif self.down > CUSUM_H:
+                change = (DOWN, self.down_start)
+            if change is not None:
+                self.up = self.down = 0.0
+
+        self.values.append(value)
+        bisect.insort(self.sorted, value)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            del self.sorted[bisect.bisect_left(self.sorted, old)]
+        return z, change
+
+
+# 日次データ（rolling.daily_frame の結果）から外れ値と変化点を検出し、状態を持ち続けるキャッシュ
+class AnomalyDetector:
+    def __init__(self, columns=DEFAULT_COLUMNS, window=WINDOW, threshold=THRESHOLD):
+        self.columns = tuple(columns)
+        self.window = window
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._key = None
+        self._index = None
+        self._reset()
+
+    def _reset(self):
+        self._states = {col: _SeriesState(self.window, MIN_SCALE.get(col, 0.5)) for col in self.columns}
+        self._recent_entries = deque(maxlen=7)
+        self._days = 0
+        self.events = []
+        self.frame = None
+
+    # 日次データフレームを受け取り、増えた日の分だけ検出して、日ごとの z スコアと外れ値かどうかを返す
+    @trace.traced("anomaly:update")
+    def update(self, daily):
+        with self._lock:
+            key = daily.reindex(columns=["rating", "sleep_hours", "entries"]).to_numpy(dtype=float)
+            if not self._can_extend(daily.index, key):
+                self._reset()
+                start = 0
+            else:
+                start = len(self._key)
+            rows = [self._step(date, row) for date, row in zip(daily.index[start:], key[start:])]
+            tail = pd.DataFrame(rows, index=daily.index[start:], columns=self._frame_columns())
+            # 増えた日の分だけ末尾に足す
+            self.frame = tail if start == 0 else pd.concat([self.frame, tail])
+            self._key = key
+            self._index = daily.index
+            return self.frame
+
+    def _can_extend(self, index, key):
+        if self._key is None or len(self._key) == 0 or len(key) < len(self._key):
+            return False
+        old_len = len(self._key)
+        return bool(index[0] == self._index[0]) and np.array_equal(key[:old_len], self._key, equal_nan=True)
+
+    def _frame_columns(self):
+        return [f"{col}_{name}" for col in self.columns for name in ("value", "z", "outlier")]
+
+    # 1日分を読む（記録のない日は評価・睡眠時間を、7日の区切りでない日は記録数を読まない）
+    def _step(self, date, row):
+        rating, sleep_hours, entries = row
+        self._recent_entries.append(entries)
+        self._days += 1
+        week_done = self._days % 7 == 0
+        values = {"rating": rating, "sleep_hours": sleep_hours, "entries_7d": float(sum(self._recent_entries)) if week_done else np.nan}
+        result = {}
+        for col in self.columns:
+            value = values[col]
+            z = np.nan
+            if not np.isnan(value):
+                z, change = self._states[col].step(date, value)
+                if change is not None:
+                    direction, start = change
+                    self.events.append({"date": date, "column": col, "kind": CHANGEPOINT, "direction": direction, "start": start, "value": value, "z": z})
+                if abs(z) > self.threshold:
+                    self.events.append({"date": date, "column": col, "kind": OUTLIER, "direction": UP if z > 0 else DOWN, "start": date, "value": value, "z": z})
+            result[f"{col}_value"] = value
+            result[f"{col}_z"] = z
+            result[f"{col}_outlier"] = bool(abs(z) > self.threshold)
+        return result
+
+    # 検出した外れ値・変化点（新しい順。column・kind で絞り込める）
+    def event_frame(self, column=None, kind=None):
+        events = pd.DataFrame(self.events, columns=["date", "column", "kind", "direction", "start", "value", "z"])
+        if column is not None:
+            events = events[events["column"] == column]
+        if kind is not None:
+            events = events[events["kind"] == kind]
+        return events.iloc[::-1].reset_index(drop=True)
+
+
+# 一度だけ検出する場合のショートカット
+def detect(daily, columns=DEFAULT_COLUMNS):
+    detector = AnomalyDetector(columns)
+    detector.update(daily)
+    return detector
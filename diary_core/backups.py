@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from diary_core import trace
+from diary_core.storage import LocalStorage, content_version, storage_from_env
+
+# 日記の増分バックアップ（任意の時点への復元用）
+#   日記1日分を内容のハッシュを名前にしたファイル（blob）にするので、同じ内容は1度しか保存しない
+#   スナップショットのマニフェストには、1つ前のスナップショットから変わった日付と blob のハッシュだけを書く
+#   （CHECKPOINT_EVERY 回ごとに全日付を書き、ある時点の内容はそこから順に変更を適用して作る）
+#
+# backup_dir の中身
+#   blobs/ab/abcdef....json : 日記1日分
+#   manifests/<ID>.json     : スナップショット（ID は作成日時なので、名前順が作成順）
+
+CHECKPOINT_EVERY = 50
+# マニフェストがこの数を超えたら古いスナップショットを整理する
+MAX_MANIFESTS = 200
+# 残すスナップショット: 直近1時間はすべて、それより前は1時間に1つ・1日に1つ・1週間に1つをそれぞれの期間だけ
+KEEP_ALL_SECONDS = 3600
+KEEP_HOURLY = 48
+KEEP_DAILY = 30
+KEEP_WEEKLY = 26
+
+
+# 日記1日分の blob（キーの順番をそろえて、同じ内容なら同じハッシュにする）
+def entry_blob(entry):
+    raw = json.dumps(entry, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return content_version(raw), raw
+
+
+# 変更を適用する（ハッシュが None の日付は削除）
+def _apply(state, changes):
+    for date, digest in changes.items():
+        if digest is None:
+            state.pop(date, None)
+        else:
+            state[date] = digest
+
+
+# 2つの時点の差分（変わった日付 → 新しいハッシュ。削除は None）
+def _diff(old, new):
+    changes = {date: digest for date, digest in new.items() if old.get(date) != digest}
+    changes.update({date: None for date in old if date not in new})
+    return changes
+
+
+# スナップショットの中での日記のキー（ふつうは日付。日付のない日記や同じ日付の2件目は、内容のハッシュを付けて区別する）
+#   読み込めなかった日記（日付の形式が正しくないものなど）もそのまま保存して、戻せるようにする
+def _entry_key(entry, digest, seen):
+    date = entry.get("date") if isinstance(entry, dict) else None
+    if isinstance(date, str) and date not in seen:
+        return date
+    return f"{date if isinstance(date, str) else ''}#{digest[:12]}"
+
+
+# 日記リストの (キー, ハッシュ, blob の内容) を順に返す
+def _entries(diary):
+    seen = set()
+    for entry in diary:
+        digest, raw = entry_blob(entry)
+        key = _entry_key(entry, digest, seen)
+        seen.add(key)
+        yield key, digest, raw
+
+
+class BackupStore:
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self._blob_dir = os.path.join(backup_dir, "blobs")
+        self._manifest_dir = os.path.join(backup_dir, "manifests")
+        os.makedirs(self._blob_dir, exist_ok=True)
+        os.makedirs(self._manifest_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        # 最新のスナップショットの (ID, 日付 → ハッシュ)
+        self._head = None
+        # マニフェストの一覧・履歴・ディスク使用量（名前 → (キャッシュのキー, 値)）
+        #   画面を開くたびにディレクトリを読まないように、スナップショットを書いた・整理したときだけ作り直す
+        self._cache = {}
+        self._generation = 0
+
+    def _blob_path(self, digest):
+        return os.path.join(self._blob_dir, digest[:2], f"{digest}.json")
+
+    def _manifest_path(self, manifest_id):
+        return os.path.join(self._manifest_dir, f"{manifest_id}.json")
+
+    # 一覧のキャッシュのキー（このインスタンスで書き換えた回数と、他のプロセスが書いたときのためのディレクトリの更新時刻）
+    def _listing_key(self):
+        return self._generation, os.stat(self._manifest_dir).st_mtime_ns
+
+    def _cached(self, name, compute):
+        with self._lock:
+            key = self._listing_key()
+            cached = self._cache.get(name)
+            if cached is None or cached[0] != key:
+                cached = self._cache[name] = (key, compute())
+            return cached[1]
+
+    def _changed(self):
+        with self._lock:
+            self._generation += 1
+            self._cache = {}
+
+    def manifest_ids(self):
+        return list(self._cached(
+            "ids", lambda: sorted(name[:-5] for name in os.listdir(self._manifest_dir) if name.endswith(".json"))
+        ))
+
+    def read_manifest(self, manifest_id):
+        with open(self._manifest_path(manifest_id), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        path = self._manifest_path(manifest["id"])
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+        self._changed()
+
+    def _write_blob(self, digest, raw):
+        path = self._blob_path(digest)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(raw)
+        os.replace(f"{path}.tmp", path)
+        return True
+
+    def read_blob(self, digest):
+        with open(self._blob_path(digest), encoding="utf-8") as f:
+            return json.load(f)
+
+    def head(self):
+        ids = self.manifest_ids()
+        return ids[-1] if ids else None
+
+    # その時点の日付 → ハッシュ（直前の全日付のマニフェストから変更を順に適用する）
+    def state(self, manifest_id):
+        with self._lock:
+            if self._head and self._head[0] == manifest_id:
+                return dict(self._head[1])
+            chain = []
+            manifest = self.read_manifest(manifest_id)
+            while not manifest["full"]:
+                chain.append(manifest)
+                manifest = self.read_manifest(manifest["parent"])
+            state = dict(manifest["entries"])
+            for manifest in reversed(chain):
+                _apply(state, manifest["entries"])
+            return state
+
+    def _head_state(self):
+        head = self.head()
+        if head is None:
+            return None, {}
+        if self._head is None or self._head[0] != head:
+            self._head = (head, self.state(head))
+        return self._head
+
+    # 日記のスナップショットを取る（前回から変わっていなければ何もしない）。戻り値は作ったスナップショットの ID
+    @trace.traced("backup:snapshot")
+    def snapshot(self, diary, message="", now=None):
+        with self._lock:
+            now = now or time.time()
+            head, previous = self._head_state()
+            state = {}
+            raws = {}
+            for key, digest, raw in _entries(diary):
+                state[key] = digest
+                if previous.get(key) != digest:
+                    raws[digest] = raw
+            changes = _diff(previous, state)
+            if head is not None and not changes:
+                return None
+
+            blobs = sum(self._write_blob(digest, raw) for digest, raw in raws.items())
+            depth = 0 if head is None else self.read_manifest(head).get("depth", 0) + 1
+            full = depth >= CHECKPOINT_EVERY or head is None
+            manifest_id = datetime.fromtimestamp(now).strftime("%Y%m%dT%H%M%S%f")
+            self._write_manifest({
+                "id": manifest_id,
+                "created_at": now,
+                "parent": head,
+                "full": full,
+                "depth": 0 if full else depth,
+                "count": len(state),
+                "changed": len(changes),
+                "new_blobs": blobs,
+                "message": message,
+                "entries": state if full else changes,
+            })
+            self._head = (manifest_id, state)
+
+            if len(self.manifest_ids()) > MAX_MANIFESTS:
+                self.prune(now)
+            return manifest_id
+
+    # スナップショットの一覧（新しい順。日記の内容は含めない）
+    def history(self):
+        return [dict(manifest) for manifest in self._cached("history", self._read_history)]
+
+    def _read_history(self):
+        history = []
+        for manifest_id in reversed(self.manifest_ids()):
+            manifest = self.read_manifest(manifest_id)
+            manifest.pop("entries")
+            history.append(manifest)
+        return history
+
+    # その時点の日記全体（日付順）
+    def restore(self, manifest_id):
+        state = self.state(manifest_id)
+        return [self.read_blob(state[date]) for date in sorted(state)]
+
+    # その時点の特定の日付の日記（なければ None）
+    def restore_entry(self, manifest_id, date):
+        digest = self.state(manifest_id).get(date)
+        return None if digest is None else self.read_blob(digest)
+
+    # 日記リストを、その時点（key を指定するとその日付だけ）に戻した内容。キーの順に並べる
+    def restore_into(self, manifest_id, diary, key=None):
+        if key is None:
+            return self.restore(manifest_id)
+        entries = [(k, entry) for (k, _, _), entry in zip(_entries(diary), diary) if k != key]
+        entry = self.restore_entry(manifest_id, key)
+        if entry is not None:
+            entries.append((key, entry))
+        return [entry for _, entry in sorted(entries, key=lambda pair: pair[0])]
+
+    # 日記リストをその時点（key を指定するとその日付だけ）に戻したときの追加・更新・削除の件数（blob は読まない）
+    def compare(self, manifest_id, diary, key=None):
+        current = {k: digest for k, digest, _ in _entries(diary)}
+        target = self.state(manifest_id)
+        if key is not None:
+            digest = target.get(key)
+            target = {k: d for k, d in current.items() if k != key}
+            if digest is not None:
+                target[key] = digest
+        changes = _diff(current, target)
+        return {
+            "added": sum(digest is not None and k not in current for k, digest in changes.items()),
+            "updated": sum(digest is not None and k in current for k, digest in changes.items()),
+            "removed": sum(digest is None for digest in changes.values()),
+        }
+
+    # 残すスナップショットを選ぶ（新しいものから順に、期間ごとの区切りで最初に見つかったものを残す）
+    def _retained(self, manifests, now):
+        keep = set()
+        seen = set()
+        tiers = (("hour", "%Y%m%d%H", KEEP_HOURLY * 3600), ("day", "%Y%m%d", KEEP_DAILY * 86400), ("week", "%G%V", KEEP_WEEKLY * 7 * 86400))
+        for manifest in sorted(manifests, key=lambda m: m["id"], reverse=True):
+            age = now - manifest["created_at"]
+            if age <= KEEP_ALL_SECONDS:
+                keep.add(manifest["id"])
+                continue
+            created = datetime.fromtimestamp(manifest["created_at"])
+            for tier, fmt, limit in tiers:
+                bucket = (tier, created.strftime(fmt))
+                if age <= limit and bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(manifest["id"])
+        if manifests:
+            keep.add(max(m["id"] for m in manifests))
+        return keep
+
+    # 古いスナップショットを間引き、残したものを差分でつなぎ直して、どこからも使われない blob を消す
+    @trace.traced("backup:prune")
+    def prune(self, now=None):
+        with self._lock:
+            now = now or time.time()
+            ids = self.manifest_ids()
+            manifests = [self.read_manifest(manifest_id) for manifest_id in ids]
+            keep = self._retained(manifests, now)
+
+            # 作成順に変更を適用しながら、残すスナップショットの内容を差分で書き直す
+            state = {}
+            kept_state = {}
+            parent = None
+            depth = 0
+            referenced = set()
+            for manifest in manifests:
+                if manifest["full"]:
+                    state = dict(manifest["entries"])
+                else:
+                    _apply(state, manifest["entries"])
+                if manifest["id"] not in keep:
+                    continue
+                depth = 0 if parent is None or depth + 1 >= CHECKPOINT_EVERY else depth + 1
+                full = depth == 0
+                changes = _diff(kept_state, state)
+                manifest.update(
+                    parent=parent,
+                    full=full,
+                    depth=depth,
+                    changed=len(changes) if parent is not None else len(state),
+                    entries=dict(state) if full else changes,
+                )
+                self._write_manifest(manifest)
+                referenced.update(state.values())
+                kept_state = dict(state)
+                parent = manifest["id"]
+
+            removed = [manifest_id for manifest_id in ids if manifest_id not in keep]
+            for manifest_id in removed:
+                os.remove(self._manifest_path(manifest_id))
+
+            removed_blobs = 0
+            for prefix in os.listdir(self._blob_dir):
+                for name in os.listdir(os.path.join(self._blob_dir, prefix)):
+                    if name[:-5] not in referenced:
+                        os.remove(os.path.join(self._blob_dir, prefix, name))
+                        removed_blobs += 1
+            self._head = None
+            self._changed()
+            return {"kept": len(keep), "removed": len(removed), "removed_blobs": removed_blobs}
+
+    # バックアップのファイル数と大きさ（blob はスナップショットを書いた・整理したときにしか増減しないので、一覧と同じくキャッシュする）
+    def disk_usage(self):
+        return dict(self._cached("usage", self._read_disk_usage))
+
+    def _read_disk_usage(self):
+        usage = {"manifests": 0, "blobs": 0, "bytes": 0}
+        for root, _, files in os.walk(self.backup_dir):
+            kind = "manifests" if root == self._manifest_dir else "blobs"
+            for name in files:
+                usage[kind] += 1
+                usage["bytes"] += os.path.getsize(os.path.join(root, name))
+        return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日記の増分バックアップを取る・一覧する・整理する・復元します")
+    parser.add_argument("command", choices=["snapshot", "list", "prune", "restore"])
+    parser.add_argument("--dir", default=".diary_backups/default", help="バックアップのディレクトリ")
+    parser.add_argument("--input", help="日記のファイル（省略時は DIARY_STORAGE などの環境変数の設定から読み込む）")
+    parser.add_argument("--id", help="復元するスナップショットの ID（restore。省略時は最新）")
+    parser.add_argument("--out", help="復元した日記を書き出すファイル（restore）")
+    args = parser.parse_args()
+
+    store = BackupStore(args.dir)
+    if args.command == "snapshot":
+        storage = LocalStorage(args.input) if args.input else storage_from_env()
+        manifest_id = store.snapshot(storage.load(), "コマンドから作成")
+        print(f"スナップショット {manifest_id} を作りました" if manifest_id else "前回から変更はありません")
+    elif args.command == "list":
+        for m in store.history():
+            print(f"{m['id']}  {datetime.fromtimestamp(m['created_at']):%Y-%m-%d %H:%M:%S}  {m['count']}件（変更 {m['changed']}件） {m['message']}")
+    elif args.command == "prune":
+        result = store.prune()
+        print(f"{result['removed']}個のスナップショットと{result['removed_blobs']}個の blob を削除しました（残り{result['kept']}個）")
+    elif args.command == "restore":
+        if not args.out:
+            parser.error("restore には --out が必要です")
+        manifest_id = args.id or store.head()
+        LocalStorage(args.out).save(store.restore(manifest_id))
+        print(f"{manifest_id} の時点の日記を {args.out} に書き出しました")
+
+
+if __name__ == "__main__":
+    main()
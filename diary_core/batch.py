@@ -0,0 +1,262 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from diary_core import charts, trace
+from diary_core.frame import to_frame
+from diary_core.reports import period_report
+from diary_core.storage import LocalStorage, storage_from_env
+from diary_core.text import get_tokenizer
+
+# 全期間の週間・月間・四半期・年間レポートを静的 HTML として書き出すバッチ処理
+#   python -m diary_core.batch --out reports
+#   python -m diary_core.batch --input diary.json --periods week month --workers 4
+# 前回から元データが変わっていない期間はスキップする（manifest.json に期間ごとのハッシュを保存）
+
+# HTML の構成を変えたら上げる（すべての期間を作り直す）
+RENDER_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# 期間の種類（pandas の期間の単位, 表示名, 前の期間の呼び方）
+PERIOD_KINDS = {
+    "week": ("W", "週間", "前週"),
+    "month": ("M", "月間", "前月"),
+    "quarter": ("Q", "四半期", "前の四半期"),
+    "year": ("Y", "年間", "前年"),
+}
+
+PLOTLY_CDN = "https://cdn.plot.ly/plotly-2.35.2.min.js"
+
+
+# 期間のキー（ファイル名にも使う）
+def period_key(kind, period):
+    if kind == "week":
+        return period.start_time.strftime("%Y-%m-%d")
+    if kind == "month":
+        return period.strftime("%Y-%m")
+    if kind == "quarter":
+        return period.strftime("%Y-Q%q")
+    return period.strftime("%Y")
+
+
+# 期間の元データのハッシュ（前の期間との比較にも使うので前の期間の評価も含める）
+def source_hash(entries, prev_entries):
+    payload = {
+        "version": RENDER_VERSION,
+        "entries": sorted(entries, key=lambda d: d["date"]),
+        "prev_ratings": sorted((d["date"], d.get("rating")) for d in prev_entries),
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+
+# 日記を期間ごとに分けて、出力する期間の一覧を作る
+def plan_periods(diary, kinds):
+    dates = pd.to_datetime(pd.Series([d["date"] for d in diary]))
+    tasks = []
+    for kind in kinds:
+        freq = PERIOD_KINDS[kind][0]
+        groups = defaultdict(list)
+        for entry, period in zip(diary, dates.dt.to_period(freq)):
+            groups[period].append(entry)
+
+        for period in sorted(groups):
+            prev_entries = groups.get(period - 1, [])
+            tasks.append({
+                "kind": kind,
+                "key": period_key(kind, period),
+                "start": period.start_time.normalize(),
+                "end": period.end_time.normalize(),
+                "prev_start": (period - 1).start_time.normalize(),
+                "prev_end": (period - 1).end_time.normalize(),
+                "entries": groups[period],
+                "prev_entries": prev_entries,
+                "hash": source_hash(groups[period], prev_entries),
+            })
+    return tasks
+
+
+def _metric(label, value):
+    return f'<div class="metric"><div class="label">{html.escape(label)}</div><div class="value">{html.escape(value)}</div></div>'
+
+
+# 1期間分の HTML を組み立てる
+def render_html(task, report):
+    _, kind_label, prev_label = PERIOD_KINDS[task["kind"]]
+    title = f"{kind_label}レポート {task['start']:%Y/%m/%d} - {task['end']:%Y/%m/%d}"
+
+    delta = "データなし"
+    if report["prev_avg_rating"] is not None:
+        delta = f"{report['avg_rating'] - report['prev_avg_rating']:+.1f}"
+    avg_sleep = f"{report['avg_sleep']:.1f}時間" if pd.notna(report["avg_sleep"]) else "データなし"
+    days = (task["end"] - task["start"]).days + 1
+
+    figures = [charts.rating_line(report["data"])]
+    if not report["health_counts"].empty:
+        figures.append(charts.distribution_pie(report["health_counts"], "体調の分布"))
+    if not report["mood_counts"].empty:
+        figures.append(charts.distribution_pie(report["mood_counts"], "気分の分布"))
+    if not report["activity_counts"].empty:
+        figures.append(charts.count_bar(report["activity_counts"], "実施した活動", "活動内容", "回数"))
+    if not report["keywords"].empty:
+        figures.append(charts.count_bar(report["keywords"], "頻出キーワードTop10", "キーワード", "出現回数"))
+
+    with trace.span("plotly:to_html", figures=len(figures)):
+        chart_html = "\n".join(fig.to_html(full_html=False, include_plotlyjs=False) for fig in figures)
+
+    best_day = report["best_day"]
+    activities = ", ".join(best_day["activities"]) if best_day["activities"] else "なし"
+    keywords = "".join(
+        f"<li>{html.escape(str(word))}（{count}回）</li>" for word, count in report["keywords"].items()
+    )
+
+    return f"""<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<script src="{PLOTLY_CDN}"></script>
+<style>
+body {{ font-family: sans-serif; margin: 24px; color: #333; }}
+.metrics {{ display: flex; gap: 16px; margin-bottom: 16px; }}
+.metric {{ padding: 12px 16px; border-radius: 5px; background-color: rgba(240, 240, 240, 0.6); }}
+.metric .label {{ font-size: 12px; color: #666; }}
+.metric .value {{ font-size: 22px; font-weight: bold; }}
+.highlight {{ padding: 15px; border-radius: 5px; background-color: rgba(240, 240, 240, 0.3); border-left: 5px solid #4CAF50; }}
+</style>
+</head>
+<body>
+<p><a href="../index.html">← 一覧に戻る</a></p>
+<h1>📈 {html.escape(title)}</h1>
+<h2>📊 基本統計</h2>
+<div class="metrics">
+{_metric("記録日数", f"{report['entry_count']}/{days}日")}
+{_metric("平均評価", f"{report['avg_rating']:.1f}点")}
+{_metric(f"{prev_label}比", delta)}
+{_metric("平均睡眠時間", avg_sleep)}
+</div>
+<h2>✨ ハイライト</h2>
+<div class="highlight">
+<h3>ベストデー: {best_day['date']:%Y/%m/%d}（{best_day['rating']}点）</h3>
+<p><b>天気</b>: {html.escape(best_day['weather'] or 'N/A')} / <b>体調</b>: {html.escape(best_day['health'] or 'N/A')}</p>
+<p><b>活動</b>: {html.escape(activities)}</p>
+<p>{html.escape(best_day['content']).replace(chr(10), '<br>')}</p>
+</div>
+<h2>🔍 頻出キーワードTop10</h2>
+<ol>{keywords}</ol>
+<h2>📈 グラフ</h2>
+{chart_html}
+</body>
+</html>
+"""
+
+
+# プロセスごとに形態素解析の辞書を1度だけ読み込む
+def _init_worker():
+    get_tokenizer()
+
+
+# 1期間分のレポートを作って書き出す（プロセスプールで実行）
+def render_period(task, out_dir):
+    start = time.perf_counter()
+    df = to_frame(task["entries"] + task["prev_entries"])
+    report = period_report(df, task["start"], task["end"], task["prev_start"], task["prev_end"])
+
+    path = os.path.join(out_dir, task["kind"], f"{task['key']}.html")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_html(task, report))
+    return task["kind"], task["key"], time.perf_counter() - start
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+# すべてのレポートへのリンクをまとめた index.html
+def write_index(out_dir, tasks):
+    sections = []
+    for kind, (_, kind_label, _) in PERIOD_KINDS.items():
+        links = [
+            f'<li><a href="{kind}/{t["key"]}.html">{t["start"]:%Y/%m/%d} - {t["end"]:%Y/%m/%d}</a>（{len(t["entries"])}件）</li>'
+            for t in sorted((t for t in tasks if t["kind"] == kind), key=lambda t: t["key"], reverse=True)
+        ]
+        if links:
+            sections.append(f"<h2>{kind_label}レポート</h2>\n<ul>\n" + "\n".join(links) + "\n</ul>")
+
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write('<!DOCTYPE html>\n<html lang="ja">\n<head><meta charset="utf-8"><title>日記レポート</title></head>\n'
+                "<body>\n<h1>📖 日記レポート</h1>\n" + "\n".join(sections) + "\n</body>\n</html>\n")
+
+
+# 変更のあった期間だけを並列に書き出す。戻り値は (書き出した数, スキップした数)
+def generate_reports(diary, out_dir, kinds=tuple(PERIOD_KINDS), workers=None, force=False, progress=print):
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = plan_periods(diary, kinds)
+    manifest = {} if force else load_manifest(out_dir)
+
+    pending = [
+        t for t in tasks
+        if manifest.get(f"{t['kind']}/{t['key']}") != t["hash"]
+        or not os.path.exists(os.path.join(out_dir, t["kind"], f"{t['key']}.html"))
+    ]
+    progress(f"{len(tasks)}期間のうち {len(pending)}期間を作成します（{len(tasks) - len(pending)}期間は変更なし）")
+
+    done = 0
+    if pending:
+        hashes = {f"{t['kind']}/{t['key']}": t["hash"] for t in pending}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(render_period, t, out_dir) for t in pending]
+            for future in as_completed(futures):
+                kind, key, seconds = future.result()
+                manifest[f"{kind}/{key}"] = hashes[f"{kind}/{key}"]
+                done += 1
+                progress(f"[{done}/{len(pending)}] {kind}/{key}.html ({seconds:.2f}s)")
+
+    # なくなった期間のエントリは manifest から消す
+    current = {f"{t['kind']}/{t['key']}" for t in tasks}
+    manifest = {key: value for key, value in manifest.items() if key in current}
+    save_manifest(out_dir, manifest)
+    write_index(out_dir, tasks)
+    return done, len(tasks) - len(pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="週間・月間・四半期・年間レポートを HTML で一括出力します")
+    parser.add_argument("--input", help="日記の JSON ファイル（省略時は DIARY_STORAGE などの環境変数の設定から読み込む）")
+    parser.add_argument("--out", default="reports", help="出力先のディレクトリ")
+    parser.add_argument("--periods", nargs="+", choices=list(PERIOD_KINDS), default=list(PERIOD_KINDS), help="出力する期間の種類")
+    parser.add_argument("--workers", type=int, default=None, help="並列に処理するプロセス数（省略時は CPU 数）")
+    parser.add_argument("--force", action="store_true", help="変更のない期間も作り直す")
+    args = parser.parse_args()
+
+    storage = LocalStorage(args.input) if args.input else storage_from_env()
+    diary = storage.load()
+    if not diary:
+        print("日記データがありません。")
+        return
+
+    start = time.perf_counter()
+    done, skipped = generate_reports(diary, args.out, args.periods, args.workers, args.force)
+    print(f"{done}件のレポートを作成、{skipped}件をスキップしました（{time.perf_counter() - start:.1f}秒） → {os.path.join(args.out, 'index.html')}")
+
+
+if __name__ == "__main__":
+    main()
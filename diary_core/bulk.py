@@ -0,0 +1,137 @@
+import argparse
+import json
+
+from diary_core import analytics, codec, importer, trace
+from diary_core.export import select_entries
+from diary_core.storage import LocalStorage, storage_from_env
+
+# 日記の一括操作（期間・条件での削除、活動・気分の名前の変更と統合、一括追加・更新）
+#   どの操作も (新しい日記リスト, 集計) を返すだけで保存はしないので、集計を確認してから1回の保存で反映する
+#   集計: operation（操作名）, matched（対象の件数）, changed（変わった件数）, changes（[(日付, 変更前, 変更後)]。削除は変更後が None）
+
+# 名前を変更できる項目（活動は日記ごとに複数、気分は1つ）
+RENAMABLE_FIELDS = {"activities": "活動", "mood": "気分"}
+
+
+def _summary(operation, matched, changes):
+    return {"operation": operation, "matched": matched, "changed": len(changes), "changes": changes}
+
+
+# 期間（"YYYY-MM-DD"、両端を含む）と検索条件（analytics.filter_entries と同じ）に合う日記を削除する
+#   条件を何も指定しないとすべて削除する
+def delete_entries(diary, start=None, end=None, query="", weather=analytics.ALL, health=analytics.ALL, rating=analytics.ALL, activities=None):
+    in_range = list(select_entries(diary, start, end))
+    targets = {d["date"] for d in analytics.filter_entries(in_range, query, weather, health, rating, activities)}
+    result = [d for d in diary if d["date"] not in targets]
+    changes = [(d["date"], d, None) for d in diary if d["date"] in targets]
+    return result, _summary("削除", len(targets), changes)
+
+
+# 活動・気分の名前を変える（複数の名前を1つにまとめることもできる）。期間を指定するとその中の日記だけ
+def rename_values(diary, field, old_values, new_value, start=None, end=None):
+    if field not in RENAMABLE_FIELDS:
+        raise ValueError(f"名前を変更できない項目です: {field}")
+    old_values = set(old_values) - {new_value}
+    if not new_value:
+        raise ValueError("新しい名前を入力してください")
+
+    in_range = {d["date"] for d in select_entries(diary, start, end)}
+    result = []
+    changes = []
+    for d in diary:
+        value = d.get(field)
+        if d["date"] in in_range and field == "mood" and value in old_values:
+            updated = dict(d, mood=new_value)
+        elif d["date"] in in_range and field == "activities" and isinstance(value, list) and old_values.intersection(value):
+            # まとめた結果、同じ活動が重なったら1つにする（順番は最初に出てきた位置）
+            renamed = [new_value if a in old_values else a for a in value]
+            updated = dict(d, activities=list(dict.fromkeys(renamed)))
+        else:
+            result.append(d)
+            continue
+        result.append(updated)
+        changes.append((d["date"], d, updated))
+    label = f"{RENAMABLE_FIELDS[field]}の名前を「{new_value}」に変更"
+    return result, _summary(label, len(changes), changes)
+
+
+# 複数の日記をまとめて追加・更新する（検証・補完は取り込みと同じ。同じ日付は上書き）
+def batch_upsert(diary, records):
+    result, summary = importer.apply_records(diary, records, importer.MERGE)
+    current = {d["date"]: d for d in diary}
+    changes = [
+        (d["date"], current.get(d["date"]), d) for d in result
+        if current.get(d["date"]) is None or (current[d["date"]] is not d and importer.normalized_entry(current[d["date"]]) != d)
+    ]
+    bulk_summary = _summary("一括追加・更新", summary["read"], changes)
+    bulk_summary.update(invalid=summary["invalid"], errors=summary["errors"])
+    return result, bulk_summary
+
+
+# 変更内容の一覧（表示用。変更前・変更後の主な項目）
+def preview_rows(summary, limit=None):
+    rows = []
+    for date, before, after in summary["changes"][:limit]:
+        entry = after or before
+        rows.append({
+            "date": date,
+            "action": "削除" if after is None else "追加" if before is None else "更新",
+            "content": (entry.get("content") or "")[:40],
+            "mood": entry.get("mood", "") if before is None or after is None else _change(before.get("mood"), after.get("mood")),
+            "activities": ", ".join(entry.get("activities") or []) if before is None or after is None
+            else _change(", ".join(before.get("activities") or []), ", ".join(after.get("activities") or [])),
+        })
+    return rows
+
+
+def _change(before, after):
+    return before if before == after else f"{before} → {after}"
+
+
+# 操作の結果を1回の書き込みで保存する（変更がなければ保存しない）。戻り値は保存したか
+@trace.traced("bulk:commit")
+def commit(storage, diary, summary):
+    if not summary["changed"]:
+        return False
+    storage.save(diary, f"{summary['operation']}（{summary['changed']}件）")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日記を一括で削除・名前変更・追加更新します（1回の保存で反映）")
+    parser.add_argument("--input", help="日記のファイル（省略時は DIARY_STORAGE などの環境変数の設定から読み込む）")
+    parser.add_argument("--dry-run", action="store_true", help="対象を表示するだけで保存しない")
+    commands = parser.add_subparsers(dest="command", required=True)
+    delete = commands.add_parser("delete", help="期間・条件に合う日記を削除する")
+    delete.add_argument("--start", help="開始日（YYYY-MM-DD）")
+    delete.add_argument("--end", help="終了日（YYYY-MM-DD）")
+    delete.add_argument("--query", default="", help="本文・メモに含まれる文字")
+    delete.add_argument("--activity", nargs="*", help="いずれかの活動を含む日記")
+    rename = commands.add_parser("rename", help="活動・気分の名前を変更・統合する")
+    rename.add_argument("--field", choices=list(RENAMABLE_FIELDS), required=True)
+    rename.add_argument("--old", nargs="+", required=True, help="変更前の名前（複数指定すると1つにまとめる）")
+    rename.add_argument("--new", required=True, help="変更後の名前")
+    upsert = commands.add_parser("upsert", help="JSON 配列・JSONL（圧縮したものも可）の日記をまとめて追加・更新する")
+    upsert.add_argument("file")
+    args = parser.parse_args()
+
+    storage = LocalStorage(args.input) if args.input else storage_from_env()
+    diary = storage.load()
+    if args.command == "delete":
+        if not (args.start or args.end or args.query or args.activity):
+            parser.error("すべて削除するときも --start か --end を指定してください")
+        result, summary = delete_entries(diary, args.start, args.end, args.query, activities=args.activity)
+    elif args.command == "rename":
+        result, summary = rename_values(diary, args.field, args.old, args.new)
+    else:
+        result, summary = batch_upsert(diary, codec.iter_file(args.file))
+
+    for row in preview_rows(summary, limit=20):
+        print(json.dumps(row, ensure_ascii=False))
+    print(f"{summary['operation']}: {summary['changed']}件")
+    if not args.dry_run and commit(storage, result, summary):
+        print("保存しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+# レポート画面とバッチ出力で共通のグラフ
+
+
+# 日々の評価の推移
+def rating_line(data, title="日々の評価の推移"):
+    return px.line(
+        data.sort_values("date"),
+        x="date",
+        y="rating",
+        title=title,
+        labels={"rating": "評価", "date": "日付"},
+        markers=True
+    )
+
+
+# 件数の円グラフ（体調・気分の分布）
+def distribution_pie(counts, title):
+    return px.pie(names=counts.index, values=counts.values, title=title)
+
+
+# 件数の棒グラフ（活動・キーワード）
+def count_bar(counts, title, x_label, y_label):
+    return px.bar(
+        x=counts.index,
+        y=counts.values,
+        title=title,
+        labels={"x": x_label, "y": y_label}
+    )
+
+
+# 共起ネットワーク（線の太さは重み、点の大きさは日数、色は平均評価）
+#   nodes・edges は cooccurrence.build_network / top_edges の結果、positions は cooccurrence.layout の結果
+def network_graph(nodes, edges, positions, weight="lift", title="活動とキーワードの共起ネットワーク"):
+    fig = go.Figure()
+    strengths = edges[weight].to_numpy(dtype=float)
+    low, high = (strengths.min(), strengths.max()) if len(strengths) else (0, 0)
+    for edge, strength in zip(edges.itertuples(), strengths):
+        (x0, y0), (x1, y1) = positions[edge.source], positions[edge.target]
+        fig.add_trace(go.Scatter(
+            x=[x0, x1], y=[y0, y1], mode="lines", hoverinfo="skip", showlegend=False,
+            line={"width": 1 + 5 * ((strength - low) / (high - low) if high > low else 0.5), "color": "rgba(120,120,120,0.5)"}
+        ))
+    # 線の中点に組み合わせの情報を出す
+    fig.add_trace(go.Scatter(
+        x=[(positions[s][0] + positions[t][0]) / 2 for s, t in zip(edges["source"], edges["target"])],
+        y=[(positions[s][1] + positions[t][1]) / 2 for s, t in zip(edges["source"], edges["target"])],
+        mode="markers", marker={"size": 6, "opacity": 0}, showlegend=False,
+        hovertext=[
+            f"{e.source} × {e.target}<br>{e.count}日・lift {e.lift:.2f}・PMI {e.pmi:.2f}<br>平均評価 {e.average:.2f}"
+            for e in edges.itertuples()
+        ],
+        hoverinfo="text",
+    ))
+    nodes = nodes[nodes["item"].isin(positions)]
+    fig.add_trace(go.Scatter(
+        x=[positions[item][0] for item in nodes["item"]],
+        y=[positions[item][1] for item in nodes["item"]],
+        mode="markers+text",
+        text=nodes["item"],
+        textposition="top center",
+        hovertext=[f"{n.item}（{n.kind}）<br>{n.days}日・平均評価 {n.average:.2f}" for n in nodes.itertuples()],
+        hoverinfo="text",
+        marker={
+            "size": 10 + 20 * np.sqrt(nodes["days"] / max(nodes["days"].max(), 1)),
+            "color": nodes["average"],
+            "colorscale": "RdYlGn",
+            "cmin": 1,
+            "cmax": 5,
+            "symbol": ["square" if kind == "活動" else "circle" for kind in nodes["kind"]],
+            "colorbar": {"title": "平均評価"},
+            "line": {"width": 1, "color": "white"},
+        },
+        showlegend=False,
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis={"visible": False},
+        yaxis={"visible": False},
+        height=650,
+        hovermode="closest",
+    )
+    return fig
@@ -0,0 +1,136 @@
+import argparse
+import gzip
+import io
+import json
+import os
+
+import zstandard
+
+from diary_core import trace
+
+# 日記ファイルの保存形式
+#   json : これまでの JSON 配列（diary.json）
+#   jsonl: 1行1日記の JSONL
+#   gzip : gzip で圧縮した JSONL（diary.jsonl.gz）
+#   zstd : zstd で圧縮した JSONL（diary.jsonl.zst）
+# 保存するときはファイル名の拡張子で形式を決め、読むときは先頭のバイト列で判定するので、どの形式でも読める
+# 圧縮された JSONL は展開しながら1行ずつ読むので、展開後のテキスト全体をメモリに置かない
+
+JSON = "json"
+JSONL = "jsonl"
+GZIP = "gzip"
+ZSTD = "zstd"
+CODECS = (JSON, JSONL, GZIP, ZSTD)
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+# JSONL をまとめて読む目安の文字数
+CHUNK_CHARS = 1024 * 1024
+
+
+# ファイル名から保存形式を決める
+def codec_for_path(path):
+    path = (path or "").lower()
+    if path.endswith(".gz"):
+        return GZIP
+    if path.endswith(".zst"):
+        return ZSTD
+    if path.endswith((".jsonl", ".ndjson")):
+        return JSONL
+    return JSON
+
+
+# 先頭のバイト列から保存形式を判定する
+def detect_codec(head):
+    if head.startswith(GZIP_MAGIC):
+        return GZIP
+    if head.startswith(ZSTD_MAGIC):
+        return ZSTD
+    if head.lstrip()[:1] == b"{":
+        return JSONL
+    return JSON
+
+
+def _jsonl(data):
+    return "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in data).encode("utf-8")
+
+
+# 日記リストを保存形式のバイト列にする（gzip は時刻を入れず、同じ内容なら同じバイト列になるようにする）
+def encode(data, codec=JSON):
+    if codec == JSON:
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+    if codec == JSONL:
+        return _jsonl(data)
+    if codec == GZIP:
+        return gzip.compress(_jsonl(data), compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(_jsonl(data))
+    raise ValueError(f"未対応の保存形式です: {codec}")
+
+
+# バイナリのストリームから日記を1件ずつ読む（形式は先頭のバイト列で判定する）
+def iter_entries(stream):
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    codec = detect_codec(stream.peek(len(ZSTD_MAGIC))[:len(ZSTD_MAGIC)])
+    if codec == JSON:
+        raw = stream.read()
+        yield from (json.loads(raw) if raw.strip() else [])
+        return
+    if codec == GZIP:
+        reader = gzip.GzipFile(fileobj=stream, mode="rb")
+    elif codec == ZSTD:
+        reader = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True, closefd=False)
+    else:
+        reader = stream
+    # 読み終わっても元のストリームは閉じないように、最後に切り離す
+    text_stream = io.TextIOWrapper(reader, encoding="utf-8")
+    try:
+        # 1行ずつ json.loads するより速いので、CHUNK_CHARS 文字ずつ配列にまとめて読む
+        while True:
+            lines = [line for line in text_stream.readlines(CHUNK_CHARS) if line.strip()]
+            if not lines:
+                break
+            yield from json.loads("[" + ",".join(lines) + "]")
+    finally:
+        if reader is stream:
+            text_stream.detach()
+
+
+# 保存形式のバイト列から日記リストを作る
+def decode(raw):
+    with trace.span("codec:decode", codec=detect_codec(raw[:len(ZSTD_MAGIC)]), bytes=len(raw)):
+        return list(iter_entries(io.BytesIO(raw)))
+
+
+# ファイルから日記を1件ずつ読む
+def iter_file(path):
+    with open(path, "rb") as f:
+        yield from iter_entries(f)
+
+
+# 日記ファイルを別の形式に変換する（形式は出力先の拡張子で決める）。戻り値は (変換前のバイト数, 変換後のバイト数)
+def convert(src, dst, codec=None):
+    raw = encode(list(iter_file(src)), codec or codec_for_path(dst))
+    tmp_path = f"{dst}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+    os.replace(tmp_path, dst)
+    return os.path.getsize(src), len(raw)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日記ファイルの保存形式を変換します（diary.json ⇔ diary.jsonl.zst など）")
+    parser.add_argument("src", help="変換元のファイル（形式は自動で判定）")
+    parser.add_argument("dst", help="変換先のファイル（.json / .jsonl / .jsonl.gz / .jsonl.zst）")
+    parser.add_argument("--codec", choices=CODECS, help="変換先の形式（省略時は拡張子から決める）")
+    args = parser.parse_args()
+
+    before, after = convert(args.src, args.dst, args.codec)
+    print(f"{args.src}（{before:,} バイト）→ {args.dst}（{after:,} バイト）")
+
+
+if __name__ == "__main__":
+    main()
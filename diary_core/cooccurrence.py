@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from diary_core import trace
+from diary_core.frame import rating_values
+
+# 活動とキーワードの共起ネットワーク
+#   日付×項目（活動・キーワード）の 0/1 の疎行列 X から、Xᵀ·X で2つの項目が同じ日に出てきた日数を求める
+#   評価の合計も Xᵀ·diag(評価)·X で求めるので、組み合わせごとに日記を数え直さない
+#   重み: lift = 同じ日に出てきた日数 × 全日数 / (項目1の日数 × 項目2の日数)、PMI = log2(lift)
+
+ACTIVITY = "活動"
+KEYWORD = "キーワード"
+WEIGHTS = {"lift": "リフト", "pmi": "PMI", "count": "同じ日に出てきた日数"}
+# 組み合わせの種類で絞り込むときの選択肢（表示名 → 種類の組）
+PAIR_KINDS = {
+    "すべて": None,
+    "活動どうし": (ACTIVITY, ACTIVITY),
+    "活動とキーワード": (ACTIVITY, KEYWORD),
+    "キーワードどうし": (KEYWORD, KEYWORD),
+}
+# キーワードはこの日数以上出てきたものだけを使う
+MIN_DAYS = 3
+# この日数以上同じ日に出てきた組み合わせだけを残す
+MIN_COUNT = 2
+
+
+# 活動の有無を 0/1 で表した疎行列（行は df と同じ並び）と、その列の活動
+def activity_presence(df):
+    activities = df["activities"].map(lambda a: list(a) if isinstance(a, (list, tuple, np.ndarray)) else [])
+    # 日記がないと object の配列になるので、整数の配列にする
+    lengths = activities.map(len).to_numpy(dtype=np.int64)
+    names = [a for row in activities for a in row]
+    codes, labels = pd.factorize(pd.Series(names, dtype=object))
+    rows = np.repeat(np.arange(len(df)), lengths)
+    matrix = sparse.csr_matrix((np.ones(len(codes), dtype=np.int32), (rows, codes)), shape=(len(df), len(labels)))
+    # 同じ日に同じ活動が重なっていても 1 にする
+    matrix.data[:] = 1
+    return list(labels), matrix
+
+
+# 行列の上三角から (rows, cols) の位置の値を取り出す（ない位置は 0）
+#   疎行列の添字で取り出すより、位置を整数のキーにして二分探索するほうが速い
+def _values_at(matrix, rows, cols):
+    upper = sparse.triu(matrix, k=1).tocoo()
+    size = matrix.shape[1]
+    keys = upper.row.astype(np.int64) * size + upper.col
+    order = np.argsort(keys)
+    keys, data = keys[order], upper.data[order]
+    if len(keys) == 0:
+        return np.zeros(len(rows))
+    wanted = rows.astype(np.int64) * size + cols
+    positions = np.searchsorted(keys, wanted).clip(max=len(keys) - 1)
+    return np.where(keys[positions] == wanted, data[positions], 0)
+
+
+# 共起ネットワーク（nodes: 項目ごとの日数と平均評価、edges: 組み合わせごとの日数・lift・PMI・平均評価）
+#   df: 分析用 DataFrame（date・activities・rating）、term_matrix: terms.TermMatrix
+@trace.traced("cooccurrence:build")
+def build_network(df, term_matrix, min_days=MIN_DAYS, min_count=MIN_COUNT):
+    activities, activity_matrix = activity_presence(df)
+    keywords, keyword_matrix = term_matrix.presence(df["date"], min_days)
+    items = activities + keywords
+    kinds = np.array([ACTIVITY] * len(activities) + [KEYWORD] * len(keywords), dtype=object)
+    x = sparse.hstack([activity_matrix, keyword_matrix], format="csr").astype(np.float64)
+
+    ratings = rating_values(df["rating"]).to_numpy(dtype=float)
+    rated = (~np.isnan(ratings)).astype(float)
+    ratings = np.nan_to_num(ratings)
+    days = np.asarray(x.sum(axis=0)).ravel()
+    rated_days = x.T @ rated
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averages = np.where(rated_days > 0, (x.T @ ratings) / rated_days, np.nan)
+    nodes = pd.DataFrame({"item": items, "kind": kinds, "days": days.astype(int), "average": averages})
+
+    # 同じ日に出てきた日数（上三角だけを使う）
+    counts = sparse.triu(x.T @ x, k=1).tocoo()
+    keep = counts.data >= min_count
+    rows, cols, together = counts.row[keep], counts.col[keep], counts.data[keep]
+    # 評価のある日の日数と評価の合計（同じ組み合わせの位置だけ取り出す。評価のない日がなければ日数は共起の日数と同じ）
+    rated_together = together if rated.all() else _values_at(x.multiply(rated[:, None]).T @ x, rows, cols)
+    rating_sums = _values_at(x.multiply(ratings[:, None]).T @ x, rows, cols)
+
+    total = max(len(df), 1)
+    lift = together * total / (days[rows] * days[cols])
+    overall = ratings[rated > 0].mean() if rated.any() else np.nan
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pair_averages = np.where(rated_together > 0, rating_sums / rated_together, np.nan)
+    edges = pd.DataFrame({
+        "source": [items[i] for i in rows],
+        "target": [items[j] for j in cols],
+        "source_kind": kinds[rows],
+        "target_kind": kinds[cols],
+        "count": together.astype(int),
+        "lift": lift,
+        "pmi": np.log2(lift),
+        "average": pair_averages,
+        "delta": pair_averages - overall,
+    })
+    return {"nodes": nodes, "edges": edges.sort_values("lift", ascending=False, kind="stable").reset_index(drop=True), "days": len(df)}
+
+
+# 表示する組み合わせ（weight の大きい順に limit 個。pair: PAIR_KINDS の値）
+def top_edges(network, weight="lift", min_count=MIN_COUNT, limit=40, pair=None):
+    edges = network["edges"]
+    edges = edges[edges["count"] >= min_count]
+    if pair is not None:
+        first, second = pair
+        forward = (edges["source_kind"] == first) & (edges["target_kind"] == second)
+        backward = (edges["source_kind"] == second) & (edges["target_kind"] == first)
+        edges = edges[forward | backward]
+    return edges.sort_values(weight, ascending=False, kind="stable").head(limit).reset_index(drop=True)
+
+
+# ネットワークの配置（力学モデル。つながりの強い項目ほど近くに置く）。戻り値は 項目 → (x, y)
+def layout(items, edges, weight="lift", iterations=100, seed=0):
+    items = list(items)
+    n = len(items)
+    if n == 0:
+        return {}
+    index = {item: i for i, item in enumerate(items)}
+    positions = np.random.default_rng(seed).uniform(-1, 1, (n, 2))
+    if n == 1:
+        return {items[0]: (0.0, 0.0)}
+    sources = np.array([index[s] for s in edges["source"]], dtype=int)
+    targets = np.array([index[t] for t in edges["target"]], dtype=int)
+    strengths = edges[weight].to_numpy(dtype=float)
+    strengths = strengths - strengths.min() + 1 if len(strengths) else strengths
+    strengths = strengths / strengths.max() if len(strengths) else strengths
+
+    k = np.sqrt(4.0 / n)
+    temperature = 0.1
+    for _ in range(iterations):
+        delta = positions[:, None, :] - positions[None, :, :]
+        distance = np.maximum(np.linalg.norm(delta, axis=2), 0.01)
+        # すべての項目どうしは離れ、つながっている項目どうしは引き合う
+        displacement = (delta * (k * k / distance ** 2)[:, :, None]).sum(axis=1)
+        pull = positions[sources] - positions[targets]
+        pull_distance = np.maximum(np.linalg.norm(pull, axis=1), 0.01)
+        force = pull * (pull_distance * strengths / k)[:, None]
+        np.add.at(displacement, sources, -force)
+        np.add.at(displacement, targets, force)
+        length = np.maximum(np.linalg.norm(displacement, axis=1), 0.01)
+        positions += displacement / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature *= 0.97
+    positions -= positions.mean(axis=0)
+    positions /= max(np.abs(positions).max(), 1e-9)
+    return {item: (float(x), float(y)) for item, (x, y) in zip(items, positions)}
@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+import time
+
+# 書きかけの日記の下書き（日付ごとに1つ）
+#   入力のたびに呼ばれる save はメモリに置くだけで、最後の入力から debounce 秒たったらファイルに書く
+#   アプリが落ちても、次に同じ日付を開いたときにファイルから復元できる
+#
+# draft_dir の中身
+#   <日付>.json : {"date", "entry"（make_entry と同じ形）, "updated_at"}
+
+DEFAULT_DEBOUNCE = 2.0
+
+
+class DraftStore:
+    def __init__(self, draft_dir, debounce=DEFAULT_DEBOUNCE):
+        self.draft_dir = draft_dir
+        self.debounce = debounce
+        self.writes = 0
+        os.makedirs(draft_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timers = {}
+
+    def _path(self, date):
+        return os.path.join(self.draft_dir, f"{date}.json")
+
+    # 日付の下書き（なければ None）
+    def get(self, date):
+        with self._lock:
+            if date in self._pending:
+                return self._pending[date]
+        path = self._path(date)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    # 下書きを更新する（ファイルへの書き込みは、続けて更新されなくなってから debounce 秒後）
+    def save(self, date, entry, now=None):
+        draft = {"date": date, "entry": entry, "updated_at": now or time.time()}
+        with self._lock:
+            self._pending[date] = draft
+            timer = self._timers.pop(date, None)
+            if timer is not None:
+                timer.cancel()
+            timer = self._timers[date] = threading.Timer(self.debounce, self.flush, args=(date,))
+            timer.daemon = True
+            timer.start()
+        return draft
+
+    # まだ書いていない下書きをファイルに書く（date を省略するとすべて）
+    def flush(self, date=None):
+        with self._lock:
+            dates = [date] if date is not None else list(self._pending)
+            for d in dates:
+                timer = self._timers.pop(d, None)
+                if timer is not None and timer is not threading.current_thread():
+                    timer.cancel()
+                draft = self._pending.pop(d, None)
+                if draft is None:
+                    continue
+                path = self._path(d)
+                with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(draft, f, ensure_ascii=False)
+                os.replace(f"{path}.tmp", path)
+                self.writes += 1
+
+    # 下書きを捨てる（保存したとき・元に戻したとき）
+    def discard(self, date):
+        with self._lock:
+            timer = self._timers.pop(date, None)
+            if timer is not None:
+                timer.cancel()
+            self._pending.pop(date, None)
+            if os.path.exists(self._path(date)):
+                os.remove(self._path(date))
+
+    # 下書きのある日付
+    def dates(self):
+        with self._lock:
+            dates = set(self._pending)
+        dates.update(name[:-5] for name in os.listdir(self.draft_dir) if name.endswith(".json"))
+        return sorted(dates)
@@ -0,0 +1,161 @@
+import argparse
+import codecs
+import csv
+import io
+import json
+import math
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from diary_core.storage import LocalStorage, storage_from_env
+
+# エクスポートするカラムの順番
+EXPORT_COLUMNS = ["date", "content", "weather", "health", "rating", "activities", "mood", "memo", "sleep_hours"]
+
+# 1度に書き出す件数
+EXPORT_CHUNK_SIZE = 1000
+
+# 形式ごとの (表示名, MIME タイプ, 拡張子)
+EXPORT_FORMATS = {
+    "csv": ("CSV", "text/csv", "csv"),
+    "jsonl": ("JSONL（1行1日記）", "application/x-ndjson", "jsonl"),
+    "json": ("JSON（バックアップ形式）", "application/json", "json"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet", "parquet"),
+}
+
+PARQUET_SCHEMA = pa.schema([
+    ("date", pa.string()),
+    ("content", pa.string()),
+    ("weather", pa.string()),
+    ("health", pa.string()),
+    ("rating", pa.int64()),
+    ("activities", pa.list_(pa.string())),
+    ("mood", pa.string()),
+    ("memo", pa.string()),
+    ("sleep_hours", pa.float64()),
+])
+
+
+# 期間（"YYYY-MM-DD" の文字列、両端を含む）と日付の集合で日記を絞り込む
+def select_entries(diary, start=None, end=None, dates=None):
+    for entry in diary:
+        date = entry.get("date", "")
+        if start and date < start:
+            continue
+        if end and date > end:
+            continue
+        if dates is not None and date not in dates:
+            continue
+        yield entry
+
+
+def _chunks(entries, size):
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# CSV の1セル分の値（未記入は空欄、活動は "['運動した', ...]" 形式）
+def _csv_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, list):
+        return str(value)
+    return value
+
+
+# CSV を少しずつ作る（日本語のためにUTF-8 with BOMを使用）
+def iter_csv(entries, chunk_size=EXPORT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    yield codecs.BOM_UTF8 + buffer.getvalue().encode("utf-8")
+    for chunk in _chunks(entries, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([[_csv_value(entry.get(column)) for column in EXPORT_COLUMNS] for entry in chunk])
+        yield buffer.getvalue().encode("utf-8")
+
+
+# JSONL を少しずつ作る
+def iter_jsonl(entries, chunk_size=EXPORT_CHUNK_SIZE):
+    for chunk in _chunks(entries, chunk_size):
+        yield "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in chunk).encode("utf-8")
+
+
+# バックアップ用の JSON 配列を少しずつ作る
+def iter_json(entries, chunk_size=EXPORT_CHUNK_SIZE):
+    yield b"["
+    first = True
+    for chunk in _chunks(entries, chunk_size):
+        parts = []
+        for entry in chunk:
+            parts.append(("\n" if first else ",\n") + json.dumps(entry, ensure_ascii=False, indent=4))
+            first = False
+        yield "".join(parts).encode("utf-8")
+    yield b"\n]\n"
+
+
+# Parquet を行グループごとに書き出す
+def write_parquet(entries, fileobj, chunk_size=EXPORT_CHUNK_SIZE):
+    with pq.ParquetWriter(fileobj, PARQUET_SCHEMA, compression="zstd") as writer:
+        for chunk in _chunks(entries, chunk_size):
+            columns = {column: [entry.get(column) for entry in chunk] for column in EXPORT_COLUMNS}
+            columns["activities"] = [acts if isinstance(acts, list) else [] for acts in columns["activities"]]
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=PARQUET_SCHEMA))
+
+
+# 指定した形式でファイルに書き出す
+def write_export(entries, fmt, fileobj, chunk_size=EXPORT_CHUNK_SIZE):
+    if fmt == "parquet":
+        write_parquet(entries, fileobj, chunk_size)
+        return
+    writers = {"csv": iter_csv, "jsonl": iter_jsonl, "json": iter_json}
+    if fmt not in writers:
+        raise ValueError(f"未対応の形式です: {fmt}")
+    for data in writers[fmt](entries, chunk_size):
+        fileobj.write(data)
+
+
+# 書き出した内容を BytesIO で返す（st.download_button に渡す用。途中の DataFrame や文字列全体は作らない）
+def export_buffer(entries, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    buffer = io.BytesIO()
+    write_export(entries, fmt, buffer, chunk_size)
+    buffer.seek(0)
+    return buffer
+
+
+# CSV形式でエクスポートする（日本語のためにUTF-8 with BOMを使用）
+def export_to_csv(diary_data):
+    return b"".join(iter_csv(diary_data))
+
+
+# 分析用の DataFrame を CSV にする（日付は文字列に戻す）
+def frame_to_csv(df):
+    export_data = df.copy()
+    export_data["date"] = export_data["date"].dt.strftime("%Y-%m-%d")
+    return export_data.to_csv(index=False).encode("utf-8-sig")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日記を CSV・JSONL・JSON・Parquet で書き出します")
+    parser.add_argument("--input", help="日記の JSON ファイル（省略時は DIARY_STORAGE などの環境変数の設定から読み込む）")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv", help="出力形式")
+    parser.add_argument("--out", required=True, help="出力先のファイル")
+    parser.add_argument("--start", help="開始日（YYYY-MM-DD）")
+    parser.add_argument("--end", help="終了日（YYYY-MM-DD）")
+    args = parser.parse_args()
+
+    storage = LocalStorage(args.input) if args.input else storage_from_env()
+    with open(args.out, "wb") as f:
+        write_export(select_entries(storage.load(), args.start, args.end), args.format, f)
+
+
+if __name__ == "__main__":
+    main()
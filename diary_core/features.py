@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+from datetime import date as Date
+
+import pandas as pd
+
+from diary_core import codec, text, trace
+from diary_core.frame import WEEKDAY_JP, WEEKDAY_ORDER
+from diary_core.storage import content_version
+
+# 日記1日分から作る特徴量（曜日・ISO 週・形態素解析の単語・本文の長さ・感情キーワードの数）
+#   日記を書いたとき（保存後の事前計算）に内容が変わった日記の分だけ計算し、日付と内容のハッシュをつけてファイルに残す
+#   FEATURE_VERSION を上げると、すべての日記の分を計算し直す
+# 前の日記からの日数・連続記録がつながっているかは前後の日記で決まるので、frame() で日付順に並べて毎回求める
+
+FEATURE_VERSION = 1
+FEATURE_FILE = "features.jsonl.zst"
+# frame() の列（感情キーワードの数・前の日記からの日数・連続記録の列はこの後ろに付ける）
+FRAME_COLUMNS = ["date", "hash", "weekday", "weekday_jp", "iso_year", "iso_week", "content_length", "tokens"]
+
+
+# 日記1日分の内容のハッシュ（キーの順番をそろえる）
+def entry_hash(entry):
+    return content_version(json.dumps(entry, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+
+def emotion_column(emotion):
+    return f"emotion_{emotion}"
+
+
+# 日記ごとの特徴量（形態素解析はまとめて行う）
+def compute_entry_features(entries, hashes):
+    token_lists = text.tokenize_contents([entry.get("content") or "" for entry in entries])
+    records = []
+    for entry, tokens in zip(entries, token_lists):
+        day = Date.fromisoformat(entry["date"])
+        weekday = WEEKDAY_ORDER[day.weekday()]
+        token_set = set(tokens)
+        records.append({
+            "date": entry["date"],
+            "hash": hashes[entry["date"]],
+            "version": FEATURE_VERSION,
+            "weekday": weekday,
+            "weekday_jp": WEEKDAY_JP[weekday],
+            "iso_year": day.isocalendar()[0],
+            "iso_week": day.isocalendar()[1],
+            "content_length": len(entry.get("content") or ""),
+            "tokens": tokens,
+            "emotions": {emotion: len(token_set.intersection(words)) for emotion, words in text.EMOTION_KEYWORDS.items()},
+        })
+    return records
+
+
+# 日記ごとの特徴量の置き場所（path を省略するとメモリにだけ持つ）
+class FeatureStore:
+    def __init__(self, path=None):
+        self.path = path
+        self.recomputed = 0
+        self._lock = threading.Lock()
+        self._records = None
+
+    def _load(self):
+        if self._records is not None:
+            return
+        self._records = {}
+        if self.path and os.path.exists(self.path):
+            for record in codec.iter_file(self.path):
+                if record.get("version") == FEATURE_VERSION:
+                    self._records[record["date"]] = record
+
+    def _write(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        records = [self._records[d] for d in sorted(self._records)]
+        with open(f"{self.path}.tmp", "wb") as f:
+            f.write(codec.encode(records, codec.codec_for_path(self.path)))
+        os.replace(f"{self.path}.tmp", self.path)
+
+    # 内容が変わった日記・新しい日記の分だけ計算し直す（削除された日記の分は消す）。戻り値は計算した件数
+    @trace.traced("features:refresh")
+    def refresh(self, diary):
+        with self._lock:
+            self._load()
+            hashes = {entry["date"]: entry_hash(entry) for entry in diary}
+            stale = [entry for entry in diary if self._records.get(entry["date"], {}).get("hash") != hashes[entry["date"]]]
+            removed = [d for d in self._records if d not in hashes]
+            for d in removed:
+                del self._records[d]
+            for record in compute_entry_features(stale, hashes):
+                self._records[record["date"]] = record
+            if (stale or removed) and self.path:
+                self._write()
+            self.recomputed += len(stale)
+            return len(stale)
+
+    # 日付順の特徴量の DataFrame（内容のハッシュ・前の日記からの日数・連続記録がつながっているかを含む）
+    def frame(self, diary):
+        self.refresh(diary)
+        with self._lock:
+            records = [self._records[d] for d in sorted(self._records)]
+        # 日記がないときも同じ列の空の DataFrame にする（後の処理が hash・tokens などの列を使う）
+        df = pd.DataFrame([{k: v for k, v in r.items() if k not in ("version", "emotions")} for r in records], columns=FRAME_COLUMNS)
+        df = df.astype({"iso_year": "int64", "iso_week": "int64", "content_length": "int64"})
+        for emotion in text.EMOTION_KEYWORDS:
+            df[emotion_column(emotion)] = pd.Series([r["emotions"][emotion] for r in records], dtype="int64")
+        df["date"] = pd.to_datetime(df["date"])
+        df["days_since_prev"] = df["date"].diff().dt.days
+        df["extends_streak"] = df["days_since_prev"] == 1
+        return df
+
+    # 日付（"YYYY-MM-DD" または日時）の並びに合わせた単語リスト
+    def token_lists(self, diary, dates):
+        self.refresh(diary)
+        with self._lock:
+            return [self._records[d]["tokens"] for d in pd.to_datetime(pd.Series(dates)).dt.strftime("%Y-%m-%d")]
+
+
+# 現在の連続記録・最長連続記録・記録率（analytics.streaks と同じ結果を特徴量から求める）
+def streaks(features):
+    if features.empty:
+        return {"current": 0, "longest": 0, "completion_rate": 0}
+    runs = (~features["extends_streak"]).cumsum()
+    total_days = (features["date"].iloc[-1] - features["date"].iloc[0]).days + 1
+    return {
+        "current": int((runs == runs.iloc[-1]).sum()),
+        "longest": int(runs.value_counts().max()),
+        "completion_rate": int(len(features) / total_days * 100),
+    }
+
+
+# 感情キーワードを含む日の平均評価と日数（text.emotion_summary と同じ結果を特徴量から求める）
+def emotion_summary(features, df):
+    merged = df[["date", "rating"]].merge(features, on="date", how="left")
+    averages, counts = [], []
+    for emotion in text.EMOTION_KEYWORDS:
+        ratings = merged.loc[merged[emotion_column(emotion)] > 0, "rating"]
+        averages.append(ratings.astype(float).mean() if len(ratings) else 0)
+        counts.append(len(ratings))
+    return pd.DataFrame({"average": averages, "count": counts}, index=list(text.EMOTION_KEYWORDS))
@@ -0,0 +1,265 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.linear_model import SGDRegressor
+
+from diary_core import trace
+from diary_core.frame import rating_values
+from diary_core.vocab import ACTIVITY_OPTIONS, HEALTH_OPTIONS, WEATHER_OPTIONS
+
+# この先の日々の評価の予測（オンライン学習する線形回帰）
+#   その日の曜日・直近7日／30日の平均評価・前回の評価・前回の日記からの日数・前回の日記の睡眠時間／活動／天気／体調から、その日の評価を予測する
+#   1日ずつ「予測してから学習する（partial_fit）」ので、学習前の予測と実際の評価の差がそのまま検証の誤差になる
+#   数日先は、予測した評価を直近の評価に加えながら1日ずつ先へ進める（前回の日記の内容はそのまま使う）
+#   予測の幅は、検証で HORIZON 日先まで予測したときの、何日先かごとの誤差の分位点
+# 学習した状態はファイルに保存し、再起動後も続きから学習する（過去の日記が変わったときだけ最初から学習し直す）
+#   保存したときと scikit-learn・numpy のバージョンが違うファイルや、読めないファイルは使わずに最初から学習する
+
+FORECAST_VERSION = 1
+FORECAST_FILE = "forecast.pkl"
+HORIZON = 7
+# 予測を始めるのに必要な日記の数
+WARMUP = 14
+# 予測の幅（誤差の分位点）と、それを求めるのに使う直近の誤差の数
+BAND_QUANTILES = (0.1, 0.9)
+MAX_ERRORS = 500
+# 検証の誤差を記録しない古い日記は、この件数ずつまとめて学習する
+BATCH_SIZE = 256
+
+
+# カレンダーの日付に並べた日記（記録のない日・評価が未入力の日は rating が NaN）
+def daily_inputs(df):
+    dates = pd.to_datetime(df["date"]).dt.normalize()
+    index = pd.date_range(dates.min(), dates.max(), freq="D")
+    data = df.assign(date=dates).drop_duplicates("date", keep="last").set_index("date").reindex(index)
+    data = data.reindex(columns=["rating", "sleep_hours", "activities", "weather", "health"])
+    # 評価が未入力の日は、予測にも学習にも使わない
+    data["rating"] = rating_values(data["rating"])
+    return data
+
+
+# 日記のうち予測に使う項目
+def _entry(row):
+    activities = row.activities if isinstance(row.activities, (list, tuple, np.ndarray)) else []
+    return {"sleep_hours": row.sleep_hours, "activities": list(activities), "weather": row.weather, "health": row.health}
+
+
+# end の日までの入力の要約（過去の日記が変わったかどうかを調べる）
+def _prefix_digest(daily, end):
+    part = daily.loc[:end]
+    values = part[["rating", "sleep_hours", "weather", "health"]].astype(str)
+    values["activities"] = part["activities"].map(lambda a: ",".join(a) if isinstance(a, (list, tuple, np.ndarray)) else "")
+    return hashlib.sha1(pd.util.hash_pandas_object(values).to_numpy().tobytes()).hexdigest()
+
+
+# 予測の状態（直近の評価・前回の日記）と特徴量
+class _History:
+    def __init__(self):
+        # 直近30日分の (日付, 評価)
+        self.recent = deque()
+        self.last_entry = None
+        self.last_date = None
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, date, rating, entry=None):
+        self.recent.append((date, rating))
+        while self.recent and (date - self.recent[0][0]).days >= 30:
+            self.recent.popleft()
+        self.total += rating
+        self.count += 1
+        if entry is not None:
+            self.last_entry = entry
+        self.last_date = date
+
+    def mean(self, date, days):
+        values = [r for d, r in self.recent if (date - d).days <= days]
+        return np.mean(values) if values else self.total / max(self.count, 1)
+
+    # date の評価を予測するための特徴量（値はおおよそ 0〜1 にそろえる）
+    def features(self, date):
+        entry = self.last_entry
+        weekday = np.zeros(7)
+        weekday[date.weekday()] = 1
+        sleep = entry["sleep_hours"] if entry is not None and not pd.isna(entry["sleep_hours"]) else 7.0
+        activities = entry["activities"] if entry is not None else []
+        last_rating = self.recent[-1][1] if self.recent else self.mean(date, 30)
+        gap = (date - self.last_date).days if self.last_date is not None else 7
+        return np.concatenate([
+            weekday,
+            [self.mean(date, 7) / 5, self.mean(date, 30) / 5, last_rating / 5, min(gap, 7) / 7, sleep / 10],
+            [float(a in activities) for a in ACTIVITY_OPTIONS],
+            [float(entry is not None and entry["weather"] == w) for w in WEATHER_OPTIONS],
+            [float(entry is not None and entry["health"] == h) for h in HEALTH_OPTIONS],
+        ])
+
+    def copy(self):
+        history = _History()
+        history.recent = deque(self.recent)
+        history.last_entry = self.last_entry
+        history.last_date = self.last_date
+        history.total = self.total
+        history.count = self.count
+        return history
+
+
+# 学習した状態のファイルを読み直せるライブラリのバージョン
+def _library_versions():
+    return {"sklearn": sklearn.__version__, "numpy": np.__version__}
+
+
+def _new_model():
+    return SGDRegressor(loss="squared_error", penalty="l2", alpha=1e-4, learning_rate="invscaling", eta0=0.02, random_state=0)
+
+
+# 評価の予測モデル（path を渡すと学習した状態をファイルに保存し、次回はそこから続ける）
+class Forecaster:
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    state = pickle.load(f)
+                if state.get("version") == FORECAST_VERSION and state.get("libraries") == _library_versions():
+                    self.__dict__.update(state["data"])
+            except Exception:
+                # 途中で切れたファイルや、別のバージョンのライブラリで保存したファイルは、
+                # ValueError・ImportError・TypeError など何が起きるかわからないので、どれでも最初から学習し直す
+                self._reset()
+
+    def _reset(self):
+        self.model = _new_model()
+        self.history = _History()
+        self.trained_until = None
+        self.prefix = None
+        self.fitted = 0
+        self.errors = deque(maxlen=MAX_ERRORS)
+        # 検証のために出した数日先までの予測（日付 → [(何日先か, 予測)]）
+        self.pending = {}
+        self.horizon_errors = {h: deque(maxlen=MAX_ERRORS) for h in range(1, HORIZON + 1)}
+        self.baseline_errors = deque(maxlen=MAX_ERRORS)
+
+    def _save(self):
+        if not self.path:
+            return
+        data = {k: v for k, v in self.__dict__.items() if k not in ("path", "_lock")}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.tmp", "wb") as f:
+            pickle.dump({"version": FORECAST_VERSION, "libraries": _library_versions(), "data": data}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    # 学習済みの日までの入力が変わっていないか（変わっていれば最初から学習し直す）
+    def _prefix_matches(self, daily):
+        if self.trained_until is None:
+            return True
+        return self.trained_until in daily.index and _prefix_digest(daily, self.trained_until) == self.prefix
+
+    def _predict(self, features):
+        return float(self.model.predict(features[None, :])[0]) if self.fitted else np.nan
+
+    # 学習した日より後の日記で、予測してから学習する。戻り値は学習した日数
+    @trace.traced("forecast:update")
+    def update(self, df):
+        with self._lock:
+            if df.empty:
+                return 0
+            daily = daily_inputs(df)
+            if not self._prefix_matches(daily):
+                self._reset()
+            new_rows = daily if self.trained_until is None else daily.loc[self.trained_until + pd.Timedelta(days=1):]
+
+            rows = [row for row in new_rows.itertuples() if not pd.isna(row.rating)]
+            # 検証の誤差は直近 MAX_ERRORS 件分しか残さないので、それより前の日記は予測せずにまとめて学習する
+            bulk = max(0, len(rows) - MAX_ERRORS - HORIZON)
+            features, ratings = [], []
+            for row in rows[:bulk]:
+                features.append(self.history.features(row.Index))
+                ratings.append(row.rating)
+                self.history.add(row.Index, row.rating, _entry(row))
+            for start in range(0, bulk, BATCH_SIZE):
+                self.model.partial_fit(np.array(features[start:start + BATCH_SIZE]), ratings[start:start + BATCH_SIZE])
+            self.fitted += bulk
+
+            trained = bulk
+            for row in rows[bulk:]:
+                date = row.Index
+                features = self.history.features(date)
+                if self.fitted >= WARMUP:
+                    self._record_errors(date, row.rating, features)
+                self.model.partial_fit(features[None, :], [row.rating])
+                self.fitted += 1
+                self.history.add(date, row.rating, _entry(row))
+                trained += 1
+                # 検証用に、この日から HORIZON 日先までの予測を出しておく
+                if self.fitted >= WARMUP and self.fitted % HORIZON == 0:
+                    for h, (day, prediction) in enumerate(self._roll_forward(date), start=1):
+                        self.pending.setdefault(day, []).append((h, prediction))
+            self.trained_until = daily.index[-1]
+            self.prefix = _prefix_digest(daily, self.trained_until)
+            if trained:
+                self._save()
+            return trained
+
+    # 学習前の予測と実際の評価の差を記録する（1日先の予測・数日先の予測・直近30日の平均を予測にした場合）
+    def _record_errors(self, date, rating, features):
+        self.errors.append(rating - self._predict(features))
+        self.baseline_errors.append(rating - self.history.mean(date, 30))
+        for h, prediction in self.pending.pop(date, []):
+            self.horizon_errors[h].append(rating - prediction)
+        # 実際の評価が入らなかった日の予測は捨てる
+        for day in [d for d in self.pending if d < date]:
+            del self.pending[day]
+
+    # start の翌日から HORIZON 日先まで、予測した評価を直近の評価に加えながら進める
+    def _roll_forward(self, start, horizon=HORIZON):
+        history = self.history.copy()
+        predictions = []
+        for h in range(1, horizon + 1):
+            day = start + pd.Timedelta(days=h)
+            prediction = float(np.clip(self._predict(history.features(day)), 1, 5))
+            predictions.append((day, prediction))
+            history.add(day, prediction)
+        return predictions
+
+    # 最後の日記の翌日から horizon 日先までの予測と予測の幅
+    def forecast(self, horizon=HORIZON):
+        with self._lock:
+            if self.fitted < WARMUP or self.history.last_date is None:
+                return pd.DataFrame(columns=["date", "prediction", "low", "high"])
+            rows = []
+            for h, (day, prediction) in enumerate(self._roll_forward(self.history.last_date, horizon), start=1):
+                errors = self.horizon_errors.get(h) or self.errors
+                low, high = np.quantile(errors, BAND_QUANTILES) if len(errors) >= 10 else (-1.0, 1.0)
+                rows.append({"date": day, "prediction": prediction, "low": max(1.0, prediction + low), "high": min(5.0, prediction + high)})
+            return pd.DataFrame(rows)
+
+    # 検証の誤差（1日先の MAE・RMSE、直近30日の平均を予測にした場合の MAE、何日先かごとの MAE）
+    def metrics(self):
+        with self._lock:
+            errors = np.array(self.errors, dtype=float)
+            baseline = np.array(self.baseline_errors, dtype=float)
+            return {
+                "n": len(errors),
+                "trained": self.fitted,
+                "mae": float(np.abs(errors).mean()) if len(errors) else np.nan,
+                "rmse": float(np.sqrt((errors ** 2).mean())) if len(errors) else np.nan,
+                "baseline_mae": float(np.abs(baseline).mean()) if len(baseline) else np.nan,
+                "by_horizon": pd.DataFrame([
+                    {"horizon": h, "n": len(e), "mae": float(np.abs(e).mean()) if e else np.nan}
+                    for h, e in self.horizon_errors.items()
+                ]),
+            }
+
+
+# 増えた日記で学習してから、予測と検証の誤差をまとめて返す
+def summary(forecaster, df, horizon=HORIZON):
+    forecaster.update(df)
+    return {"forecast": forecaster.forecast(horizon), "metrics": forecaster.metrics()}
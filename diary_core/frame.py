@@ -0,0 +1,63 @@
+import pandas as pd
+
+from diary_core import trace
+from diary_core.vocab import NO_MOOD
+
+# 曜日（英語名と日本語名）
+WEEKDAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+WEEKDAY_JP = {
+    "Monday": "月曜日", "Tuesday": "火曜日", "Wednesday": "水曜日",
+    "Thursday": "木曜日", "Friday": "金曜日", "Saturday": "土曜日", "Sunday": "日曜日"
+}
+WEEKDAY_ORDER_JP = [WEEKDAY_JP[day] for day in WEEKDAY_ORDER]
+
+# 評価の最小値（フォームの評価は1〜5で、0・空は未入力）
+MIN_RATING = 1
+
+# 分析で使うカラムと、古い日記にない場合の値
+FRAME_DEFAULTS = {
+    "content": "",
+    "weather": "",
+    "health": "",
+    "rating": 0,
+    "mood": NO_MOOD,
+    "memo": "",
+    "sleep_hours": float("nan"),
+}
+
+
+# 日記リストを分析用の DataFrame に変換する（日付順・曜日付き）
+@trace.traced("frame:build")
+def to_frame(diary):
+    df = pd.DataFrame(diary)
+    if df.empty:
+        return pd.DataFrame(columns=["date", "activities", "weekday", "weekday_jp"] + list(FRAME_DEFAULTS))
+
+    for column, default in FRAME_DEFAULTS.items():
+        if column not in df.columns:
+            df[column] = default
+        else:
+            df[column] = df[column].fillna(default)
+
+    if "activities" not in df.columns:
+        df["activities"] = [[] for _ in range(len(df))]
+    else:
+        df["activities"] = [acts if isinstance(acts, list) else [] for acts in df["activities"]]
+
+    df["date"] = pd.to_datetime(df["date"])
+    df = df.sort_values("date").reset_index(drop=True)
+    df["weekday"] = df["date"].dt.day_name()
+    df["weekday_jp"] = df["weekday"].map(WEEKDAY_JP)
+    return df
+
+
+# 評価の列を数値にして、未入力（0・空・数値でない値）を NaN にする
+#   予測・ラグ相関・共起ネットワーク・移動統計と外れ値の検出は、どれもこれで未入力の日を除く
+def rating_values(ratings):
+    ratings = pd.to_numeric(ratings, errors="coerce")
+    return ratings.where(ratings >= MIN_RATING)
+
+
+# 日付文字列から日記を引く索引を作る
+def build_date_index(diary):
+    return {entry["date"]: entry for entry in diary}
@@ -0,0 +1,234 @@
+import ast
+import codecs
+import csv
+import io
+import json
+import os
+
+from diary_core import trace
+from diary_core.export import EXPORT_COLUMNS
+from diary_core.model import Entry
+
+# バックアップからの一括取り込み
+#   JSON 配列・JSONL・CSV（export_to_csv の出力を含む）を1件ずつ読み、検証・補完してから日付ごとに取り込む
+#   ファイル全体を文字列やリストにせず、CHUNK_SIZE 件ずつ処理する
+
+FORMATS = ("json", "jsonl", "csv")
+READ_SIZE = 64 * 1024
+# JSON の数値に使う文字
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+CHUNK_SIZE = 500
+# エラーの詳細を残す件数（それ以上は件数だけ数える）
+MAX_ERRORS = 100
+
+MERGE = "merge"
+REPLACE = "replace"
+
+
+# ファイル名と先頭のバイト列から形式を判定する
+def detect_format(filename, head=b""):
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if ext in ("json", "jsonl", "csv"):
+        if ext == "json" and head.lstrip(codecs.BOM_UTF8).lstrip()[:1] == b"{":
+            return "jsonl"
+        return ext
+    if ext == "ndjson":
+        return "jsonl"
+    start = head.lstrip(codecs.BOM_UTF8).lstrip()[:1]
+    if start == b"[":
+        return "json"
+    if start == b"{":
+        return "jsonl"
+    return "csv"
+
+
+# バイナリのストリームを UTF-8（BOM があれば除く）の文字列ストリームにする
+def _text_stream(stream):
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+# JSON 配列の要素を1つずつ読む（配列全体は読み込まない）
+def iter_json_array(text_stream, read_size=READ_SIZE):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    # 空白以外の文字が来るまで読み進める
+    def fill():
+        nonlocal buffer, pos, eof
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            chunk = text_stream.read(read_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+    fill()
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError("JSON の配列ではありません")
+    pos += 1
+    fill()
+    if buffer[pos:pos + 1] == "]":
+        return
+
+    while True:
+        # 1要素分が読み込まれるまでバッファを伸ばす
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # 数値はバッファの終わりで途切れていても（"12" や "-0." の "-0" まで）読めてしまうので、
+                #   数値に使う文字以外が続くまで読んでから確定する
+                if eof or (end < len(buffer) and buffer[end] not in NUMBER_CHARS):
+                    break
+                raise json.JSONDecodeError("続きがあります", buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = text_stream.read(read_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+        yield value
+        pos = end
+        fill()
+        separator = buffer[pos:pos + 1]
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"JSON の配列の区切りが正しくありません: {separator!r}")
+        fill()
+        # 読み終わった部分を捨てる（毎回コピーしないように、ある程度たまってから）
+        if pos > read_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+# JSONL を1行ずつ読む
+def iter_jsonl(text_stream):
+    for line in text_stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+# CSV の1行を日記の辞書にする（空欄は未記入、活動は "['運動した', ...]" 形式のリスト）
+def _csv_record(row):
+    record = {column: row[column] for column in EXPORT_COLUMNS if row.get(column) not in (None, "")}
+    activities = record.get("activities")
+    if activities is not None:
+        try:
+            record["activities"] = ast.literal_eval(activities)
+        except (ValueError, SyntaxError):
+            record["activities"] = [a.strip() for a in activities.split(",") if a.strip()]
+    return record
+
+
+def iter_csv(text_stream):
+    for row in csv.DictReader(text_stream):
+        yield _csv_record(row)
+
+
+# 形式に合わせてレコードを1件ずつ読む
+def iter_records(text_stream, fmt):
+    if fmt == "json":
+        return iter_json_array(text_stream)
+    if fmt == "jsonl":
+        return iter_jsonl(text_stream)
+    if fmt == "csv":
+        return iter_csv(text_stream)
+    raise ValueError(f"未対応の形式です: {fmt}")
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# 取り込みの結果（件数とエラー）
+def _summary(mode, fmt):
+    return {"mode": mode, "format": fmt, "read": 0, "added": 0, "updated": 0, "unchanged": 0, "removed": 0, "invalid": 0, "errors": []}
+
+
+# 比較用に既存の日記も補完する（読めないものはそのまま比べる）
+def normalized_entry(entry):
+    try:
+        return Entry.from_dict(entry).to_dict()
+    except ValueError:
+        return entry
+
+
+def _error(summary, number, message):
+    summary["invalid"] += 1
+    if len(summary["errors"]) < MAX_ERRORS:
+        summary["errors"].append(f"{number}件目: {message}")
+
+
+# 既存の日記にファイルの内容を取り込んだ結果を作る。戻り値は (新しい日記リスト, 集計)
+#   mode: "merge" は日付が同じものを上書きして残りは残す、"replace" はファイルの内容だけにする
+#   同じ日付が複数あるときは後のものを使う
+@trace.traced("import:apply")
+def apply_import(existing, stream, fmt, mode=MERGE, chunk_size=CHUNK_SIZE):
+    # 読み終わってもアップロードされたファイルを閉じないように、最後に切り離す
+    text_stream = _text_stream(stream)
+    try:
+        return apply_records(existing, iter_records(text_stream, fmt), mode, fmt, chunk_size)
+    finally:
+        text_stream.detach()
+
+
+# 既存の日記にレコード（日記の辞書）を取り込んだ結果を作る（apply_import と同じ。一括更新でも使う）
+def apply_records(existing, records, mode=MERGE, fmt=None, chunk_size=CHUNK_SIZE):
+    if mode not in (MERGE, REPLACE):
+        raise ValueError(f"未対応の取り込み方法です: {mode}")
+    summary = _summary(mode, fmt)
+    current = {d["date"]: d for d in existing}
+    result = {} if mode == REPLACE else dict(current)
+    seen = set()
+    _apply_chunks(_chunks(records, chunk_size), current, result, seen, summary)
+
+    if mode == REPLACE:
+        summary["removed"] = sum(1 for date in current if date not in seen)
+    return sorted(result.values(), key=lambda d: d["date"]), summary
+
+
+def _apply_chunks(chunks, current, result, seen, summary):
+    number = 0
+    for chunk in chunks:
+        for record in chunk:
+            number += 1
+            summary["read"] += 1
+            if not isinstance(record, dict):
+                _error(summary, number, "日記の形式ではありません")
+                continue
+            try:
+                entry = Entry.from_dict(record).to_dict()
+            except ValueError as e:
+                _error(summary, number, str(e))
+                continue
+
+            date = entry["date"]
+            if date not in seen:
+                seen.add(date)
+                old = current.get(date)
+                if old is None:
+                    summary["added"] += 1
+                elif normalized_entry(old) == entry:
+                    summary["unchanged"] += 1
+                else:
+                    summary["updated"] += 1
+            result[date] = entry
+
+
+# 取り込みで日記が変わるか
+def has_changes(summary):
+    return bool(summary["added"] or summary["updated"] or summary["removed"])
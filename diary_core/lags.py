@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+from diary_core import trace
+from diary_core.analytics import SLEEP_LABELS, sleep_bucket
+from diary_core.frame import rating_values
+
+# k 日前（k = 0..MAX_LAG）の睡眠時間・活動・天気・体調と、その日の評価の関係
+#   日記をカレンダーの日付に並べ（記録のない日は欠損）、k 日ずらした項目の行列と評価をまとめて行列演算で集計する
+#   0/1 の項目（活動・天気・体調・睡眠時間の区切り）: その項目があった日の k 日後の平均評価 − なかった日の k 日後の平均評価
+#     （Welch の方法による 95% 信頼区間と、効果量として Cohen の d）
+#   睡眠時間そのもの: 1時間長いと k 日後の評価がどれだけ変わるか（回帰の傾きと 95% 信頼区間。d の代わりに相関係数）
+
+MAX_LAG = 7
+Z_95 = 1.959964
+SLEEP = "睡眠時間"
+SLEEP_RANGE = "睡眠時間の区切り"
+ACTIVITY = "活動"
+WEATHER = "天気"
+HEALTH = "体調"
+GROUPS = (SLEEP, SLEEP_RANGE, ACTIVITY, WEATHER, HEALTH)
+# 効果を出すのに必要な日数（項目があった日・なかった日のそれぞれ）
+MIN_DAYS = 3
+
+
+# カレンダーの日付に並べた評価と、0/1 の項目の行列（記録のない日は NaN）
+#   戻り値: (日付, 評価, 睡眠時間, 項目の DataFrame, 項目 → グループ)
+def daily_indicators(df):
+    dates = pd.to_datetime(df["date"]).dt.normalize()
+    index = pd.date_range(dates.min(), dates.max(), freq="D")
+    # 同じ日付が複数あるときは最後の日記を使う
+    data = df.assign(date=dates).drop_duplicates("date", keep="last").set_index("date").reindex(index)
+    recorded = data["rating"].notna().to_numpy()
+
+    columns = {}
+    groups = {}
+    buckets = sleep_bucket(data["sleep_hours"])
+    for label in SLEEP_LABELS:
+        columns[label] = (buckets == label).astype(float)
+        groups[label] = SLEEP_RANGE
+    activities = data["activities"].map(lambda a: list(a) if isinstance(a, (list, tuple, np.ndarray)) else [])
+    for name in sorted({a for row in activities for a in row}):
+        columns[name] = activities.map(lambda row: name in row).astype(float)
+        groups[name] = ACTIVITY
+    for field, group in (("weather", WEATHER), ("health", HEALTH)):
+        values = data[field].where(data[field].map(lambda v: isinstance(v, str) and v != ""))
+        for value in sorted(values.dropna().unique()):
+            label = f"{group}: {value}"
+            columns[label] = (values == value).astype(float)
+            groups[label] = group
+
+    indicators = pd.DataFrame(columns, index=index)
+    indicators[~recorded] = np.nan
+    ratings = rating_values(data["rating"]).to_numpy(dtype=float)
+    sleep = pd.to_numeric(data["sleep_hours"], errors="coerce").to_numpy(dtype=float)
+    return index, ratings, sleep, indicators, groups
+
+
+# 0/1 の項目それぞれについて、項目があった日となかった日の評価の平均の差・信頼区間・効果量（列ごとにまとめて計算）
+def _binary_effects(x, y):
+    valid = ~np.isnan(x) & ~np.isnan(y)[:, None]
+    x = np.where(valid, x, 0.0)
+    absent = np.where(valid, 1.0 - x, 0.0)
+    y = np.nan_to_num(y)
+    n1, n0 = x.sum(axis=0), absent.sum(axis=0)
+    sum1, sum0 = y @ x, y @ absent
+    sq1, sq0 = (y * y) @ x, (y * y) @ absent
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean1, mean0 = sum1 / n1, sum0 / n0
+        var1 = (sq1 - n1 * mean1 ** 2) / (n1 - 1)
+        var0 = (sq0 - n0 * mean0 ** 2) / (n0 - 1)
+        var1, var0 = np.clip(var1, 0, None), np.clip(var0, 0, None)
+        effect = mean1 - mean0
+        se = np.sqrt(var1 / n1 + var0 / n0)
+        pooled = np.sqrt(((n1 - 1) * var1 + (n0 - 1) * var0) / (n1 + n0 - 2))
+        d = np.where(pooled > 0, effect / pooled, np.nan)
+    enough = (n1 >= MIN_DAYS) & (n0 >= MIN_DAYS)
+    return {
+        "n_with": n1.astype(int),
+        "n_without": n0.astype(int),
+        "mean_with": mean1,
+        "mean_without": mean0,
+        "effect": np.where(enough, effect, np.nan),
+        "ci_low": np.where(enough, effect - Z_95 * se, np.nan),
+        "ci_high": np.where(enough, effect + Z_95 * se, np.nan),
+        "d": np.where(enough, d, np.nan),
+    }
+
+
+# 睡眠時間が1時間長いときの評価の変化（回帰の傾き・信頼区間・相関係数）
+def _slope_effect(x, y):
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    n = len(x)
+    if n < MIN_DAYS + 1 or np.var(x) == 0 or np.var(y) == 0:
+        return {"n_with": n, "n_without": 0, "mean_with": np.nan, "mean_without": np.nan, "effect": np.nan, "ci_low": np.nan, "ci_high": np.nan, "d": np.nan}
+    r = np.corrcoef(x, y)[0, 1]
+    slope = r * np.std(y) / np.std(x)
+    se = np.sqrt(max(1 - r * r, 0) / (n - 2)) * np.std(y) / np.std(x)
+    return {
+        "n_with": n, "n_without": 0, "mean_with": np.nan, "mean_without": np.nan,
+        "effect": slope, "ci_low": slope - Z_95 * se, "ci_high": slope + Z_95 * se, "d": r,
+    }
+
+
+# k 日前（0..max_lag）の各項目とその日の評価の関係（1行が 1つの k と1つの項目）
+#   significant: 信頼区間が 0 をまたがない（効果がありそう）
+@trace.traced("lags:effects")
+def lag_effects(df, max_lag=MAX_LAG):
+    columns = ["lag", "feature", "group", "n_with", "n_without", "mean_with", "mean_without", "effect", "ci_low", "ci_high", "d", "significant"]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    _, ratings, sleep, indicators, groups = daily_indicators(df)
+    x = indicators.to_numpy(dtype=float)
+    features = list(indicators.columns)
+
+    frames = []
+    for lag in range(max_lag + 1):
+        if lag >= len(ratings):
+            break
+        # t 日の評価と t−lag 日の項目を並べる
+        y = ratings[lag:]
+        binary = _binary_effects(x[:len(x) - lag], y)
+        result = pd.DataFrame(binary)
+        result.insert(0, "group", [groups[f] for f in features])
+        result.insert(0, "feature", features)
+        slope = _slope_effect(sleep[:len(sleep) - lag], y)
+        result = pd.concat([pd.DataFrame([{"feature": SLEEP, "group": SLEEP, **slope}]), result], ignore_index=True)
+        result.insert(0, "lag", lag)
+        frames.append(result)
+    effects = pd.concat(frames, ignore_index=True)
+    effects["significant"] = (effects["ci_low"] > 0) | (effects["ci_high"] < 0)
+    return effects[columns]
+
+
+# その k で効果の大きい項目（効果の絶対値の大きい順。significant_only で信頼区間が 0 をまたがないものだけ）
+def strongest(effects, lag, top=10, significant_only=False):
+    selected = effects[(effects["lag"] == lag) & effects["effect"].notna() & (effects["group"] != SLEEP)]
+    if significant_only:
+        selected = selected[selected["significant"]]
+    order = selected["effect"].abs().sort_values(ascending=False, kind="stable").index
+    return selected.loc[order].head(top).reset_index(drop=True)
@@ -0,0 +1,252 @@
+import math
+import threading
+from datetime import date as Date
+
+import numpy as np
+import pandas as pd
+
+from diary_core.frame import WEEKDAY_JP
+from diary_core.vocab import ACTIVITY_OPTIONS, HEALTH_OPTIONS, MOOD_OPTIONS, WEATHER_OPTIONS
+
+# 日記1日分の型つきモデルと、配列でまとめて持つ日記コレクション
+# 天気・体調・気分・活動は選択肢の番号（小さな整数）で持ち、読み込み時に1度だけ検証・補完する
+
+# 未記入の項目の番号
+MISSING = -1
+RATING_RANGE = (0, 5)
+SLEEP_RANGE = (0.0, 24.0)
+
+
+# 選択肢と番号の対応（選択肢にない値は後ろに追加していく）
+class Vocabulary:
+    def __init__(self, values):
+        self._lock = threading.Lock()
+        self.values = list(values)
+        self._codes = {value: code for code, value in enumerate(self.values)}
+
+    def code(self, value):
+        if value is None or value == "":
+            return MISSING
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self.values)
+                    self.values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def value(self, code):
+        return "" if code == MISSING else self.values[code]
+
+    # 番号 → 値の配列（最後の要素は未記入の ""。codes をそのまま添字に使える）
+    def lookup(self):
+        return np.array(self.values + [""], dtype=object)
+
+
+WEATHER = Vocabulary(WEATHER_OPTIONS)
+HEALTH = Vocabulary(HEALTH_OPTIONS)
+MOOD = Vocabulary(MOOD_OPTIONS)
+ACTIVITY = Vocabulary(ACTIVITY_OPTIONS)
+
+
+# 日記1日分（保存形式の辞書とは from_dict / to_dict で変換する）
+class Entry:
+    __slots__ = ("date", "content", "weather", "health", "rating", "activities", "mood", "memo", "sleep_hours")
+
+    def __init__(self, date, content="", weather=MISSING, health=MISSING, rating=0, activities=(), mood=MISSING, memo="", sleep_hours=math.nan):
+        self.date = date
+        self.content = content
+        self.weather = weather
+        self.health = health
+        self.rating = rating
+        self.activities = activities
+        self.mood = mood
+        self.memo = memo
+        self.sleep_hours = sleep_hours
+
+    # 保存形式の辞書から作る（足りない項目は補完し、直せない値は ValueError）
+    @classmethod
+    def from_dict(cls, d):
+        date = d.get("date")
+        try:
+            Date.fromisoformat(date)
+        except (TypeError, ValueError):
+            raise ValueError(f"日付の形式が正しくありません: {date!r}")
+
+        rating = d.get("rating")
+        try:
+            value = 0 if rating is None else int(rating)
+        except (TypeError, ValueError):
+            raise ValueError(f"{date}: 評価が数値ではありません: {rating!r}")
+        # 3.7 などを切り捨てると保存し直したときに値が変わるので、整数でない評価は読み込まない
+        if isinstance(rating, float) and rating != value:
+            raise ValueError(f"{date}: 評価が整数ではありません: {rating!r}")
+        rating = value
+        if not RATING_RANGE[0] <= rating <= RATING_RANGE[1]:
+            raise ValueError(f"{date}: 評価は{RATING_RANGE[0]}〜{RATING_RANGE[1]}で入力してください: {rating}")
+
+        sleep_hours = d.get("sleep_hours")
+        try:
+            sleep_hours = math.nan if sleep_hours is None else float(sleep_hours)
+        except (TypeError, ValueError):
+            raise ValueError(f"{date}: 睡眠時間が数値ではありません: {sleep_hours!r}")
+        if not math.isnan(sleep_hours) and not SLEEP_RANGE[0] <= sleep_hours <= SLEEP_RANGE[1]:
+            raise ValueError(f"{date}: 睡眠時間が範囲外です: {sleep_hours}")
+
+        activities = d.get("activities")
+        return cls(
+            date,
+            content=str(d.get("content") or ""),
+            weather=WEATHER.code(d.get("weather")),
+            health=HEALTH.code(d.get("health")),
+            rating=rating,
+            activities=tuple(ACTIVITY.code(a) for a in activities) if isinstance(activities, list) else (),
+            mood=MOOD.code(d.get("mood")),
+            memo=str(d.get("memo") or ""),
+            sleep_hours=sleep_hours,
+        )
+
+    def to_dict(self):
+        return {
+            "date": self.date,
+            "content": self.content,
+            "weather": WEATHER.value(self.weather),
+            "health": HEALTH.value(self.health),
+            "rating": self.rating,
+            "activities": [ACTIVITY.value(code) for code in self.activities],
+            "mood": MOOD.value(self.mood),
+            "memo": self.memo,
+            "sleep_hours": None if math.isnan(self.sleep_hours) else self.sleep_hours,
+        }
+
+
+# 日記リストを検証して Entry のリストにする。戻り値は (Entry のリスト, その元の日記, 読み込めなかった元の日記, そのエラー)
+def partition(diary):
+    entries, originals, rejected, errors = [], [], [], []
+    for d in diary:
+        if not isinstance(d, dict):
+            rejected.append(d)
+            errors.append(f"日記の形式が正しくありません: {str(d)[:50]}")
+            continue
+        try:
+            entries.append(Entry.from_dict(d))
+        except ValueError as e:
+            rejected.append(d)
+            errors.append(str(e))
+            continue
+        originals.append(d)
+    return entries, originals, rejected, errors
+
+
+# 日記リストを検証して Entry のリストにする。戻り値は (Entry のリスト, 読み込めなかった日記のエラー)
+def normalize(diary):
+    entries, _, _, errors = partition(diary)
+    return entries, errors
+
+
+# 日記を項目ごとの配列で持つコレクション（文字列は元のオブジェクトを参照し、コピーしない）
+#   活動は可変長なので、全日記分の番号を1本の配列にして日記ごとの開始位置（offsets）で区切る
+class EntryCollection:
+    def __init__(self, entries):
+        n = len(entries)
+        self.dates = np.array([e.date for e in entries], dtype="datetime64[D]")
+        self.content = np.array([e.content for e in entries] or [], dtype=object)
+        self.memo = np.array([e.memo for e in entries] or [], dtype=object)
+        self.weather = np.fromiter((e.weather for e in entries), dtype=np.int16, count=n)
+        self.health = np.fromiter((e.health for e in entries), dtype=np.int16, count=n)
+        self.mood = np.fromiter((e.mood for e in entries), dtype=np.int16, count=n)
+        self.rating = np.fromiter((e.rating for e in entries), dtype=np.int8, count=n)
+        self.sleep_hours = np.fromiter((e.sleep_hours for e in entries), dtype=np.float64, count=n)
+        self.activity_offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum([len(e.activities) for e in entries], out=self.activity_offsets[1:])
+        self.activity_codes = np.fromiter(
+            (code for e in entries for code in e.activities), dtype=np.int16, count=int(self.activity_offsets[-1])
+        )
+        self.errors = []
+
+    # 保存形式の日記リストから作る（読み込めなかった日記は errors に残す）
+    @classmethod
+    def from_dicts(cls, diary):
+        entries, errors = normalize(diary)
+        collection = cls(entries)
+        collection.errors = errors
+        return collection
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, i):
+        start, end = self.activity_offsets[i], self.activity_offsets[i + 1]
+        return Entry(
+            str(self.dates[i]),
+            content=self.content[i],
+            weather=int(self.weather[i]),
+            health=int(self.health[i]),
+            rating=int(self.rating[i]),
+            activities=tuple(int(code) for code in self.activity_codes[start:end]),
+            mood=int(self.mood[i]),
+            memo=self.memo[i],
+            sleep_hours=float(self.sleep_hours[i]),
+        )
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def to_dicts(self):
+        return [entry.to_dict() for entry in self]
+
+    def date_strings(self):
+        return self.dates.astype(str)
+
+    # 日記ごとの活動名のリスト
+    def activity_lists(self):
+        names = ACTIVITY.lookup()[self.activity_codes]
+        offsets = self.activity_offsets
+        return [list(names[offsets[i]:offsets[i + 1]]) for i in range(len(self))]
+
+    # 項目ごとの NumPy 配列（天気・体調・気分は番号のまま）
+    def to_numpy(self):
+        return {
+            "date": self.dates,
+            "content": self.content,
+            "weather": self.weather,
+            "health": self.health,
+            "rating": self.rating,
+            "mood": self.mood,
+            "memo": self.memo,
+            "sleep_hours": self.sleep_hours,
+            "activity_offsets": self.activity_offsets,
+            "activity_codes": self.activity_codes,
+        }
+
+    # 分析用の DataFrame（frame.to_frame と同じ列・日付順）
+    #   categorical=True なら天気・体調・気分を Categorical で持つ（番号をそのまま使うので文字列を作らない）
+    def to_frame(self, categorical=False):
+        order = np.argsort(self.dates, kind="stable")
+        data = {
+            "date": pd.to_datetime(self.dates[order].astype("datetime64[us]")),
+            "content": self.content[order],
+        }
+        for column, vocab in (("weather", WEATHER), ("health", HEALTH)):
+            codes = getattr(self, column)[order]
+            if categorical:
+                data[column] = pd.Categorical.from_codes(codes, categories=list(vocab.values))
+            else:
+                data[column] = vocab.lookup()[codes]
+        data["rating"] = self.rating[order].astype(np.int64)
+        activities = self.activity_lists()
+        data["activities"] = [activities[i] for i in order]
+        codes = self.mood[order]
+        if categorical:
+            data["mood"] = pd.Categorical.from_codes(codes, categories=list(MOOD.values))
+        else:
+            data["mood"] = MOOD.lookup()[codes]
+        data["memo"] = self.memo[order]
+        data["sleep_hours"] = self.sleep_hours[order]
+
+        df = pd.DataFrame(data)
+        df["weekday"] = df["date"].dt.day_name()
+        df["weekday_jp"] = df["weekday"].map(WEEKDAY_JP)
+        return df
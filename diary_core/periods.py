@@ -0,0 +1,237 @@
+import threading
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from diary_core import trace
+from diary_core.analytics import has_mood
+from diary_core.reports import day_summary
+from diary_core.text import keywords
+
+# 週・月・四半期・年・任意の期間のレポートを、事前に作った日ごと・期間ごとの集計を足し合わせて作る
+#   集計（件数・評価と睡眠時間の合計・体調／気分／活動／キーワードの回数・最高／最低評価の日）は足し合わせられる形で持つ
+#   週と月は日を、四半期は月を、年は四半期を足して作るので、1年分のレポートも1週間分と同じく集計を1つ読むだけで作れる
+#   任意の期間は、丸ごと入る年・四半期・月とはみ出した端の日に分けて足す（足す集計は多くても百個程度）
+#   日ごとの集計は特徴量（features.FeatureStore）の内容のハッシュで持ち、変わった日とそれを含む期間だけを集計し直す
+
+# 期間の種類（pandas の期間の単位, 表示名, 前の期間の呼び方）
+PERIOD_KINDS = {
+    "week": ("W", "週", "前週"),
+    "month": ("M", "月", "前月"),
+    "quarter": ("Q", "四半期", "前の四半期"),
+    "year": ("Y", "年", "前年"),
+}
+# 期間ごとの集計をどの集計から作るか（None は日ごとの集計）
+SOURCES = {"week": None, "month": None, "quarter": "month", "year": "quarter"}
+# 任意の期間を分けるときに使う期間（長い順）
+RANGE_KINDS = ("year", "quarter", "month")
+COUNTERS = ("health", "mood", "activities", "keywords")
+TOP_KEYWORDS = 10
+
+
+def _empty():
+    return {
+        "entries": 0, "rating_sum": 0.0, "rating_count": 0, "sleep_sum": 0.0, "sleep_count": 0,
+        "health": Counter(), "mood": Counter(), "activities": Counter(), "keywords": Counter(),
+        # (評価, 日付)
+        "best": None, "worst": None,
+    }
+
+
+# 日記1件分の集計
+def _day(row, tokens):
+    total = _empty()
+    total["entries"] = 1
+    if pd.notna(row.rating):
+        total["rating_sum"] = float(row.rating)
+        total["rating_count"] = 1
+        total["best"] = total["worst"] = (row.rating, row.date)
+    if pd.notna(row.sleep_hours):
+        total["sleep_sum"] = float(row.sleep_hours)
+        total["sleep_count"] = 1
+    if pd.notna(row.health):
+        total["health"][row.health] += 1
+    if has_mood(row.mood):
+        total["mood"][row.mood] += 1
+    total["activities"].update(row.activities if isinstance(row.activities, (list, tuple, np.ndarray)) else [])
+    total["keywords"].update(keywords(tokens))
+    return total
+
+
+# 集計を足し合わせる（parts は日付順。最高・最低評価が同じ日は先の日を使う）
+def _merge(parts):
+    total = _empty()
+    for part in parts:
+        for key in ("entries", "rating_sum", "rating_count", "sleep_sum", "sleep_count"):
+            total[key] += part[key]
+        for key in COUNTERS:
+            total[key].update(part[key])
+        if part["best"] is not None and (total["best"] is None or part["best"][0] > total["best"][0]):
+            total["best"] = part["best"]
+        if part["worst"] is not None and (total["worst"] is None or part["worst"][0] < total["worst"][0]):
+            total["worst"] = part["worst"]
+    return total
+
+
+# 回数を多い順の Series にする（同じ回数なら先に出てきた順）
+def _counts(counter):
+    counts = pd.Series(list(counter.values()), index=list(counter), dtype="int64", name="count")
+    return counts.sort_values(ascending=False, kind="stable")
+
+
+def _mean(total, key):
+    count = total[f"{key}_count"]
+    return total[f"{key}_sum"] / count if count else np.nan
+
+
+# 期間の表示名
+def period_label(kind, period):
+    if kind == "week":
+        return f"{period.start_time:%Y/%m/%d} - {period.end_time:%Y/%m/%d}"
+    if kind == "month":
+        return f"{period.year}年{period.month}月"
+    if kind == "quarter":
+        return f"{period.year}年 第{period.quarter}四半期"
+    return f"{period.year}年"
+
+
+# 期間の最初の日と最後の日
+def bounds(period):
+    return period.start_time.normalize(), period.end_time.normalize()
+
+
+class PeriodAggregates:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.updated = 0
+        # 日付（ナノ秒の整数）→ (内容のハッシュ, 集計)。日付順
+        self._days = {}
+        # 期間の種類 → {期間: 集計}
+        self._periods = {kind: {} for kind in PERIOD_KINDS}
+        self._frame = None
+        self._dates = np.array([], dtype="datetime64[ns]")
+
+    # 同じ日記から作った分析用 DataFrame（日付順）と特徴量の DataFrame（date・hash・tokens の列）に合わせて集計を更新する
+    #   ハッシュを比べるだけで変わった日を見つけ、その日の行だけを読む。戻り値は集計し直した日数
+    @trace.traced("periods:update")
+    def update(self, df, features):
+        with self._lock:
+            keys = features["date"].to_numpy(dtype="datetime64[ns]").astype(np.int64).tolist()
+            digests = features["hash"].tolist()
+            stale = [i for i, (key, digest) in enumerate(zip(keys, digests)) if self._days.get(key, (None,))[0] != digest]
+
+            dates = df["date"].to_numpy(dtype="datetime64[ns]")
+            days = {key: self._days.get(key) for key in keys}
+            positions = np.searchsorted(dates, np.array([keys[i] for i in stale], dtype="datetime64[ns]"))
+            rows = df.iloc[positions].itertuples(index=False)
+            for i, row, tokens in zip(stale, rows, features["tokens"].iloc[stale]):
+                days[keys[i]] = (digests[i], _day(row, tokens))
+            # なくなった日も、それを含む期間を集計し直す
+            changed = {keys[i] for i in stale} | (set(self._days) - set(days))
+            self._days = days
+            self._frame = df
+            self._dates = dates
+            if changed:
+                self._rebuild(pd.DatetimeIndex(np.array(sorted(changed), dtype="datetime64[ns]")))
+            self.updated += len(changed)
+            return len(changed)
+
+    # 変わった日を含む期間だけを、下の階層の集計から作り直す
+    def _rebuild(self, changed):
+        dates = pd.DatetimeIndex(np.array(list(self._days), dtype="datetime64[ns]"))
+        totals = [total for _, total in self._days.values()]
+        for kind, source in SOURCES.items():
+            freq = PERIOD_KINDS[kind][0]
+            dirty = set(changed.to_period(freq))
+            if source is None:
+                # 期間の番号で比べて、作り直す期間に入る日だけを取り出す
+                ordinals = dates.to_period(freq).asi8
+                by_ordinal = {period.ordinal: period for period in dirty}
+                selected = np.flatnonzero(np.isin(ordinals, list(by_ordinal)))
+                parents = [by_ordinal[ordinals[i]] for i in selected]
+                parts = [totals[i] for i in selected]
+            else:
+                children = sorted(self._periods[source])
+                parents = [child.asfreq(freq) for child in children]
+                parts = [self._periods[source][child] for child in children]
+            grouped = {}
+            for parent, part in zip(parents, parts):
+                if parent in dirty:
+                    grouped.setdefault(parent, []).append(part)
+            periods = self._periods[kind]
+            for period in dirty:
+                if period in grouped:
+                    periods[period] = _merge(grouped[period])
+                else:
+                    periods.pop(period, None)
+
+    # 日記のある期間（新しい順）
+    def options(self, kind):
+        with self._lock:
+            return sorted(self._periods[kind], reverse=True)
+
+    # 期間（両端を含む）の集計。丸ごと入る年・四半期・月はその集計を、端は日ごとの集計を足す
+    def _range_total(self, start, end):
+        parts = []
+        day = start.normalize()
+        end = end.normalize()
+        while day <= end:
+            for kind in RANGE_KINDS:
+                period = day.to_period(PERIOD_KINDS[kind][0])
+                first, last = bounds(period)
+                if first == day and last <= end:
+                    if period in self._periods[kind]:
+                        parts.append(self._periods[kind][period])
+                    day = last + timedelta(days=1)
+                    break
+            else:
+                if day.value in self._days:
+                    parts.append(self._days[day.value][1])
+                day += timedelta(days=1)
+        return _merge(parts)
+
+    # 集計の日（(評価, 日付)）の日記の要約
+    def _day_summary(self, best):
+        if best is None:
+            return None
+        position = np.searchsorted(self._dates, np.datetime64(best[1], "ns"))
+        return day_summary(self._frame.iloc[position])
+
+    # 集計をレポートの形にする（reports.period_report と同じキー）
+    def _report(self, total, prev, start, end):
+        if total["entries"] == 0:
+            return None
+        lo = np.searchsorted(self._dates, np.datetime64(start, "ns"), side="left")
+        hi = np.searchsorted(self._dates, np.datetime64(end, "ns"), side="right")
+        return {
+            "data": self._frame.iloc[lo:hi],
+            "entry_count": total["entries"],
+            "avg_rating": _mean(total, "rating"),
+            "prev_avg_rating": _mean(prev, "rating") if prev is not None and prev["entries"] else None,
+            "avg_sleep": _mean(total, "sleep"),
+            "health_counts": _counts(total["health"]),
+            "mood_counts": _counts(total["mood"]),
+            "activity_counts": _counts(total["activities"]),
+            "best_day": self._day_summary(total["best"]),
+            "worst_day": self._day_summary(total["worst"]),
+            "keywords": _counts(total["keywords"]).head(TOP_KEYWORDS),
+        }
+
+    # 週・月・四半期・年のレポート（前の期間と比較する。データがなければ None）
+    def report(self, kind, period):
+        with self._lock:
+            total = self._periods[kind].get(period)
+            if total is None:
+                return None
+            return self._report(total, self._periods[kind].get(period - 1), *bounds(period))
+
+    # 任意の期間（両端を含む）のレポート（直前の同じ日数の期間と比較する。データがなければ None）
+    @trace.traced("periods:range_report")
+    def range_report(self, start, end):
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        days = (end - start).days + 1
+        with self._lock:
+            prev = self._range_total(start - timedelta(days=days), start - timedelta(days=1))
+            return self._report(self._range_total(start, end), prev, start, end)
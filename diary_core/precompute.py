@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+
+from diary_core import analytics, cooccurrence, features, forecast, lags, periods, snapshot, terms
+from diary_core.model import EntryCollection
+
+# データが変わったら（保存後・読み込み直後）分析結果をバックグラウンドで作り直しておく
+# 画面側は作り終わった結果があれば使い、なければその場で計算する
+
+# スナップショットのディレクトリが指定されていれば、分析用 DataFrame を書き出す（戻り値はファイルのパス）
+def _write_snapshot(df, ctx):
+    if not ctx["snapshot_dir"]:
+        return None
+    return snapshot.write_snapshot(ctx["snapshot_dir"], ctx["version"], df)
+
+
+# 日付×単語の行列を特徴量に合わせて更新する（変わった日付の行だけ数え直す）
+def _update_terms(feature_frame, ctx):
+    ctx["terms"].update(feature_frame)
+    return ctx["terms"]
+
+
+# 日ごと・期間ごとの集計を更新する（変わった日とそれを含む期間だけ集計し直す）
+def _update_periods(df, feature_frame, ctx):
+    ctx["periods"].update(df, feature_frame)
+    return ctx["periods"]
+
+
+# 事前計算する結果（名前 → (表示名, 先に必要な結果, 計算する関数)）。必要な結果が先に来る順に並べる
+STAGES = {
+    "entries": ("日記の配列化", (), lambda diary, deps, ctx: EntryCollection.from_dicts(diary)),
+    "frame": ("DataFrame", ("entries",), lambda diary, deps, ctx: deps["entries"].to_frame()),
+    "snapshot": ("列指向スナップショット", ("frame",), lambda diary, deps, ctx: _write_snapshot(deps["frame"], ctx)),
+    "features": ("特徴量", (), lambda diary, deps, ctx: ctx["features"].frame(diary)),
+    "tokens": ("形態素解析", ("frame", "features"), lambda diary, deps, ctx: ctx["features"].token_lists(diary, deps["frame"]["date"])),
+    "terms": ("キーワードの行列", ("features",), lambda diary, deps, ctx: _update_terms(deps["features"], ctx)),
+    "cooccurrence": ("共起ネットワーク", ("frame", "terms"), lambda diary, deps, ctx: cooccurrence.build_network(deps["frame"], deps["terms"])),
+    "streaks": ("継続記録", ("features",), lambda diary, deps, ctx: features.streaks(deps["features"])),
+    "correlation": ("相関行列", ("frame",), lambda diary, deps, ctx: analytics.correlation_matrix(deps["frame"])),
+    "lags": ("前の日の影響", ("frame",), lambda diary, deps, ctx: lags.lag_effects(deps["frame"])),
+    "forecast": ("評価の予測", ("frame",), lambda diary, deps, ctx: forecast.summary(ctx["forecaster"], deps["frame"])),
+    "periods": ("期間ごとの集計", ("frame", "features"), lambda diary, deps, ctx: _update_periods(deps["frame"], deps["features"], ctx)),
+}
+
+PENDING = "待機中"
+RUNNING = "実行中"
+DONE = "完了"
+FAILED = "エラー"
+# 先に必要な結果の計算が失敗したので計算しなかった
+SKIPPED = "スキップ"
+
+
+# データのバージョンごとに STAGES をスレッドプールで計算し、最新のバージョンの結果だけを持つ
+#   executor を渡すと複数の日記でスレッドプールを共有する
+#   snapshot_dir を渡すと、分析用 DataFrame の列指向スナップショットもバージョンごとに書き出す
+#   日記ごとの特徴量（features.FeatureStore）・日付×単語の行列（terms.TermMatrix）・期間ごとの集計（periods.PeriodAggregates）は
+#   バージョンをまたいで持ち、変わった日記の分だけ計算し直す
+#   評価の予測モデル（forecast.Forecaster）も同じく持ち続け、増えた日記の分だけ学習する
+#   （特徴量と予測モデルは snapshot_dir があればそこに保存する）
+class Precomputer:
+    def __init__(self, max_workers=2, executor=None, snapshot_dir=None):
+        self.snapshot_dir = snapshot_dir
+        self.features = features.FeatureStore(os.path.join(snapshot_dir, features.FEATURE_FILE) if snapshot_dir else None)
+        self.terms = terms.TermMatrix()
+        self.periods = periods.PeriodAggregates()
+        self.forecaster = forecast.Forecaster(os.path.join(snapshot_dir, forecast.FORECAST_FILE) if snapshot_dir else None)
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="precompute")
+        self._lock = threading.Lock()
+        self.version = None
+        self._artifacts = {}
+        self._status = {}
+
+    # 新しいバージョンなら計算を始める（同じバージョンなら何もしない）
+    def submit(self, diary, version):
+        with self._lock:
+            if version is None or version == self.version:
+                return False
+            self.version = version
+            self._artifacts = {}
+            self._status = {name: {"state": PENDING, "ms": None} for name in STAGES}
+            ctx = {"version": version, "snapshot_dir": self.snapshot_dir, "features": self.features, "terms": self.terms, "periods": self.periods, "forecaster": self.forecaster}
+            futures = {}
+            for name, (_, deps, func) in STAGES.items():
+                dep_futures = {dep: futures[dep] for dep in deps}
+                futures[name] = self._executor.submit(self._run_stage, ctx, name, func, diary, dep_futures)
+        return True
+
+    def _run_stage(self, ctx, name, func, diary, dep_futures):
+        version = ctx["version"]
+        try:
+            deps = {dep: future.result() for dep, future in dep_futures.items()}
+        except Exception as e:
+            # 待機中のまま残ると running() がいつまでも終わらないので、スキップしたことにする
+            failed = [STAGES[dep][0] for dep, future in dep_futures.items() if future.exception() is not None]
+            self._update_status(version, name, state=SKIPPED, error=f"{'・'.join(failed)}の計算に失敗しました: {e}")
+            raise
+        # 途中で新しいバージョンが来たら古い計算は捨てる
+        if not self._update_status(version, name, state=RUNNING):
+            return None
+        start = time.perf_counter()
+        try:
+            result = func(diary, deps, ctx)
+        except Exception as e:
+            self._update_status(version, name, state=FAILED, error=str(e))
+            raise
+        ms = round((time.perf_counter() - start) * 1000, 1)
+        with self._lock:
+            if self.version == version:
+                self._artifacts[name] = result
+                self._status[name] = {"state": DONE, "ms": ms}
+        return result
+
+    def _update_status(self, version, name, **status):
+        with self._lock:
+            if self.version != version:
+                return False
+            self._status[name].update(status)
+            return True
+
+    # 指定したバージョンの計算済みの結果（まだなければ None）
+    def get(self, name, version):
+        with self._lock:
+            if version is None or version != self.version:
+                return None
+            return self._artifacts.get(name)
+
+    # 分析用 DataFrame（計算済みのものがなければ、同じバージョンのスナップショットから必要な列だけ読む。どちらもなければ None）
+    #   再起動した直後など、事前計算が終わる前の表示を速くする
+    def frame(self, version, columns=None):
+        df = self.get("frame", version)
+        if df is not None:
+            return df
+        if snapshot.has_snapshot(self.snapshot_dir, version):
+            try:
+                return snapshot.read_frame(self.snapshot_dir, version, columns)
+            except (OSError, pa.ArrowException):
+                return None
+        return None
+
+    # 計算済みの結果すべて（メモリ使用量の見積もり用）
+    def artifacts(self):
+        with self._lock:
+            return dict(self._artifacts)
+
+    # 表示用の進み具合（表示名, 状態, 時間）
+    def status(self):
+        with self._lock:
+            return [
+                {"stage": STAGES[name][0], "state": s["state"], "ms": s["ms"], "error": s.get("error")}
+                for name, s in self._status.items()
+            ]
+
+    def running(self):
+        with self._lock:
+            return any(s["state"] in (PENDING, RUNNING) for s in self._status.values())
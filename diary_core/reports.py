@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from diary_core import trace
+from diary_core.analytics import has_mood
+from diary_core.text import keyword_counts, tokenize_contents
+
+
+# 選択できる週の一覧（"YYYY/MM/DD - YYYY/MM/DD"、新しい順）
+def week_options(df):
+    periods = df["date"].dt.to_period("W")
+    labels = periods.dt.start_time.dt.strftime("%Y/%m/%d") + " - " + periods.dt.end_time.dt.strftime("%Y/%m/%d")
+    return sorted(labels.unique(), reverse=True)
+
+
+# 週のラベルから開始日と終了日を取り出す
+def parse_week_label(label):
+    start, end = label.split(" - ")
+    return pd.to_datetime(start), pd.to_datetime(end)
+
+
+# 1日分の日記の要約（ベストデー・ワーストデーの表示用）
+def day_summary(row):
+    return {
+        "date": row["date"],
+        "rating": row["rating"],
+        "weather": row["weather"],
+        "health": row["health"],
+        "activities": row["activities"],
+        "content": row["content"],
+    }
+
+
+# 期間内の集計（前の期間の平均評価と比較する。データがなければ None）
+#   token_lists を渡すと（df の行と同じ並びの単語リスト）形態素解析を省略する
+@trace.traced("report:period")
+def period_report(df, start_date, end_date, prev_start, prev_end, token_lists=None):
+    in_period = ((df["date"] >= start_date) & (df["date"] <= end_date)).to_numpy()
+    period_data = df[in_period]
+    if period_data.empty:
+        return None
+
+    if token_lists is None:
+        period_tokens = tokenize_contents(period_data["content"])
+    else:
+        period_tokens = [tokens for tokens, selected in zip(token_lists, in_period) if selected]
+
+    # 前の期間との比較
+    prev_data = df[(df["date"] >= prev_start) & (df["date"] <= prev_end)]
+
+    mood_data = period_data[period_data["mood"].map(has_mood)]
+    activities = [a for acts in period_data["activities"] for a in acts]
+
+    return {
+        "data": period_data,
+        "entry_count": len(period_data),
+        "avg_rating": period_data["rating"].mean(),
+        "prev_avg_rating": prev_data["rating"].mean() if not prev_data.empty else None,
+        "avg_sleep": period_data["sleep_hours"].mean(),
+        "health_counts": period_data["health"].value_counts(),
+        "mood_counts": mood_data["mood"].value_counts(),
+        "activity_counts": pd.Series(activities, dtype=object).value_counts(),
+        "best_day": day_summary(period_data.loc[period_data["rating"].idxmax()]),
+        "worst_day": day_summary(period_data.loc[period_data["rating"].idxmin()]),
+        "keywords": keyword_counts(period_tokens, top=10),
+    }
+
+
+# 1週間分の集計（前週と比較する。データがなければ None）
+def weekly_report(df, start_date, end_date, token_lists=None):
+    return period_report(df, start_date, end_date, start_date - timedelta(days=7), end_date - timedelta(days=7), token_lists)
@@ -0,0 +1,161 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from diary_core import trace
+from diary_core.frame import rating_values
+
+# 移動統計を計算する期間（日数）と対象カラム
+DEFAULT_WINDOWS = (7, 30, 90, 365)
+DEFAULT_COLUMNS = ("rating", "sleep_hours")
+
+
+# 日記データをカレンダー上の日次インデックスに揃える（記録のない日は NaN、entries は 0）
+def daily_frame(df, columns=DEFAULT_COLUMNS):
+    columns = list(columns)
+    if df.empty:
+        return pd.DataFrame(columns=columns + ["entries"], index=pd.DatetimeIndex([], name="date"))
+
+    data = pd.DataFrame({"date": pd.to_datetime(df["date"]).dt.normalize()})
+    for col in columns:
+        if col not in df.columns:
+            data[col] = np.nan
+        else:
+            # 評価が未入力の日は、記録はあっても評価の統計には入れない
+            data[col] = rating_values(df[col]) if col == "rating" else pd.to_numeric(df[col], errors="coerce")
+
+    # 同じ日付が複数ある場合は平均をとる
+    grouped = data.groupby("date")
+    daily = grouped[columns].mean()
+    daily["entries"] = grouped.size()
+
+    full_index = pd.date_range(daily.index.min(), daily.index.max(), freq="D", name="date")
+    daily = daily.reindex(full_index)
+    daily["entries"] = daily["entries"].fillna(0).astype(int)
+    return daily
+
+
+# 累積和から各行の窓内の合計を求める（cs[0] は 0 の行）
+def _window_sums(cs, rows, window):
+    hi = rows + 1
+    lo = np.maximum(hi - window, 0)
+    return cs[hi] - cs[lo]
+
+
+# 指定した行について、全期間・全カラムの平均・標準偏差・記録密度をまとめて計算する
+def _window_stats(cs_sum, cs_sq, cs_cnt, cs_days, rows, windows):
+    result = {}
+    for window in windows:
+        total = _window_sums(cs_sum, rows, window)
+        total_sq = _window_sums(cs_sq, rows, window)
+        count = _window_sums(cs_cnt, rows, window)
+        days = _window_sums(cs_days, rows, window)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+            var = np.where(count > 1, (total_sq - total * total / count) / (count - 1), np.nan)
+        std = np.sqrt(np.clip(var, 0, None))
+
+        result[window] = (mean, std, days / window)
+    return result
+
+
+# 時間ベースの移動統計（平均・標準偏差・EWMA・記録密度）を保持し、日付の追加時は差分だけ計算するキャッシュ
+class RollingStats:
+    def __init__(self, windows=DEFAULT_WINDOWS, columns=DEFAULT_COLUMNS):
+        self.windows = tuple(windows)
+        self.columns = tuple(columns)
+        self._lock = threading.Lock()
+        self._key = None
+        self._index = None
+        self._cs = None
+        self._ewm = None
+        self.frame = None
+
+    # 日次データフレームを受け取り、必要な部分だけ再計算して統計データフレームを返す
+    @trace.traced("rolling:update")
+    def update(self, daily):
+        with self._lock:
+            values = daily[list(self.columns)].to_numpy(dtype=float)
+            has_entry = (daily["entries"].to_numpy() > 0).astype(float)
+            key = np.column_stack([values, has_entry])
+
+            if self._can_extend(daily.index, key):
+                if len(key) > len(self._key):
+                    self._extend(daily.index, values, has_entry)
+            else:
+                self._rebuild(daily.index, values, has_entry)
+            self._key = key
+            return self.frame
+
+    # 既存の日付範囲のデータが変わっておらず、末尾に日付が追加されただけなら差分計算できる
+    def _can_extend(self, index, key):
+        if self._key is None or len(self._key) == 0 or len(key) < len(self._key):
+            return False
+        old_len = len(self._key)
+        return bool(index[0] == self._index[0]) and np.array_equal(key[:old_len], self._key, equal_nan=True)
+
+    def _rebuild(self, index, values, has_entry):
+        n = len(index)
+        observed = ~np.isnan(values)
+        filled = np.where(observed, values, 0.0)
+
+        # 先頭に 0 の行を足した累積和（窓の合計を差分で求めるため）
+        zeros = np.zeros((1, values.shape[1]))
+        self._cs = [
+            np.vstack([zeros, np.cumsum(filled, axis=0)]),
+            np.vstack([zeros, np.cumsum(filled * filled, axis=0)]),
+            np.vstack([zeros, np.cumsum(observed, axis=0)]),
+            np.concatenate([[0.0], np.cumsum(has_entry)])[:, None],
+        ]
+        self._ewm = {
+            window: pd.DataFrame(values).ewm(span=window, adjust=False, ignore_na=True).mean().to_numpy()
+            for window in self.windows
+        }
+        self._index = index
+        self.frame = self._to_frame(index, np.arange(n), {w: self._ewm[w] for w in self.windows})
+
+    def _extend(self, index, values, has_entry):
+        old_len = len(self._key)
+        new_values = values[old_len:]
+        observed = ~np.isnan(new_values)
+        filled = np.where(observed, new_values, 0.0)
+
+        # 既存の累積和の末尾から続けて足し込む
+        cs_sum, cs_sq, cs_cnt, cs_days = self._cs
+        self._cs = [
+            np.vstack([cs_sum, cs_sum[-1] + np.cumsum(filled, axis=0)]),
+            np.vstack([cs_sq, cs_sq[-1] + np.cumsum(filled * filled, axis=0)]),
+            np.vstack([cs_cnt, cs_cnt[-1] + np.cumsum(observed, axis=0)]),
+            np.vstack([cs_days, cs_days[-1] + np.cumsum(has_entry[old_len:])[:, None]]),
+        ]
+
+        # EWMA は直前の値を初期値にして新しい日だけ計算する
+        new_ewm = {}
+        for window in self.windows:
+            seeded = np.vstack([self._ewm[window][-1:], new_values])
+            tail = pd.DataFrame(seeded).ewm(span=window, adjust=False, ignore_na=True).mean().to_numpy()[1:]
+            new_ewm[window] = tail
+            self._ewm[window] = np.vstack([self._ewm[window], tail])
+
+        self._index = index
+        tail_frame = self._to_frame(index[old_len:], np.arange(old_len, len(index)), new_ewm)
+        self.frame = pd.concat([self.frame, tail_frame])
+
+    def _to_frame(self, index, rows, ewm):
+        stats = _window_stats(*self._cs, rows, self.windows)
+        data = {}
+        for window in self.windows:
+            mean, std, density = stats[window]
+            for i, col in enumerate(self.columns):
+                data[f"{col}_mean_{window}d"] = mean[:, i]
+                data[f"{col}_std_{window}d"] = std[:, i]
+                data[f"{col}_ewm_{window}d"] = ewm[window][:, i]
+            data[f"density_{window}d"] = density[:, 0]
+        return pd.DataFrame(data, index=index)
+
+
+# 一度だけ計算する場合のショートカット
+def rolling_statistics(df, windows=DEFAULT_WINDOWS, columns=DEFAULT_COLUMNS):
+    return RollingStats(windows, columns).update(daily_frame(df, columns))
@@ -0,0 +1,72 @@
+import glob
+import os
+
+import pyarrow as pa
+
+# 分析用 DataFrame の列指向スナップショット（Arrow IPC ファイル）
+#   元データ（JSON）の内容のバージョンごとに1つ作り、データが変わったときだけ作り直す。JSON が正のデータ
+#   圧縮せずに書くのでメモリマップでそのまま読め、必要な列だけを取り出せる
+
+SNAPSHOT_EXT = ".arrow"
+# 辞書エンコードする列（種類の少ない文字列）
+DICTIONARY_COLUMNS = ("weather", "health", "mood", "weekday", "weekday_jp")
+
+
+def snapshot_path(snapshot_dir, version):
+    return os.path.join(snapshot_dir, f"{version}{SNAPSHOT_EXT}")
+
+
+def has_snapshot(snapshot_dir, version):
+    return bool(snapshot_dir and version) and os.path.exists(snapshot_path(snapshot_dir, version))
+
+
+# 分析用 DataFrame（frame.to_frame の結果）をスナップショットとして書き出す（古いバージョンのものは消す）
+def write_snapshot(snapshot_dir, version, df):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = snapshot_path(snapshot_dir, version)
+    if os.path.exists(path):
+        return path
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for column in DICTIONARY_COLUMNS:
+        if column in table.column_names:
+            i = table.column_names.index(column)
+            table = table.set_column(i, column, table.column(column).dictionary_encode())
+
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+    for old in glob.glob(os.path.join(snapshot_dir, f"*{SNAPSHOT_EXT}")):
+        if old != path:
+            os.remove(old)
+    return path
+
+
+# スナップショットの列をメモリマップで読む（コピーせずに Arrow の Table として返す）
+def read_table(snapshot_dir, version, columns=None):
+    source = pa.memory_map(snapshot_path(snapshot_dir, version), "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table if columns is None else table.select(list(columns))
+
+
+# スナップショットから分析用 DataFrame を作る（columns を指定するとその列だけ）
+def read_frame(snapshot_dir, version, columns=None):
+    table = read_table(snapshot_dir, version, columns)
+    order = table.column_names
+    activities = None
+    if "activities" in table.column_names:
+        activities = table.column("activities").to_pylist()
+        table = table.drop_columns(["activities"])
+    for column in DICTIONARY_COLUMNS:
+        if column in table.column_names:
+            i = table.column_names.index(column)
+            table = table.set_column(i, column, table.column(column).cast(pa.string()))
+
+    df = table.to_pandas()
+    if activities is not None:
+        df["activities"] = activities
+        df = df[order]
+    return df
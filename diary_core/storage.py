@@ -0,0 +1,238 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+
+import requests
+
+from diary_core import codec, trace
+from diary_core.vocab import DEFAULT_SLEEP_HOURS
+
+# GitHub の接続先（DIARY_GITHUB_API_URL・DIARY_GITHUB_RAW_URL で差し替えられる。bench/github_stub.py のスタンドインなど）
+GITHUB_API_URL = os.environ.get("DIARY_GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GITHUB_RAW_URL = os.environ.get("DIARY_GITHUB_RAW_URL", "https://raw.githubusercontent.com").rstrip("/")
+REQUEST_TIMEOUT = 30
+
+
+def get_file_sha(repo, path, token, branch="main"):
+    url = f"{GITHUB_API_URL}/repos/{repo}/contents/{path}?ref={branch}"
+    headers = {"Authorization": f"token {token}"}
+    with trace.span("github:get_sha"):
+        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()["sha"]
+
+
+# sha を渡すとそのリビジョンに対して更新する（その後に更新されていたら 409 Conflict）
+def update_github_file(repo, path, content, token, message="Update file", branch="main", sha=None):
+    url = f"{GITHUB_API_URL}/repos/{repo}/contents/{path}"
+    if sha is None:
+        sha = get_file_sha(repo, path, token, branch)
+    headers = {"Authorization": f"token {token}"}
+    data = {
+        "message": message,
+        "content": content,
+        "sha": sha,
+        "branch": branch,
+    }
+    with trace.span("github:put", bytes=len(content)):
+        response = requests.put(url, headers=headers, data=json.dumps(data), timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+
+# SHA を指定してファイルの中身を取得する（raw.githubusercontent.com と違い CDN のキャッシュで古い内容が返らない）
+def get_blob(repo, sha, token):
+    url = f"{GITHUB_API_URL}/repos/{repo}/git/blobs/{sha}"
+    headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github.raw"}
+    with trace.span("github:get_blob") as s:
+        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        s.set(bytes=len(response.content))
+        return response.content
+
+
+# 保存データの内容から作るバージョン（内容が変われば変わる）
+def content_version(raw):
+    return hashlib.sha1(raw).hexdigest()
+
+
+# 読み込んだ後に保存先が更新されていて、保存できなかったとき
+class ConflictError(Exception):
+    pass
+
+
+# GitHub リポジトリ上のファイルに日記を保存するストレージ
+#   保存形式はファイル名で決まる（diary.jsonl.zst なら圧縮した JSONL。codec を参照）
+#   version: 最後に読み込んだ・保存した内容のバージョン
+class GitHubStorage:
+    def __init__(self, repo, path, token, branch="main"):
+        self.repo = repo
+        self.path = path
+        self.token = token
+        self.branch = branch
+        self.codec = codec.codec_for_path(path)
+        self.version = None
+
+    def load(self):
+        url = f"{GITHUB_RAW_URL}/{self.repo}/{self.branch}/{self.path}"
+        with trace.span("github:get_raw") as s:
+            response = requests.get(url, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            s.set(bytes=len(response.content))
+        self.version = content_version(response.content)
+        with trace.span("json:parse"):
+            return codec.decode(response.content)
+
+    def save(self, data, message="Update file"):
+        with trace.span("json:dump"):
+            raw = codec.encode(data, self.codec)
+            encoded_content = base64.b64encode(raw).decode()
+        update_github_file(self.repo, self.path, encoded_content, self.token, message, self.branch)
+        self.version = content_version(raw)
+
+    # 保存先の現在のリビジョン（ファイルの SHA）
+    def revision(self):
+        return get_file_sha(self.repo, self.path, self.token, self.branch)
+
+    # known_revision から変わっていれば (内容, リビジョン)、変わっていなければ (None, リビジョン)
+    def fetch_if_changed(self, known_revision=None):
+        sha = self.revision()
+        if sha == known_revision:
+            return None, sha
+        raw = get_blob(self.repo, sha, self.token)
+        with trace.span("json:parse"):
+            return codec.decode(raw), sha
+
+    # revision から変わっていなければ保存して新しいリビジョンを返す（変わっていたら ConflictError）
+    def save_if_unchanged(self, data, revision, message="Update file"):
+        with trace.span("json:dump"):
+            raw = codec.encode(data, self.codec)
+            encoded_content = base64.b64encode(raw).decode()
+        try:
+            response = update_github_file(self.repo, self.path, encoded_content, self.token, message, self.branch, sha=revision)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 409:
+                raise ConflictError(f"{self.path} は他の場所で更新されています")
+            raise
+        self.version = content_version(raw)
+        return response["content"]["sha"]
+
+
+_local_write_lock = threading.Lock()
+
+
+# ローカルのファイルに日記を保存するストレージ（開発・ベンチマーク用の GitHub の代替。保存形式は GitHubStorage と同じ）
+#   リビジョンはファイルの内容のハッシュ
+class LocalStorage:
+    def __init__(self, path):
+        self.path = path
+        self.codec = codec.codec_for_path(path)
+        self.version = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self.version = content_version(b"")
+            return []
+        with trace.span("local:read"):
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        self.version = content_version(raw)
+        with trace.span("json:parse"):
+            return codec.decode(raw)
+
+    def save(self, data, message="Update file"):
+        # 書き込み途中で壊れないように一時ファイルに書いてから置き換える
+        tmp_path = f"{self.path}.tmp"
+        with trace.span("local:write"):
+            raw = codec.encode(data, self.codec)
+            with open(tmp_path, "wb") as f:
+                f.write(raw)
+            os.replace(tmp_path, self.path)
+        self.version = content_version(raw)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return b""
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def revision(self):
+        return content_version(self._read())
+
+    def fetch_if_changed(self, known_revision=None):
+        raw = self._read()
+        revision = content_version(raw)
+        if revision == known_revision:
+            return None, revision
+        return codec.decode(raw), revision
+
+    def save_if_unchanged(self, data, revision, message="Update file"):
+        with _local_write_lock:
+            if self.revision() != revision:
+                raise ConflictError(f"{self.path} は他の場所で更新されています")
+            self.save(data, message)
+            return self.version
+
+
+# 設定からストレージを作る（backend は "github" または "local"）
+def create_storage(backend="github", repo=None, path="diary.json", token=None, branch="main"):
+    if backend == "local":
+        return LocalStorage(path)
+    if backend == "github":
+        return GitHubStorage(repo, path, token, branch)
+    raise ValueError(f"未対応のストレージです: {backend}")
+
+
+# 環境変数からストレージを作る（CLI やバッチ処理用）
+#   DIARY_STORAGE=local|github, DIARY_LOCAL_PATH, DIARY_GITHUB_REPO, DIARY_GITHUB_PATH, GITHUB_TOKEN
+#   （接続先は DIARY_GITHUB_API_URL・DIARY_GITHUB_RAW_URL）
+def storage_from_env():
+    backend = os.environ.get("DIARY_STORAGE", "github")
+    if backend == "local":
+        return create_storage("local", path=os.environ.get("DIARY_LOCAL_PATH", "diary.json"))
+    return create_storage(
+        "github",
+        repo=os.environ.get("DIARY_GITHUB_REPO", "isamikann/diary"),
+        path=os.environ.get("DIARY_GITHUB_PATH", "diary.json"),
+        token=os.environ.get("GITHUB_TOKEN"),
+    )
+
+
+# 保存する1日分のデータを作る
+def make_entry(date, content, weather, health, rating, activities=None, mood=None, memo=None, sleep_hours=None):
+    return {
+        "date": date,
+        "content": content,
+        "weather": weather,
+        "health": health,
+        "rating": rating,
+        "activities": activities or [],
+        "mood": mood or "",
+        "memo": memo or "",
+        "sleep_hours": sleep_hours or DEFAULT_SLEEP_HOURS,
+    }
+
+
+# 特定の日付の日記を探す
+def find_entry(diary, date):
+    return next((d for d in diary if d["date"] == date), None)
+
+
+# 日記リストに追加する（同じ日付のデータがあれば上書き）
+def upsert_entry(diary, entry):
+    existing_entry = find_entry(diary, entry["date"])
+    if existing_entry:
+        existing_entry.update(entry)
+    else:
+        diary.append(entry)
+    return diary
+
+
+# 日記を追加・更新して保存する
+def add_entry(storage, date, content, weather, health, rating, activities=None, mood=None, memo=None, sleep_hours=None):
+    diary = storage.load()
+    upsert_entry(diary, make_entry(date, content, weather, health, rating, activities, mood, memo, sleep_hours))
+    storage.save(diary)
+    return diary
@@ -0,0 +1,261 @@
+import json
+import os
+import threading
+import time
+
+from diary_core import trace
+from diary_core.backups import entry_blob
+from diary_core.storage import ConflictError, LocalStorage
+
+# オフラインでも使えるローカルミラー
+#   保存はローカルのミラーと追記専用の操作ログ（WAL）に書くだけなので、GitHub が遅い・使えないときも待たない
+#   同期スレッドが WAL の操作を最後に同期したリモートの内容に適用して送信する（競合したら取り直してやり直す）
+#   リモートの内容は、最後に同期したリビジョン（GitHub ならファイルの SHA）から変わったときだけ取得する
+#
+# mirror_dir の中身
+#   diary.json : ローカルのミラー（base.json に WAL を適用したもの。画面はこれを読む）
+#   base.json  : 最後に同期したリモートの内容
+#   wal.jsonl  : まだ送信していない操作（1行1操作）
+#   state.json : 最後に同期したリモートのリビジョンと時刻
+
+DEFAULT_SYNC_INTERVAL = 30
+MAX_SYNC_ATTEMPTS = 3
+
+
+# 日記リストの各日記のキー（backups のスナップショットと同じく日付。日付がない・形式が違う・日付が重複した日記は内容のハッシュを付ける）
+#   読み込めなかった日記も消したり取り違えたりせずに、そのまま同期する
+def entry_keys(diary):
+    seen = set()
+    keys = []
+    for entry in diary:
+        date = entry.get("date") if isinstance(entry, dict) else None
+        if isinstance(date, str) and date not in seen:
+            key = date
+        else:
+            key = f"{date if isinstance(date, str) else ''}#{entry_blob(entry)[0][:12]}"
+        seen.add(key)
+        keys.append(key)
+    return keys
+
+
+# 2つの日記リストの差分を日記ごとの操作にする（操作の "date" は entry_keys のキー）
+def diff_ops(old, new):
+    old_index = dict(zip(entry_keys(old), old))
+    new_keys = set()
+    ops = []
+    for key, entry in zip(entry_keys(new), new):
+        new_keys.add(key)
+        if key not in old_index or old_index[key] != entry:
+            ops.append({"op": "upsert", "date": key, "entry": entry})
+    for key in old_index:
+        if key not in new_keys:
+            ops.append({"op": "delete", "date": key})
+    return ops
+
+
+# 日記リストに操作を順に適用する（元のリストは変更しない）
+def apply_ops(diary, ops):
+    index = {key: i for i, key in enumerate(entry_keys(diary))}
+    result = list(diary)
+    deleted = set()
+    for op in ops:
+        i = index.get(op["date"])
+        if op["op"] == "upsert":
+            if i is None or i in deleted:
+                index[op["date"]] = len(result)
+                result.append(op["entry"])
+            else:
+                result[i] = op["entry"]
+        elif op["op"] == "delete" and i is not None:
+            deleted.add(i)
+            del index[op["date"]]
+    return [d for i, d in enumerate(result) if i not in deleted]
+
+
+# リモートのストレージ（GitHubStorage など）の前に置くローカルミラー
+class MirroredStorage:
+    def __init__(self, remote, mirror_dir, interval=DEFAULT_SYNC_INTERVAL):
+        self.remote = remote
+        self.mirror_dir = mirror_dir
+        self.interval = interval
+        self.version = None
+        self.last_error = None
+        self.last_sync = None
+        os.makedirs(mirror_dir, exist_ok=True)
+        self._mirror = LocalStorage(os.path.join(mirror_dir, "diary.json"))
+        self._base = LocalStorage(os.path.join(mirror_dir, "base.json"))
+        self._wal_path = os.path.join(mirror_dir, "wal.jsonl")
+        self._state_path = os.path.join(mirror_dir, "state.json")
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        # まだ同期していないときに、次にリモートから取得し直す時刻
+        self._retry_at = 0
+
+        state = self._read_state()
+        base = self._load_base()
+        # base.json がない・壊れているときは前回のリビジョンを使わず、リモートの内容を取り直してから送信する
+        #   （リビジョンが変わっていないと取得を省くので、そのままだと空の内容に WAL を適用してリモートを上書きしてしまう）
+        self.revision = state.get("revision") if base is not None else None
+        self.last_sync = state.get("synced_at")
+        # 前回 WAL に書いた後でミラーの保存が中断していても、base と WAL から作り直す
+        if base is not None:
+            with self._lock:
+                self._mirror.save(apply_ops(base, self._read_wal()))
+
+    def _read_state(self):
+        if not os.path.exists(self._state_path):
+            return {}
+        with open(self._state_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_state(self):
+        with open(f"{self._state_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"revision": self.revision, "synced_at": self.last_sync}, f)
+        os.replace(f"{self._state_path}.tmp", self._state_path)
+
+    # 最後に同期したリモートの内容（ファイルがない・空・読めないときは None）
+    def _load_base(self):
+        if not os.path.exists(self._base.path) or os.path.getsize(self._base.path) == 0:
+            return None
+        try:
+            return self._base.load()
+        except Exception:
+            return None
+
+    def _read_wal(self):
+        if not os.path.exists(self._wal_path):
+            return []
+        with open(self._wal_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    # ミラーを読む（まだ1度も同期していない・base.json がなくなったときは、リモートから取得する）
+    def load(self):
+        has_mirror = os.path.exists(self._mirror.path)
+        if self.revision is None and (not has_mirror or time.time() >= self._retry_at):
+            try:
+                self.pull()
+            except Exception as e:
+                # 取得できないときは、前回のミラーがあればそれを読み、interval 秒たってから取り直す
+                #   ミラーもないときは、空の日記として見せずにエラーにする（取得できるまで読むたびに取り直す）
+                self.last_error = str(e)
+                self._retry_at = time.time() + self.interval
+                if not has_mirror:
+                    raise
+        with self._lock:
+            diary = self._mirror.load()
+            self.version = self._mirror.version
+        return diary
+
+    # 差分を WAL に追記してミラーを更新する（リモートへの送信は同期スレッドが行う）
+    def save(self, data, message="Update file"):
+        with self._lock:
+            ops = diff_ops(self._mirror.load(), data)
+            if ops:
+                now = time.time()
+                with trace.span("wal:append", ops=len(ops)):
+                    with open(self._wal_path, "a", encoding="utf-8") as f:
+                        for op in ops:
+                            f.write(json.dumps(dict(op, ts=now, message=message), ensure_ascii=False) + "\n")
+                        f.flush()
+                        os.fsync(f.fileno())
+            self._mirror.save(data)
+            self.version = self._mirror.version
+        if ops:
+            self._wake.set()
+
+    # リモートの変更だけを取り込む（未送信の操作はその上に適用し直す）
+    def pull(self):
+        with self._sync_lock:
+            known = self.revision if self._load_base() is not None else None
+            data, revision = self.remote.fetch_if_changed(known)
+            if data is not None:
+                with self._lock:
+                    self._base.save(data)
+                    self._mirror.save(apply_ops(data, self._read_wal()))
+            self._synced(revision)
+
+    # WAL の操作をリモートに送信する。戻り値は送信した操作の数
+    def sync_once(self):
+        with self._sync_lock:
+            with self._lock:
+                ops = self._read_wal()
+            for attempt in range(MAX_SYNC_ATTEMPTS):
+                data, revision = self.remote.fetch_if_changed(self.revision)
+                if not ops and data is None:
+                    # 送信するものも、リモートの変更もない
+                    self._synced(revision)
+                    return 0
+                base = self._load_base() if data is None else data
+                if base is None:
+                    # base.json がなくなっていたら、空の内容に対して送信しないように、リモートの内容を取り直す
+                    data, revision = self.remote.fetch_if_changed(None)
+                    base = data
+                if not ops:
+                    break
+                merged = apply_ops(base, ops)
+                try:
+                    revision = self.remote.save_if_unchanged(merged, revision, f"Sync {len(ops)} changes")
+                    base = merged
+                    break
+                except ConflictError:
+                    # 送信前に他の場所で更新されていたら、取り直して適用し直す
+                    self.revision = None
+                    if attempt == MAX_SYNC_ATTEMPTS - 1:
+                        raise
+
+            with self._lock:
+                # 同期中に追記された操作は残して、ミラーを作り直す
+                remaining = self._read_wal()[len(ops):]
+                with open(f"{self._wal_path}.tmp", "w", encoding="utf-8") as f:
+                    for op in remaining:
+                        f.write(json.dumps(op, ensure_ascii=False) + "\n")
+                os.replace(f"{self._wal_path}.tmp", self._wal_path)
+                self._base.save(base)
+                self._mirror.save(apply_ops(base, remaining))
+            self._synced(revision)
+            return len(ops)
+
+    def _synced(self, revision):
+        self.revision = revision
+        self.last_sync = time.time()
+        self.last_error = None
+        self._write_state()
+
+    # 同期スレッドを開始する（interval 秒ごと、または保存の直後に同期する）
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="diary-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    # すぐに同期する
+    def request_sync(self):
+        self._wake.set()
+
+    def _run(self):
+        delay = 0
+        while True:
+            self._wake.wait(delay)
+            self._wake.clear()
+            try:
+                self.sync_once()
+                delay = self.interval
+            except Exception as e:
+                self.last_error = str(e)
+                # 失敗が続くときは間隔を空ける
+                delay = min(max(delay * 2, 5), 300)
+
+    # 表示用の同期状況
+    def status(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            pending = self._read_wal()
+        return {
+            "pending": len(pending),
+            "lag_seconds": now - pending[0]["ts"] if pending else 0,
+            "last_sync": self.last_sync,
+            "revision": self.revision,
+            "error": self.last_error,
+        }
@@ -0,0 +1,221 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from diary_core import storage
+from diary_core.anomaly import AnomalyDetector
+from diary_core.model import partition
+from diary_core.precompute import Precomputer
+from diary_core.rolling import RollingStats
+
+# 1つのアプリで複数の日記（ユーザーやリポジトリごと）を扱うための設定とキャッシュ
+# 日記ごとのキャッシュ（事前計算の結果・移動統計）はメモリの上限を超えたら古いものから捨てる
+# 形態素解析の辞書・フォント・ストップワードなどはモジュール単位で1つだけ持ち、すべての日記で共有する
+
+DEFAULT_TENANT = "default"
+DEFAULT_MEMORY_BUDGET_MB = 256
+# 最後に使われてからこの時間（秒）以内の日記を「利用中」とみなす
+ACTIVE_SECONDS = 15 * 60
+
+
+# 日記の設定ファイル（JSON）を読み込む
+#   {"alice": {"label": "Alice", "backend": "github", "repo": "alice/diary", "path": "diary.json", "token_secret": "ALICE_TOKEN"},
+#    "bob": {"backend": "local", "path": "data/bob.json"}}
+def load_tenants(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        tenants = json.load(f)
+    for name, config in tenants.items():
+        if config.get("backend", "github") not in ("github", "local"):
+            raise ValueError(f"未対応のストレージです: {name}: {config['backend']}")
+    return tenants
+
+
+# 日記の設定からストレージを作る（token は GitHub の場合だけ使う）
+def tenant_storage(config, token=None):
+    return storage.create_storage(
+        config.get("backend", "github"),
+        repo=config.get("repo"),
+        path=config.get("path", "diary.json"),
+        token=token,
+        branch=config.get("branch", "main"),
+    )
+
+
+# オブジェクトのおおよそのメモリ使用量（バイト）
+def estimate_size(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + sum(estimate_size(item, seen) for item in obj)
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_size(vars(obj), seen)
+    return size
+
+
+# 日記のコピー（活動のリストも書き換えられてよいようにコピーする）
+def _snapshot(d):
+    return {k: list(v) if isinstance(v, list) else v for k, v in d.items()}
+
+
+# 元の日記 original に、before → after で変わった項目だけを反映する
+def _patch(original, before, after):
+    patched = {k: v for k, v in original.items() if k in after or k not in before}
+    patched.update((k, v) for k, v in after.items() if k not in before or before[k] != v)
+    return patched
+
+
+# 1つの日記のキャッシュ
+class TenantState:
+    def __init__(self, name, executor, snapshot_dir=None):
+        self.name = name
+        self.precompute = Precomputer(executor=executor, snapshot_dir=snapshot_dir)
+        self.rolling = RollingStats()
+        self.anomalies = AnomalyDetector()
+        self.last_access = time.time()
+        self.load_errors = []
+        # 読み込めなかった元の日記（保存するときにそのまま書き戻す）
+        self.rejected = []
+        # 日付 → [(検証・補完した直後の日記, 保存されている元の日記)]（保存するときに変わっていない項目は元のまま書き戻す）
+        self._originals = {}
+        self._diary = None
+        self._diary_version = None
+        self._size_key = None
+        self._size = 0
+
+    # 読み込んだ日記を検証・補完したもの（同じバージョンなら前回の結果を使う）
+    #   分析・表示用なので、検証できなかった日記は含めない（rejected に元のまま残す）
+    def normalized_diary(self, diary, version):
+        if version is None or version != self._diary_version:
+            entries, originals, rejected, errors = partition(diary)
+            self._diary = [entry.to_dict() for entry in entries]
+            self._originals = {}
+            for normalized, original in zip(self._diary, originals):
+                self._originals.setdefault(normalized["date"], []).append((_snapshot(normalized), original))
+            self._diary_version = version
+            self.rejected = rejected
+            self.load_errors = errors
+        return self._diary
+
+    # 検証・補完した日記リストを元に保存する内容を作る
+    #   補完しただけの項目（未記入の評価・睡眠時間など）や知らない項目を書き換えないように、
+    #   読み込んだときから変わっていない日記は元のまま、変わった日記は変わった項目だけを元の日記に反映する
+    #   読み込めなかった日記も消さないように、元のまま後ろに付ける
+    def to_stored(self, diary):
+        stored = []
+        for d in diary:
+            candidates = self._originals.get(d.get("date")) if isinstance(d, dict) else None
+            if not candidates:
+                stored.append(d)
+                continue
+            original = next((original for before, original in candidates if before == d), None)
+            if original is not None:
+                stored.append(original)
+            elif len(candidates) == 1:
+                stored.append(_patch(candidates[0][1], candidates[0][0], d))
+            else:
+                stored.append(d)
+        return stored + self.rejected
+
+    # キャッシュの内容が変わったときだけ見積もり直す
+    def memory_bytes(self):
+        artifacts = self.precompute.artifacts()
+        key = (
+            self.precompute.version, tuple(artifacts), id(self.rolling.frame), id(self.anomalies.frame), self._diary_version,
+            self.precompute.features.recomputed, self.precompute.forecaster.fitted,
+        )
+        if key != self._size_key:
+            seen = set()
+            rolling = {k: v for k, v in vars(self.rolling).items() if k != "_lock"}
+            anomalies = {k: v for k, v in vars(self.anomalies).items() if k != "_lock"}
+            self._size = (
+                estimate_size(artifacts, seen) + estimate_size(rolling, seen) + estimate_size(anomalies, seen)
+                + estimate_size(self._diary, seen) + estimate_size(self._originals, seen) + estimate_size(self.precompute.features, seen)
+                + estimate_size(self.precompute.forecaster, seen)
+            )
+            self._size_key = key
+        return self._size
+
+
+# 日記ごとのキャッシュを LRU で管理する（スレッドプールはすべての日記で共有。snapshot_root の下に日記ごとのスナップショットを置く）
+class TenantRegistry:
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, max_workers=2, snapshot_root=None):
+        self.snapshot_root = snapshot_root
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="precompute")
+        self._lock = threading.Lock()
+        self._states = OrderedDict()
+        self.evictions = 0
+
+    # 日記のキャッシュを取り出す（なければ作る）。使った日記は LRU の末尾に移す
+    def get(self, name):
+        with self._lock:
+            state = self._states.get(name)
+            if state is None:
+                snapshot_dir = os.path.join(self.snapshot_root, name) if self.snapshot_root else None
+                state = self._states[name] = TenantState(name, self._executor, snapshot_dir)
+            self._states.move_to_end(name)
+            state.last_access = time.time()
+            return state
+
+    # メモリの上限を超えていたら、使われていない順にキャッシュを捨てる（keep の日記は残す）
+    #   サイズの見積もりに時間がかかるので、1回の表示につき1回だけ呼ぶ
+    def enforce_budget(self, keep=None):
+        with self._lock:
+            sizes = {name: state.memory_bytes() for name, state in self._states.items()}
+            total = sum(sizes.values())
+            for name in list(self._states):
+                if total <= self.memory_budget:
+                    break
+                if name == keep:
+                    continue
+                total -= sizes[name]
+                del self._states[name]
+                self.evictions += 1
+
+    # 日記ごとのメモリ使用量（新しく使われた順）
+    def memory_report(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            states = list(self._states.values())
+        return [
+            {
+                "tenant": state.name,
+                "bytes": state.memory_bytes(),
+                "idle_seconds": round(now - state.last_access),
+                "active": now - state.last_access <= ACTIVE_SECONDS,
+            }
+            for state in reversed(states)
+        ]
+
+    # 利用中・待機中の日記それぞれの平均メモリ使用量
+    def memory_summary(self, now=None):
+        report = self.memory_report(now)
+        summary = {"budget": self.memory_budget, "total": sum(r["bytes"] for r in report), "evictions": self.evictions}
+        for key, active in (("active", True), ("idle", False)):
+            sizes = [r["bytes"] for r in report if r["active"] == active]
+            summary[f"{key}_count"] = len(sizes)
+            summary[f"{key}_avg"] = sum(sizes) / len(sizes) if sizes else 0
+        return summary
@@ -0,0 +1,147 @@
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from diary_core import trace
+from diary_core.text import keywords
+
+# キーワードの推移を調べるための 日付×単語 の出現回数の疎行列
+#   特徴量（features.FeatureStore）の単語リストから作り、内容のハッシュが変わった日付の行だけ数え直す
+#   行は日付順なので、期間の絞り込みは二分探索で行の範囲を決めるだけ
+#   単語の列は増えるだけで消さない（使われなくなった単語の列は 0 になる）
+
+# 期間ごとに集計するときの単位（pandas の期間の頻度）
+FREQUENCIES = {"M": "月", "W": "週", "Q": "四半期", "Y": "年"}
+
+
+class TermMatrix:
+    def __init__(self):
+        self.vocabulary = {}
+        self.terms = []
+        self.updated = 0
+        self._lock = threading.Lock()
+        # 日付 → (内容のハッシュ, 列番号, 回数)
+        self._rows = {}
+        # (日付の配列, 出現回数の CSR 行列)。更新するときは丸ごと置き換える
+        self._state = (np.array([], dtype="datetime64[ns]"), sparse.csr_matrix((0, 0), dtype=np.int32))
+
+    def _row(self, tokens):
+        counts = Counter(keywords(tokens))
+        columns = []
+        for term in counts:
+            column = self.vocabulary.get(term)
+            if column is None:
+                column = self.vocabulary[term] = len(self.terms)
+                self.terms.append(term)
+            columns.append(column)
+        return np.array(columns, dtype=np.int32), np.array(list(counts.values()), dtype=np.int32)
+
+    # 特徴量の DataFrame（日付順。date・hash・tokens の列）に合わせて行列を更新する。戻り値は数え直した行数
+    @trace.traced("terms:update")
+    def update(self, features):
+        with self._lock:
+            rows = {}
+            updated = 0
+            for date, digest, tokens in zip(features["date"], features["hash"], features["tokens"]):
+                cached = self._rows.get(date)
+                if cached is None or cached[0] != digest:
+                    cached = (digest, *self._row(tokens))
+                    updated += 1
+                rows[date] = cached
+            self._rows = rows
+
+            lengths = [len(row[1]) for row in rows.values()]
+            indptr = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+            indices = np.concatenate([row[1] for row in rows.values()]) if rows else np.array([], dtype=np.int32)
+            data = np.concatenate([row[2] for row in rows.values()]) if rows else np.array([], dtype=np.int32)
+            matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(self.terms)))
+            self._state = (pd.DatetimeIndex(list(rows), dtype="datetime64[ns]").to_numpy(), matrix)
+            self.updated += updated
+            return updated
+
+    # 期間（両端を含む。None は制限なし）の (日付, 行列)
+    def _slice(self, start=None, end=None):
+        dates, matrix = self._state
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start), "ns"), side="left")
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end), "ns"), side="right")
+        return dates[lo:hi], matrix[lo:hi]
+
+    # 行列にある単語とその列番号（更新中に増えた単語は、まだ行列にないので除く）
+    def _columns(self, terms, matrix):
+        terms = [term for term in terms if self.vocabulary.get(term, matrix.shape[1]) < matrix.shape[1]]
+        return terms, [self.vocabulary[term] for term in terms]
+
+    # dates（日付の並び）の各行で単語が出てきたかを 0/1 で表した疎行列と、その列の単語
+    #   min_days: 出てきた日数がこれ以上の単語だけ（語彙が増えても列を増やしすぎない）
+    def presence(self, dates, min_days=1):
+        term_dates, matrix = self._state
+        dates = pd.DatetimeIndex(dates).to_numpy(dtype="datetime64[ns]")
+        positions = np.searchsorted(term_dates, dates).clip(max=max(len(term_dates) - 1, 0))
+        found = term_dates[positions] == dates if len(term_dates) else np.zeros(len(dates), dtype=bool)
+        # 日付の並びに合わせる行列（見つからない日付の行は 0）
+        select = sparse.csr_matrix((np.ones(found.sum()), (np.flatnonzero(found), positions[found])), shape=(len(dates), len(term_dates)))
+        present = (select @ matrix > 0).astype(np.int32).tocsc()
+        columns = np.flatnonzero(np.asarray(present.sum(axis=0)).ravel() >= min_days)
+        return [self.terms[c] for c in columns], present[:, columns].tocsr()
+
+    # 期間の単語ごとの出現回数（多い順。top を指定すると上位だけ）
+    def term_counts(self, start=None, end=None, top=None):
+        _, matrix = self._slice(start, end)
+        totals = np.asarray(matrix.sum(axis=0)).ravel()
+        counts = pd.Series(totals, index=self.terms[:len(totals)], dtype=int)
+        counts = counts[counts > 0].sort_values(ascending=False, kind="stable")
+        return counts.head(top) if top else counts
+
+    # 単語ごとの期間（freq: FREQUENCIES）別の出現回数（行: 期間の開始日, 列: 単語）
+    #   days=True にすると回数ではなく単語が出てきた日数
+    def term_frequency(self, terms, freq="M", start=None, end=None, days=False):
+        dates, matrix = self._slice(start, end)
+        terms, columns = self._columns(terms, matrix)
+        values = matrix[:, columns].toarray()
+        df = pd.DataFrame((values > 0).astype(int) if days else values, columns=terms)
+        if df.empty:
+            return df
+        periods = pd.DatetimeIndex(dates).to_period(freq).start_time
+        result = df.groupby(periods).sum()
+        # 1度も出てこなかった期間も 0 で埋める
+        full = pd.period_range(result.index.min(), result.index.max(), freq=freq).start_time
+        return result.reindex(full, fill_value=0)
+
+    # 2つの期間で1日あたりの出現回数が増えた・減った単語（change の大きい順。減った単語は末尾）
+    #   min_count: どちらかの期間でこの回数以上出てきた単語だけ
+    def rising_terms(self, before, after, min_count=2):
+        before_dates, before_matrix = self._slice(*before)
+        after_dates, after_matrix = self._slice(*after)
+        before_counts = np.asarray(before_matrix.sum(axis=0)).ravel()
+        after_counts = np.asarray(after_matrix.sum(axis=0)).ravel()
+        before_rate = before_counts / max(len(before_dates), 1)
+        after_rate = after_counts / max(len(after_dates), 1)
+        result = pd.DataFrame({
+            "term": self.terms[:len(before_counts)],
+            "before": before_counts,
+            "after": after_counts,
+            "before_per_day": before_rate,
+            "after_per_day": after_rate,
+            "change": after_rate - before_rate,
+        })
+        result = result[np.maximum(result["before"], result["after"]) >= min_count]
+        return result.sort_values("change", ascending=False, kind="stable").reset_index(drop=True)
+
+    # 単語が出てきた日の平均評価と日数（ratings は日付 → 評価の Series。delta は全体の平均評価との差）
+    def term_ratings(self, terms, ratings, start=None, end=None):
+        dates, matrix = self._slice(start, end)
+        terms, columns = self._columns(terms, matrix)
+        present = (matrix[:, columns] > 0).astype(float)
+        values = pd.Series(ratings).groupby(level=0).mean()
+        values.index = pd.to_datetime(values.index)
+        values = values.reindex(pd.DatetimeIndex(dates)).to_numpy(dtype=float)
+        rated = ~np.isnan(values)
+        days = np.asarray(present[rated].sum(axis=0)).ravel()
+        sums = present[rated].T @ values[rated]
+        overall = values[rated].mean() if rated.any() else np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(days > 0, sums / days, np.nan)
+        return pd.DataFrame({"term": terms, "days": days.astype(int), "average": means, "delta": means - overall})
@@ -0,0 +1,101 @@
+import threading
+
+import pandas as pd
+from janome.tokenizer import Tokenizer
+from wordcloud import WordCloud
+
+from diary_core import trace
+
+# 日本語フォント（ワードクラウド用）
+WORDCLOUD_FONT_PATH = "./ipaexg.ttf"
+
+# 抽出する品詞（名詞、動詞、形容詞のみ）
+CONTENT_POS = ("名詞", "動詞", "形容詞")
+
+# ストップワード（除外したい単語）
+STOPWORDS = frozenset([
+    "てる", "いる", "なる", "れる", "する", "ある", "こと", "これ", "さん", "して",
+    "くれる", "やる", "くる", "しまう", "いく", "ない", "のだ", "よう", "あり", "ため",
+    "ところ", "ます", "です", "から", "まで", "たり", "けど", "ので", "たい",
+    "もの", "それ", "その", "今日", "日", "は", "が", "の", "に", "を", "へ", "と", "も",
+    "で", "や", "し", "ながら", "なら", "けれど", "だって",
+    "なのに", "だけど", "だ", "だが", "そして", "しかし", "だから", "また", "につい",
+    "すると", "なるほど", "ほんの", "いい", "られる",
+])
+
+# 感情キーワードのマッピング
+EMOTION_KEYWORDS = {
+    "ポジティブ": ["嬉しい", "楽しい", "幸せ", "わくわく", "最高", "喜び", "素晴らしい", "良い", "成功", "達成"],
+    "ネガティブ": ["悲しい", "辛い", "苦しい", "不安", "心配", "失敗", "残念", "怖い", "疲れる", "しんどい"],
+    "中立/その他": ["考える", "思う", "感じる", "予定", "明日", "今日", "昨日", "たぶん", "かもしれない"]
+}
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+# Janome の Tokenizer は辞書の読み込みが重いので1つだけ作って使い回す
+def get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                with trace.span("janome:init"):
+                    _tokenizer = Tokenizer()
+    return _tokenizer
+
+
+# 本文を形態素解析し、名詞・動詞・形容詞の基本形を返す
+def content_words(text):
+    return [
+        token.base_form
+        for token in get_tokenizer().tokenize(str(text))
+        if token.part_of_speech.split(",")[0] in CONTENT_POS
+    ]
+
+
+# 複数の本文をまとめて形態素解析する（1日ごとの単語リスト）
+@trace.traced("janome:tokenize")
+def tokenize_contents(contents):
+    return [content_words(content) for content in contents]
+
+
+# ストップワードを除いたキーワードの一覧
+def keywords(words, stopwords=STOPWORDS):
+    return [word for word in words if word not in stopwords]
+
+
+# 単語リストからキーワードの出現回数を数える
+def keyword_counts(token_lists, top=None):
+    words = [word for tokens in token_lists for word in keywords(tokens)]
+    counts = pd.Series(words, dtype=object).value_counts()
+    return counts.head(top) if top else counts
+
+
+# 感情キーワードを含む日の平均評価と日数
+def emotion_summary(token_lists, ratings):
+    emotion_ratings = {emotion: [] for emotion in EMOTION_KEYWORDS}
+    for tokens, rating in zip(token_lists, ratings):
+        token_set = set(tokens)
+        for emotion, words in EMOTION_KEYWORDS.items():
+            if token_set.intersection(words):
+                emotion_ratings[emotion].append(rating)
+
+    return pd.DataFrame({
+        "average": [pd.Series(r, dtype=float).mean() if r else 0 for r in emotion_ratings.values()],
+        "count": [len(r) for r in emotion_ratings.values()],
+    }, index=list(emotion_ratings))
+
+
+# キーワードからワードクラウドを作る
+@trace.traced("wordcloud:layout")
+def build_wordcloud(words, font_path=WORDCLOUD_FONT_PATH):
+    return WordCloud(
+        width=800,
+        height=400,
+        background_color="white",
+        font_path=font_path,
+        stopwords=set(STOPWORDS),
+        collocations=False,
+        max_words=100
+    ).generate(" ".join(words))
@@ -0,0 +1,179 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# 処理時間の計測（DIARY_TRACE=0 で無効。無効時は計測用のオブジェクトを作らない）
+#   ENABLED は実行中に変えてもよい（ベンチマークは DIARY_TRACE に関係なく有効にする）
+ENABLED = os.environ.get("DIARY_TRACE", "1") != "0"
+TRACE_FILE = os.environ.get("DIARY_TRACE_FILE", ".diary_trace.jsonl")
+# トレースファイルがこの大きさを超えたら「.1」を付けた名前に移して新しく書き始める（古いものは1世代だけ残す）
+TRACE_MAX_BYTES = int(os.environ.get("DIARY_TRACE_MAX_BYTES", 10 * 1024 * 1024))
+
+_local = threading.local()
+_file_lock = threading.Lock()
+
+
+# 無効時に返す何もしないスパン
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# 1つの処理区間の計測
+class _Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+
+    def __enter__(self):
+        stack = _stack()
+        self.depth = len(stack)
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        elapsed = time.perf_counter() - self.start
+        _stack().pop()
+        record = {
+            "name": self.name,
+            "ms": round(elapsed * 1000, 3),
+            "depth": self.depth,
+            "parent": self.parent,
+            "thread": threading.current_thread().name,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        if self.attrs:
+            record["attrs"] = self.attrs
+        # start_run していないスレッドでは記録しない（溜まり続けないように）
+        if getattr(_local, "run_id", None):
+            _spans().append(record)
+        return False
+
+    # 計測中にわかった情報（件数・サイズなど）を追加する
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _spans():
+    if not hasattr(_local, "spans"):
+        _local.spans = []
+    return _local.spans
+
+
+# with trace.span("json:parse"): ... の形で使う
+def span(name, **attrs):
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+
+# 関数全体を計測するデコレータ（無効時は元の関数をそのまま呼ぶ）
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Streamlit の fragment の計測（fragment だけが再実行されたときは、それを1回の実行として記録する）
+@contextlib.contextmanager
+def fragment_run(name):
+    if not ENABLED:
+        yield
+        return
+    standalone = getattr(_local, "run_id", None) is None
+    if standalone:
+        start_run(name)
+    try:
+        with _Span(name, {}):
+            yield
+    finally:
+        if standalone:
+            finish_run()
+
+
+# 1回の実行（Streamlit の rerun やバッチ処理1回分）の計測を始める
+def start_run(label=""):
+    if not ENABLED:
+        return
+    _local.stack = []
+    _local.spans = []
+    _local.run_id = uuid.uuid4().hex[:12]
+    _local.label = label
+    _local.started = time.perf_counter()
+
+
+# 計測を終えて、スパンの一覧を返す（トレースファイルにも追記する）
+def finish_run(write=True):
+    if not ENABLED or not hasattr(_local, "run_id"):
+        return []
+    spans = list(_spans())
+    total_ms = round((time.perf_counter() - _local.started) * 1000, 3)
+    spans.append({"name": "run:total", "ms": total_ms, "depth": 0, "parent": None, "thread": threading.current_thread().name})
+    if write and TRACE_FILE:
+        write_spans(spans, _local.run_id, _local.label)
+    del _local.run_id
+    return spans
+
+
+# トレースファイルが大きくなりすぎていたら古い世代に移す
+def _rotate(path):
+    try:
+        if TRACE_MAX_BYTES and os.path.getsize(path) >= TRACE_MAX_BYTES:
+            os.replace(path, f"{path}.1")
+    except OSError:
+        pass
+
+
+# スパンを JSONL 形式でトレースファイルに追記する
+def write_spans(spans, run_id, label="", path=None):
+    timestamp = datetime.now().isoformat(timespec="milliseconds")
+    lines = [
+        json.dumps(dict(record, run=run_id, label=label, ts=timestamp), ensure_ascii=False)
+        for record in spans
+    ]
+    path = path or TRACE_FILE
+    with _file_lock:
+        _rotate(path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+# 処理名ごとの合計時間（表示用）
+def summarize(spans):
+    totals = {}
+    for record in spans:
+        entry = totals.setdefault(record["name"], {"name": record["name"], "calls": 0, "ms": 0.0, "depth": record["depth"]})
+        entry["calls"] += 1
+        entry["ms"] += record["ms"]
+        entry["depth"] = min(entry["depth"], record["depth"])
+    return sorted(totals.values(), key=lambda e: e["ms"], reverse=True)
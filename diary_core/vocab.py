@@ -0,0 +1,20 @@
+# 日記フォームで選択できる項目（天気・体調・気分・活動）
+WEATHER_OPTIONS = ["晴れ", "曇り", "雨", "雪", "霧", "台風"]
+HEALTH_OPTIONS = ["元気", "普通", "少し疲れた", "体調不良", "絶好調", "眠い"]
+MOOD_OPTIONS = ["選択しない", "幸せ", "充実", "退屈", "不安", "悲しい", "イライラ", "やる気満々", "リラックス", "達成感"]
+ACTIVITY_OPTIONS = ["運動した", "読書した", "料理した", "友達と会った", "家族と過ごした", "勉強した", "映画/TVを見た", "創作活動をした", "ゲームをした", "休息した", "仕事をした", "新しいことを学んだ"]
+
+# 気分を選ばなかったときの値
+NO_MOOD = "選択しない"
+
+# 入力フォームの初期値
+DEFAULT_WEATHER = "晴れ"
+DEFAULT_HEALTH = "元気"
+DEFAULT_RATING = 3
+DEFAULT_SLEEP_HOURS = 7.0
+
+# カレンダー表示用の天気アイコン
+WEATHER_ICONS = {
+    "晴れ": "☀️", "曇り": "☁️", "雨": "🌧️",
+    "雪": "❄️", "霧": "🌫️", "台風": "🌀"
+}
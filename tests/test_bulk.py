@@ -0,0 +1,37 @@
+from diary_core import bulk
+from diary_core.storage import make_entry
+
+
+def _diary():
+    return [
+        make_entry("2025-01-01", "散歩した", "晴れ", "普通", 4, ["散歩した"], mood="楽しい"),
+        make_entry("2025-01-02", "仕事", "雨", "普通", 2, ["仕事をした"], mood="疲れた"),
+    ]
+
+
+# 何にも当てはまらない条件では、どの操作も日記を変えない
+def test_empty_filter_changes_nothing():
+    diary = _diary()
+
+    for result, summary in (
+        bulk.delete_entries(diary, query="どこにもない言葉"),
+        bulk.delete_entries(diary, start="2024-01-01", end="2024-12-31"),
+        bulk.rename_values(diary, "activities", ["どこにもない活動"], "新しい活動"),
+        bulk.rename_values(diary, "mood", [], "新しい気分"),
+        bulk.rename_values(diary, "activities", ["散歩した"], "新しい活動", start="2026-01-01"),
+    ):
+        assert result == diary
+        assert summary["changed"] == 0
+        assert summary["changes"] == []
+    assert diary == _diary()
+
+
+# 当てはまる日記だけを変え、元のリストは変更しない
+def test_rename_changes_only_matching_entries():
+    diary = _diary()
+    result, summary = bulk.rename_values(diary, "activities", ["散歩した"], "ウォーキング")
+
+    assert result[0]["activities"] == ["ウォーキング"]
+    assert result[1] is diary[1]
+    assert summary["changed"] == 1
+    assert diary == _diary()
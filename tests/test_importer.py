@@ -0,0 +1,34 @@
+import io
+import json
+
+import pytest
+
+from diary_core import importer
+
+
+def _read(text, read_size):
+    return list(importer.iter_json_array(io.StringIO(text), read_size=read_size))
+
+
+# 読み込む単位が小さくても（要素や数値が途中で途切れても）、配列全体を読んだときと同じ要素になる
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, importer.READ_SIZE])
+def test_streamed_array_matches_json_load(read_size):
+    values = [
+        {"date": "2025-01-01", "content": "括弧 ] や , を含む \"本文\"", "rating": 12345},
+        {"date": "2025-01-02", "activities": ["散歩した", "読書した"], "sleep_hours": 7.25},
+        123456789, -0.5, True, None, "文字列", [],
+    ]
+    text = "  \n[ " + ",\n  ".join(json.dumps(v, ensure_ascii=False) for v in values) + " ]\n"
+
+    assert _read(text, read_size) == json.loads(text)
+
+
+@pytest.mark.parametrize("text", ["[]", " [ ] ", "[\n]\n"])
+def test_empty_array(text):
+    assert _read(text, 1) == []
+
+
+@pytest.mark.parametrize("text", ["", "{}", "[1 2]", "[1,", "[{\"date\": \"2025-01-01\""])
+def test_invalid_json_raises(text):
+    with pytest.raises(ValueError):
+        _read(text, 2)
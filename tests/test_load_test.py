@@ -0,0 +1,19 @@
+from bench.load_test import percentile
+
+
+# 最近傍順位法: 小さい順に ceil(q / 100 × 件数) 番目
+def test_percentile_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+
+    assert percentile(values, 0) == 1
+    assert percentile(values, 20) == 1
+    assert percentile(values, 21) == 2
+    assert percentile(values, 50) == 3
+    assert percentile(values, 100) == 5
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile([1, 2], 50) == 1
+    assert percentile([7], 95) == 7
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 50) is None
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from bench.generate_diary import generate_entries
+from diary_core import periods
+from diary_core.features import FeatureStore
+from diary_core.frame import to_frame
+
+
+def _build(diary, aggregates=None):
+    aggregates = aggregates or periods.PeriodAggregates()
+    aggregates.update(to_frame(diary), FeatureStore().frame(diary))
+    return aggregates
+
+
+def _assert_same_report(a, b):
+    assert (a is None) == (b is None)
+    if a is None:
+        return
+    assert a["entry_count"] == b["entry_count"]
+    for key in ("avg_rating", "prev_avg_rating", "avg_sleep"):
+        assert (a[key] is None) == (b[key] is None)
+        if a[key] is not None:
+            assert np.isclose(a[key], b[key], equal_nan=True), key
+    for key in ("health_counts", "mood_counts", "activity_counts", "keywords"):
+        pd.testing.assert_series_equal(a[key], b[key], check_names=False)
+    for key in ("best_day", "worst_day"):
+        assert a[key]["date"] == b[key]["date"]
+
+
+# 日記を編集・削除・追加した後の差分更新が、最初から集計し直した結果と同じになる
+def test_incremental_update_matches_fresh_rebuild():
+    diary = generate_entries(300, seed=1)
+    aggregates = _build(diary)
+
+    diary = list(diary)
+    diary[-40] = dict(diary[-40], rating=1, content=diary[-40]["content"] + " 新しい単語")
+    del diary[-100]
+    diary.append(dict(diary[-1], date="2026-01-05", content="年をまたいだ日記"))
+    assert aggregates.update(to_frame(diary), FeatureStore().frame(diary)) > 0
+    fresh = _build(diary)
+
+    for kind in periods.PERIOD_KINDS:
+        assert aggregates.options(kind) == fresh.options(kind)
+        for period in aggregates.options(kind):
+            _assert_same_report(aggregates.report(kind, period), fresh.report(kind, period))
+    start, end = pd.Timestamp(diary[0]["date"]) + pd.Timedelta(days=17), pd.Timestamp("2025-12-20")
+    _assert_same_report(aggregates.range_report(start, end), fresh.range_report(start, end))
+
+
+# 変わっていなければ集計し直さない
+def test_unchanged_diary_is_not_recomputed():
+    diary = generate_entries(50, seed=2)
+    aggregates = _build(diary)
+
+    assert aggregates.update(to_frame(diary), FeatureStore().frame(diary)) == 0
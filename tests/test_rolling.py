@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from diary_core.rolling import RollingStats, daily_frame, rolling_statistics
+
+
+def _diary(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=n)
+    keep = rng.random(n) > 0.3
+    return pd.DataFrame({
+        "date": dates[keep].strftime("%Y-%m-%d"),
+        "rating": rng.integers(1, 6, keep.sum()),
+        "sleep_hours": rng.normal(7, 1, keep.sum()),
+    })
+
+
+# 日付を足しながら差分だけ計算した結果が、全体を計算し直した結果と同じになる
+def test_incremental_update_matches_full_recompute():
+    df = _diary()
+    stats = RollingStats()
+    for end in (50, 51, 200, len(df)):
+        incremental = stats.update(daily_frame(df.iloc[:end]))
+    full = rolling_statistics(df)
+
+    assert incremental.index.equals(full.index)
+    assert list(incremental.columns) == list(full.columns)
+    np.testing.assert_allclose(incremental.to_numpy(), full.to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+# 過去の日記が変わったときは最初から計算し直す
+def test_changed_history_is_recomputed():
+    df = _diary()
+    stats = RollingStats()
+    stats.update(daily_frame(df))
+    edited = df.copy()
+    edited.loc[10, "rating"] = 1 if edited.loc[10, "rating"] != 1 else 5
+
+    np.testing.assert_allclose(stats.update(daily_frame(edited)).to_numpy(), rolling_statistics(edited).to_numpy())
+
+
+# 評価が 0（未入力）の日は、記録はあっても評価の統計には入らない
+def test_unrated_days_are_not_counted():
+    df = pd.DataFrame({"date": ["2024-01-01", "2024-01-02"], "rating": [0, 4], "sleep_hours": [7.0, 6.0]})
+    daily = daily_frame(df)
+
+    assert np.isnan(daily["rating"].iloc[0])
+    assert list(daily["entries"]) == [1, 1]
+    assert rolling_statistics(df)["rating_mean_7d"].iloc[-1] == 4
@@ -0,0 +1,63 @@
+import json
+
+from diary_core.storage import LocalStorage, make_entry
+from diary_core.sync import MirroredStorage, apply_ops, diff_ops
+
+
+def _entry(day, content="日記"):
+    return make_entry(f"2025-01-{day:02d}", content, "晴れ", "普通", 3, [])
+
+
+def _same(a, b):
+    key = lambda diary: sorted(json.dumps(d, ensure_ascii=False, sort_keys=True) for d in diary)
+    return key(a) == key(b)
+
+
+# 差分の操作を元の日記に適用すると、新しい日記と同じ内容になる
+def test_diff_and_apply_round_trip():
+    old = [_entry(1), _entry(2), _entry(3)]
+    new = [_entry(1), _entry(2, "書き直した"), _entry(4)]
+    ops = diff_ops(old, new)
+
+    assert {(op["op"], op["date"]) for op in ops} == {("upsert", "2025-01-02"), ("upsert", "2025-01-04"), ("delete", "2025-01-03")}
+    assert apply_ops(old, ops) == new
+    assert diff_ops(new, new) == []
+
+
+# 日付のない・形式が違う・日付が重複した日記も、取り違えずに同期する
+def test_round_trip_with_invalid_entries():
+    old = [{"content": "日付なし"}, "文字列", _entry(1), _entry(1, "同じ日付"), {"date": None}]
+    new = [{"content": "日付なし（書き直した）"}, "文字列", _entry(1), _entry(2)]
+
+    assert _same(apply_ops(old, diff_ops(old, new)), new)
+    assert diff_ops(old, list(old)) == []
+
+
+# リモートにある日付のない日記は、ミラーから保存・同期しても消えない
+def test_mirror_keeps_undated_remote_entries(tmp_path):
+    remote = LocalStorage(str(tmp_path / "remote.json"))
+    remote.save([_entry(1), {"content": "no date"}])
+    mirror = MirroredStorage(remote, str(tmp_path / "mirror"))
+
+    diary = mirror.load()
+    mirror.save(diary + [_entry(2)])
+    assert mirror.sync_once() == 1
+    assert _same(remote.load(), [_entry(1), {"content": "no date"}, _entry(2)])
+
+
+# 最初の取得に失敗したときは、空のミラーを作らずにエラーにする
+def test_failed_first_pull_is_not_an_empty_diary(tmp_path):
+    class Offline:
+        def fetch_if_changed(self, revision):
+            raise ConnectionError("offline")
+
+    mirror = MirroredStorage(Offline(), str(tmp_path / "mirror"))
+    for _ in range(2):
+        try:
+            mirror.load()
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError("load() should raise while the remote cannot be read")
+    assert not (tmp_path / "mirror" / "diary.json").exists()
+    assert mirror.status()["error"] == "offline"